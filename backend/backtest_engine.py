@@ -0,0 +1,281 @@
+"""
+Trade simulation for the backtesting engine.
+
+The bar loop is resumable: everything it carries from one bar to the next (open position,
+entry/stop/target, equity, peak equity, running trade statistics and the last evaluated
+timestamp) lives in a plain JSON-serialisable `state` dict. A full backtest starts from
+`new_state(capital)`; a saved strategy is brought up to date by passing its stored state
+back in together with only the bars that arrived since `state["last_timestamp"]`.
+
+Walk-forward analysis reuses the same loop: signals are computed once over the full
+history and each in-sample / out-of-sample window simulates its slice from a fresh state.
+
+Only closed bars are simulated (`closed_bars`): a still-forming intraday bar would become
+`last_timestamp`, and a refresh would then skip the rest of that bar for good. The state
+also keeps every trade's return (`record_pnls`), because the result a user saves is the
+response view, whose trade list may be cut short; the curves are not kept in the state, a
+continuation appends to the saved ones and downsamples them to the same point budget.
+"""
+
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+
+from downsampling import downsample_points
+
+DATE_FORMAT = "%Y-%m-%d %H:%M"
+
+# How long a bar takes to close, so a still-forming last bar is never traded on.
+INTERVAL_DURATIONS = {
+    "1m": pd.Timedelta(minutes=1), "5m": pd.Timedelta(minutes=5), "15m": pd.Timedelta(minutes=15),
+    "30m": pd.Timedelta(minutes=30), "1h": pd.Timedelta(hours=1), "1d": pd.Timedelta(days=1),
+    "1wk": pd.Timedelta(weeks=1),
+}
+
+
+def new_state(capital: float) -> dict:
+    return {
+        "capital": float(capital), "peak_equity": float(capital),
+        "in_trade": False, "entry_price": None, "stop_loss_price": None,
+        "target_price": None, "entry_date": None,
+        "num_trades": 0, "wins": 0, "losses": 0, "sum_win": 0.0, "sum_loss": 0.0,
+        "max_drawdown": 0.0, "last_timestamp": None,
+    }
+
+
+def closed_bars(data: pd.DataFrame, date_col: str, interval: str) -> pd.DataFrame:
+    """Drop the trailing bar if it has not closed yet."""
+    duration = INTERVAL_DURATIONS.get(interval)
+    if duration is None or data.empty:
+        return data
+    last = pd.Timestamp(data[date_col].iloc[-1])
+    now = pd.Timestamp.now(tz=last.tz) if last.tz is not None else pd.Timestamp.now()
+    return data.iloc[:-1] if last + duration > now else data
+
+
+def simulate(data: pd.DataFrame, date_col: str, entry_signals: pd.Series, sl_percent: float,
+             target_percent: float, risk_percent: float, state: dict, start: int = 1):
+    """Walk bars `start..` of `data`, updating `state` in place.
+
+    Long-only, one position at a time: enter on the close of a signal bar, exit on the first
+    later close at or beyond the target / stop. Returns the trades closed in this call plus
+    the equity and drawdown points they produced.
+    """
+    closes = data["Close"].to_numpy()
+    dates = data[date_col]
+    trades, exit_bars, equities, drawdowns = [], [], [], []
+
+    for i in range(start, len(data)):
+        if not state["in_trade"] and entry_signals.iloc[i]:
+            entry_price = float(closes[i])
+            state.update({
+                "in_trade": True, "entry_price": entry_price,
+                "stop_loss_price": entry_price * (1 - sl_percent / 100),
+                "target_price": entry_price * (1 + target_percent / 100),
+                "entry_date": dates.iloc[i].isoformat(),
+            })
+
+        elif state["in_trade"]:
+            current_price = float(closes[i])
+            exit_reason = ("Target" if current_price >= state["target_price"]
+                           else "Stop-Loss" if current_price <= state["stop_loss_price"] else None)
+            if exit_reason:
+                pnl_percent = (current_price / state["entry_price"] - 1) * 100
+                trades.append({
+                    "entry_date": pd.Timestamp(state["entry_date"]), "entry_price": state["entry_price"],
+                    "exit_date": dates.iloc[i], "exit_price": current_price,
+                    "pnl_percent": pnl_percent, "reason": exit_reason,
+                })
+
+                capital = state["capital"]
+                position_size = capital * (risk_percent / 100) / (sl_percent / 100) if sl_percent > 0 else capital
+                capital += position_size * (pnl_percent / 100)
+                peak_equity = max(state["peak_equity"], capital)
+                drawdown = (peak_equity - capital) / peak_equity * 100 if peak_equity > 0 else 0
+
+                state.update({
+                    "capital": capital, "peak_equity": peak_equity,
+                    "max_drawdown": max(state["max_drawdown"], drawdown),
+                    "in_trade": False, "entry_price": None, "stop_loss_price": None,
+                    "target_price": None, "entry_date": None,
+                    "num_trades": state["num_trades"] + 1,
+                })
+                if pnl_percent > 0:
+                    state["wins"] += 1
+                    state["sum_win"] += pnl_percent
+                else:
+                    state["losses"] += 1
+                    state["sum_loss"] -= pnl_percent
+                exit_bars.append(i)
+                equities.append(capital)
+                drawdowns.append(drawdown)
+
+    # Curve labels are formatted in one vectorized pass rather than per exit.
+    labels = _labels(dates.iloc[exit_bars]) if exit_bars else []
+    equity_points = [{"date": d, "equity": v} for d, v in zip(labels, equities)]
+    drawdown_points = [{"date": d, "drawdown": v} for d, v in zip(labels, drawdowns)]
+    if len(data):
+        state["last_timestamp"] = dates.iloc[-1].isoformat()
+    return trades, equity_points, drawdown_points
+
+
+def _labels(dates) -> list:
+    return list(pd.DatetimeIndex(dates).strftime(DATE_FORMAT))
+
+
+def summarize(state: dict, initial_capital: float) -> dict:
+    """Headline metrics derived from the running statistics in `state`."""
+    pnl = state["capital"] - initial_capital
+    wins, losses = state["wins"], state["losses"]
+    trades = wins + losses
+    return {
+        "pnl": round(pnl, 2),
+        "pnl_percent": round(pnl / initial_capital * 100 if initial_capital > 0 else 0, 2),
+        "win_rate": round(wins / trades * 100 if trades else 0, 2),
+        "num_trades": trades,
+        "max_drawdown": round(state["max_drawdown"], 2),
+        "profit_factor": round(state["sum_win"] / state["sum_loss"] if state["sum_loss"] > 0 else 999.0, 2),
+        "avg_win": round(state["sum_win"] / wins if wins else 0, 2),
+        "avg_loss": round(state["sum_loss"] / losses if losses else 0, 2),
+    }
+
+
+def format_trades(trades: list, first_id: int = 0):
+    """Chart-ready rows for closed trades: (formatted trades, scatter points, monthly P/L map)."""
+    if not trades:
+        return [], [], {}
+    entries = pd.DatetimeIndex([t["entry_date"] for t in trades])
+    exits = pd.DatetimeIndex([t["exit_date"] for t in trades])
+    hours = np.round((exits - entries).total_seconds().to_numpy() / 3600, 1)
+    entry_labels, exit_labels = _labels(entries), _labels(exits)
+    formatted, scatter, monthly = [], [], {}
+    for i, (trade, month_key) in enumerate(zip(trades, exits.strftime("%b %Y"))):
+        scatter.append({"id": first_id + i, "x": float(hours[i]), "y": round(trade["pnl_percent"], 2)})
+        monthly[month_key] = monthly.get(month_key, 0) + trade["pnl_percent"]
+        formatted.append({
+            **trade,
+            "entry_date": entry_labels[i],
+            "exit_date": exit_labels[i],
+            "entry_price": round(trade["entry_price"], 2),
+            "exit_price": round(trade["exit_price"], 2),
+            "pnl_percent": round(trade["pnl_percent"], 2),
+        })
+    return formatted, scatter, monthly
+
+
+def pie_data(state: dict) -> list:
+    return [
+        {"id": 0, "value": state["wins"], "label": "Winning Trades", "color": "#4caf50"},
+        {"id": 1, "value": state["losses"], "label": "Losing Trades", "color": "#f44336"},
+    ]
+
+
+def record_pnls(state: dict, trades: list) -> None:
+    """Append a run's trade returns to `state["pnls"]` (the Monte Carlo input)."""
+    state.setdefault("pnls", []).extend(t["pnl_percent"] for t in trades)
+
+
+def extend_result(result: dict, state: dict, initial_capital: float, trades: list,
+                  equity_points: list, drawdown_points: list, max_points: int = 0) -> dict:
+    """Append a continuation run's trades to a stored backtest result and rebuild its curves.
+
+    The new curve points are appended to the stored (possibly downsampled) curves and the
+    whole curve is downsampled to `max_points` (0 = keep every point); a state saved before
+    it had `pnls` is seeded from the result's trades.
+    """
+    if "pnls" not in state:
+        record_pnls(state, result.get("trades", []))
+    record_pnls(state, trades)
+
+    formatted, scatter, monthly = format_trades(trades, first_id=len(result.get("trades", [])))
+    bars = {row["month"]: row["pnl"] for row in result.get("bar_data", [])}
+    for month, pnl in monthly.items():
+        bars[month] = bars.get(month, 0) + pnl
+    return {
+        **result,
+        **summarize(state, initial_capital),
+        "trades": result.get("trades", []) + formatted,
+        "equity_curve": downsample_points(result.get("equity_curve", []) + equity_points, "equity", max_points),
+        "drawdown_curve": downsample_points(result.get("drawdown_curve", []) + drawdown_points, "drawdown", max_points),
+        "scatter_data": downsample_points(result.get("scatter_data", []) + scatter, "y", max_points),
+        "bar_data": [{"month": k, "pnl": round(v, 2)} for k, v in bars.items()],
+        "pie_data": pie_data(state),
+        "engine_state": state,
+    }
+
+
+def walk_forward_windows(n_bars: int, folds: int, in_sample_fraction: float, min_bars: int = 20) -> list:
+    """Rolling ((is_start, is_end), (oos_start, oos_end)) bar ranges, end-exclusive.
+
+    Every window has the same in-sample length and is stepped forward by the out-of-sample
+    length, so the out-of-sample segments tile the history after the first in-sample block.
+    """
+    if folds < 1 or not 0 < in_sample_fraction < 1:
+        raise ValueError("folds must be >= 1 and in_sample_fraction between 0 and 1.")
+    ratio = in_sample_fraction / (1 - in_sample_fraction)
+    oos_len = int(n_bars // (folds + ratio))
+    is_len = int(oos_len * ratio)
+    if oos_len < min_bars or is_len < min_bars:
+        raise ValueError(f"{n_bars} bars are too few for {folds} walk-forward windows "
+                         f"(each segment needs at least {min_bars} bars).")
+    offset = n_bars - (is_len + folds * oos_len)  # leftover bars go before the first window
+    return [
+        ((offset + k * oos_len, offset + k * oos_len + is_len),
+         (offset + k * oos_len + is_len, offset + (k + 1) * oos_len + is_len))
+        for k in range(folds)
+    ]
+
+
+def _segment(data, date_col, entry_signals, bounds, sl_percent, target_percent, risk_percent, capital) -> dict:
+    start, end = bounds
+    state = new_state(capital)
+    simulate(data.iloc[start:end].reset_index(drop=True), date_col,
+             entry_signals.iloc[start:end].reset_index(drop=True),
+             sl_percent, target_percent, risk_percent, state, start=0)
+    dates = data[date_col]
+    return {
+        "start": dates.iloc[start].strftime(DATE_FORMAT), "end": dates.iloc[end - 1].strftime(DATE_FORMAT),
+        "bars": end - start, **summarize(state, capital),
+    }
+
+
+def _spread(values) -> dict:
+    arr = np.asarray(values, dtype=float)
+    return {"mean": round(float(arr.mean()), 2), "std": round(float(arr.std()), 2),
+            "min": round(float(arr.min()), 2), "max": round(float(arr.max()), 2)}
+
+
+def walk_forward(data: pd.DataFrame, date_col: str, entry_signals: pd.Series, sl_percent: float,
+                 target_percent: float, risk_percent: float, capital: float, folds: int = 5,
+                 in_sample_fraction: float = 0.7) -> dict:
+    """Per-window in-sample / out-of-sample metrics and how stable they are across windows.
+
+    A position still open at the end of a segment is not counted (each segment is a fresh
+    account), so segment totals can differ slightly from the same bars in one long run.
+    """
+    windows = []
+    for is_bounds, oos_bounds in walk_forward_windows(len(data), folds, in_sample_fraction):
+        args = (sl_percent, target_percent, risk_percent, capital)
+        windows.append({
+            "in_sample": _segment(data, date_col, entry_signals, is_bounds, *args),
+            "out_of_sample": _segment(data, date_col, entry_signals, oos_bounds, *args),
+        })
+
+    is_returns = [w["in_sample"]["pnl_percent"] for w in windows]
+    oos_returns = [w["out_of_sample"]["pnl_percent"] for w in windows]
+    is_bars, oos_bars = windows[0]["in_sample"]["bars"], windows[0]["out_of_sample"]["bars"]
+    mean_is_per_bar = float(np.mean(is_returns)) / is_bars
+    # Out-of-sample return per bar relative to in-sample: ~1 holds up, <<1 suggests overfitting.
+    efficiency = (float(np.mean(oos_returns)) / oos_bars) / mean_is_per_bar if mean_is_per_bar > 0 else None
+    return {
+        "folds": folds, "in_sample_fraction": in_sample_fraction, "windows": windows,
+        "stability": {
+            "in_sample_pnl_percent": _spread(is_returns),
+            "out_of_sample_pnl_percent": _spread(oos_returns),
+            "out_of_sample_win_rate": _spread([w["out_of_sample"]["win_rate"] for w in windows]),
+            "out_of_sample_max_drawdown": _spread([w["out_of_sample"]["max_drawdown"] for w in windows]),
+            "profitable_oos_windows_percent": round(100 * sum(r > 0 for r in oos_returns) / len(windows), 2),
+            "walk_forward_efficiency": round(efficiency, 2) if efficiency is not None else None,
+        },
+    }
@@ -0,0 +1,118 @@
+"""
+Serialization benchmarks for backtest responses. Run from the backend/ directory:
+
+    python bench_serialization.py                 # full suite, JSON to stdout
+    python bench_serialization.py --quick --out bench.json
+
+Payloads are real perform_backtest bodies (engine, trade formatting, Monte Carlo) built from
+synthetic 5m bars of increasing length. Each body is encoded the way FastAPI does by
+default (jsonable_encoder + json.dumps), through response_formats.dumps (orjson when
+installed) and as the columnar body. Compressed sizes are reported for gzip and, when the
+package is installed, brotli, at the levels the middleware uses.
+"""
+
+import argparse
+import gzip
+import json
+import platform
+import statistics
+import sys
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+from fastapi.encoders import jsonable_encoder
+
+import backtest_engine
+import compression
+import monte_carlo
+import response_formats
+from response_formats import dumps, to_columnar
+
+
+def make_payload(bars: int, seed: int = 11) -> dict:
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range("2023-01-02 09:15", periods=bars, freq="5min", tz="Asia/Kolkata")
+    data = pd.DataFrame({"Datetime": dates, "Close": 300 + rng.normal(0, 0.4, bars).cumsum()})
+    signals = pd.Series(rng.random(bars) < 0.08)
+    state = backtest_engine.new_state(100_000)
+    trades, equity, drawdown = backtest_engine.simulate(data, "Datetime", signals, 0.5, 1.0, 1.0, state)
+    formatted, scatter, monthly = backtest_engine.format_trades(trades)
+    first = dates[0].strftime(backtest_engine.DATE_FORMAT)
+    return {
+        **backtest_engine.summarize(state, 100_000),
+        "equity_curve": [{"date": first, "equity": 100_000}] + equity,
+        "drawdown_curve": [{"date": first, "drawdown": 0}] + drawdown,
+        "scatter_data": scatter, "bar_data": [{"month": k, "pnl": round(v, 2)} for k, v in monthly.items()],
+        "pie_data": backtest_engine.pie_data(state), "ai_explanation": "### Executive Summary\n" + "text " * 200,
+        "trades": formatted, "engine_state": state,
+        "monte_carlo": monte_carlo.simulate_trades([t["pnl_percent"] for t in trades], 100_000, 1.0, 0.5, 2000, seed=1),
+    }
+
+
+def timeit(fn, repeat: int) -> dict:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return {"repeat": repeat, "min_ms": round(min(samples), 3), "mean_ms": round(statistics.fmean(samples), 3)}
+
+
+def run(args) -> list:
+    results = []
+    encoders = {
+        "fastapi_default": lambda p: json.dumps(jsonable_encoder(p), ensure_ascii=False, allow_nan=False,
+                                                separators=(",", ":")).encode("utf-8"),
+        "fast_json": dumps,
+        "columnar": lambda p: dumps(to_columnar(p)),
+    }
+    for bars in args.bars:
+        payload = make_payload(bars)
+        for name, encode in encoders.items():
+            body = encode(payload)
+            stats = timeit(lambda: encode(payload), args.repeat)
+            sizes = {"raw_bytes": len(body), "gzip_bytes": len(gzip.compress(body, compression.GZIP_LEVEL))}
+            if compression.brotli is not None:
+                sizes["br_bytes"] = len(compression.compress(body, "br"))
+            gzip_ms = timeit(lambda: gzip.compress(body, compression.GZIP_LEVEL), args.repeat)["mean_ms"]
+            results.append({"case": "encode", "params": {"bars": bars, "trades": len(payload["trades"]),
+                                                         "encoder": name},
+                            **stats, **sizes, "gzip_mean_ms": gzip_ms})
+            print(f"  {name:<16} bars={bars:<8} mean {stats['mean_ms']:>9.2f} ms  "
+                  f"{sizes['raw_bytes'] / 1e6:>7.2f} MB raw  {sizes['gzip_bytes'] / 1e6:>6.2f} MB gzip", file=sys.stderr)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backtest response serialization benchmarks (JSON output).")
+    parser.add_argument("--repeat", type=int, default=5, help="timed repetitions per case")
+    parser.add_argument("--bars", type=int, nargs="+", default=[10_000, 100_000, 400_000],
+                        help="5m bars per synthetic backtest")
+    parser.add_argument("--quick", action="store_true", help="one small payload (CI smoke run)")
+    parser.add_argument("--out", help="write JSON here instead of stdout")
+    args = parser.parse_args()
+    if args.quick:
+        args.bars, args.repeat = [20_000], min(args.repeat, 3)
+
+    report = {
+        "suite": "serialization",
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "environment": {
+            "python": platform.python_version(), "platform": platform.platform(),
+            "orjson": response_formats.orjson is not None, "brotli": compression.brotli is not None,
+        },
+        "config": {"repeat": args.repeat, "bars": args.bars, "quick": args.quick},
+        "results": run(args),
+    }
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as fh:
+            fh.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+"""
+Performance benchmarks for the strategy sandbox. Run from the backend/ directory:
+
+    python bench_strategy_sandbox.py                 # full suite, JSON to stdout
+    python bench_strategy_sandbox.py --quick --out bench.json
+
+Companion to test_strategy_sandbox.py: that file proves escapes are blocked, this one
+measures what the isolation costs. Each case is timed `--repeat` times and reported as
+min/mean/max milliseconds in a machine-readable JSON document, so results can be diffed
+between releases and the spawn-per-call path compared against the batch and fast paths.
+
+Cases:
+  validate        validation time vs script size (statements)
+  spawn           process spawn + round trip for a trivial script on a tiny frame
+  transfer        subprocess cost vs rows (1k .. --max-rows) and columns
+  execute         representative strategies: fast-path expression, rewritten loop,
+                  expression forced through the subprocess, non-rewritable loop
+  timeout_kill    latency between the wall-clock budget expiring and the call returning
+  batch           N frames through spawn-per-call vs one batch child
+"""
+
+import argparse
+import json
+import platform
+import statistics
+import sys
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+from strategy_sandbox import (
+    _spawn_and_wait, safe_execute_strategy, safe_execute_strategy_batch, validate_strategy,
+)
+
+EXPRESSION = "def find_signals(data):\n    return (data['RSI_14'] < 30) & (data['Close'] > data['SMA_50'])"
+# Two statements: valid, vectorized, but not a single expression → always takes the subprocess.
+SUBPROCESS_EXPRESSION = (
+    "def find_signals(data):\n"
+    "    cond = (data['RSI_14'] < 30) & (data['Close'] > data['SMA_50'])\n"
+    "    return cond\n"
+)
+REWRITABLE_LOOP = (
+    "def find_signals(data):\n"
+    "    signals = [False] * len(data)\n"
+    "    for i in range(1, len(data)):\n"
+    "        if data['Close'].iloc[i] > data['Close'].iloc[i - 1] and data['RSI_14'].iloc[i] < 30:\n"
+    "            signals[i] = True\n"
+    "    return signals\n"
+)
+PYTHON_LOOP = (
+    "def find_signals(data):\n"
+    "    closes = data['Close'].to_list()\n"
+    "    out = [False] * len(closes)\n"
+    "    run = 0\n"
+    "    for i in range(1, len(closes)):\n"
+    "        run = run + 1 if closes[i] > closes[i - 1] else 0\n"
+    "        out[i] = run >= 3\n"
+    "    return out\n"
+)
+SPIN = "def find_signals(data):\n    while True:\n        pass\n    return data['Close'] > 0"
+
+
+def make_frame(rows: int, extra_cols: int = 0, seed: int = 7) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    close = 100 + rng.normal(0, 1, rows).cumsum()
+    df = pd.DataFrame({
+        "Open": close, "High": close + 1, "Low": close - 1, "Close": close,
+        "Volume": rng.integers(1_000, 50_000, rows).astype(float),
+        "RSI_14": rng.uniform(0, 100, rows),
+        "SMA_50": pd.Series(close).rolling(50, min_periods=1).mean().to_numpy(),
+    })
+    for k in range(extra_cols):
+        df[f"X_{k}"] = rng.normal(0, 1, rows)
+    return df
+
+
+def make_script(statements: int) -> str:
+    body = "".join(f"    v{k} = data['Close'].shift({k % 5}) > data['SMA_50']\n" for k in range(statements))
+    return "def find_signals(data):\n" + body + "    return data['RSI_14'] < 30\n"
+
+
+def timeit(fn, repeat: int) -> dict:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return {
+        "repeat": repeat,
+        "min_ms": round(min(samples), 3),
+        "mean_ms": round(statistics.fmean(samples), 3),
+        "max_ms": round(max(samples), 3),
+    }
+
+
+def row_steps(max_rows: int) -> list:
+    steps, n = [], 1_000
+    while n <= max_rows:
+        steps.append(n)
+        n *= 10
+    return steps
+
+
+def run(args) -> list:
+    results = []
+
+    def record(case: str, params: dict, fn, repeat: int = args.repeat):
+        stats = timeit(fn, repeat)
+        results.append({"case": case, "params": params, **stats})
+        print(f"  {case:<14} {json.dumps(params):<52} mean {stats['mean_ms']:>10.3f} ms", file=sys.stderr)
+
+    for statements in (1, 10, 100, 1000):
+        script = make_script(statements)
+        record("validate", {"statements": statements, "bytes": len(script)}, lambda: validate_strategy(script))
+
+    tiny = make_frame(10)
+    record("spawn", {"rows": 10}, lambda: _spawn_and_wait(SUBPROCESS_EXPRESSION, tiny, 30))
+
+    for rows in row_steps(args.max_rows):
+        for extra in ((0, 50) if not args.quick else (0,)):
+            frame = make_frame(rows, extra)
+            repeat = args.repeat if rows <= 100_000 else 1
+            record("transfer", {"rows": rows, "columns": frame.shape[1]},
+                   lambda: _spawn_and_wait(SUBPROCESS_EXPRESSION, frame, 120), repeat)
+
+    exec_rows = 10_000 if args.quick else 100_000
+    frame = make_frame(exec_rows)
+    for name, code, fn in (
+        ("expression_fast_path", EXPRESSION, lambda c: safe_execute_strategy(c, frame)),
+        ("loop_rewritten", REWRITABLE_LOOP, lambda c: safe_execute_strategy(c, frame)),
+        ("expression_subprocess", SUBPROCESS_EXPRESSION, lambda c: safe_execute_strategy(c, frame)),
+        ("python_loop", PYTHON_LOOP, lambda c: safe_execute_strategy(c, frame)),
+    ):
+        record("execute", {"strategy": name, "rows": exec_rows}, lambda fn=fn, code=code: fn(code))
+
+    budget = 1
+    def kill():
+        try:
+            _spawn_and_wait(SPIN, tiny, budget)
+        except TimeoutError:
+            pass
+    stats = timeit(kill, max(1, args.repeat // 2))
+    results.append({"case": "timeout_kill", "params": {"budget_s": budget},
+                    **{k: (round(v - budget * 1000, 3) if k.endswith("_ms") else v) for k, v in stats.items()}})
+    print(f"  {'timeout_kill':<14} {'overrun beyond budget':<52} mean {results[-1]['mean_ms']:>10.3f} ms", file=sys.stderr)
+
+    frames = [make_frame(2_000, seed=s) for s in range(args.batch)]
+    record("batch", {"mode": "spawn_per_call", "frames": len(frames)},
+           lambda: [_spawn_and_wait(SUBPROCESS_EXPRESSION, f, 30) for f in frames], max(1, args.repeat // 2))
+    record("batch", {"mode": "one_child", "frames": len(frames)},
+           lambda: safe_execute_strategy_batch(SUBPROCESS_EXPRESSION, frames), max(1, args.repeat // 2))
+    record("batch", {"mode": "fast_path", "frames": len(frames)},
+           lambda: safe_execute_strategy_batch(EXPRESSION, frames), max(1, args.repeat // 2))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Strategy sandbox benchmarks (JSON output).")
+    parser.add_argument("--repeat", type=int, default=5, help="timed repetitions per case")
+    parser.add_argument("--max-rows", type=int, default=1_000_000, help="largest frame for the transfer case")
+    parser.add_argument("--batch", type=int, default=20, help="frames in the batch comparison")
+    parser.add_argument("--quick", action="store_true", help="smaller frames and fewer cases (CI smoke run)")
+    parser.add_argument("--out", help="write JSON here instead of stdout")
+    args = parser.parse_args()
+    if args.quick:
+        args.max_rows = min(args.max_rows, 100_000)
+        args.repeat = min(args.repeat, 3)
+
+    report = {
+        "suite": "strategy_sandbox",
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "environment": {
+            "python": platform.python_version(), "platform": platform.platform(),
+            "pandas": pd.__version__, "numpy": np.__version__,
+        },
+        "config": {"repeat": args.repeat, "max_rows": args.max_rows, "batch": args.batch, "quick": args.quick},
+        "results": run(args),
+    }
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as fh:
+            fh.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+"""
+Bulkheads: a separately sized thread pool per external dependency.
+
+Every blocking upstream call (yfinance, Firestore, OpenRouter, Zerodha Kite, the strategy
+sandbox) runs on its own pool instead of the event loop or Starlette's one shared thread
+pool. A brownout in one upstream then fills only that upstream's pool: a yfinance outage
+can hold at most YFINANCE_THREADS threads, and the community feed keeps its Firestore
+threads.
+
+Each bulkhead admits at most `threads` running calls plus `queue` waiting ones. A call
+beyond that fails immediately with `BulkheadFull` (503 with a Retry-After estimate) rather
+than queueing behind a dependency that is not keeping up. A call that outlives its deadline
+raises `DependencyTimeout` (504); its thread keeps its slot until the upstream call really
+returns, so a hung dependency shows up as saturation instead of a growing pile of threads.
+
+Sizes come from `<NAME>_THREADS`, `<NAME>_QUEUE` and `<NAME>_TIMEOUT` (seconds, 0 = none).
+Per bulkhead, `metrics` gets `bulkhead.<name>.in_flight` / `.queued` gauges, `.rejected` /
+`.timeouts` counters and `.wait` / `.run` timers.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import functools
+import math
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+
+from fastapi import HTTPException
+
+import metrics
+import sandbox_admission
+
+RETRY_AFTER_MAX = 60   # seconds; the Retry-After hint is capped here
+
+
+class BulkheadFull(HTTPException):
+    """The dependency's pool and queue are both full; raised before any work is queued."""
+
+    def __init__(self, name: str, label: str, retry_after: int):
+        super().__init__(503, f"{label} is busy right now. Please retry in {retry_after}s.",
+                         headers={"Retry-After": str(retry_after)})
+        self.bulkhead = name
+        self.retry_after = retry_after
+
+
+class DependencyTimeout(HTTPException):
+    def __init__(self, name: str, label: str):
+        super().__init__(504, f"{label} did not respond in time. Please try again.")
+        self.bulkhead = name
+
+
+class Bulkhead:
+    def __init__(self, name: str, label: str, threads: int, queue: int, timeout: float | None = None):
+        self.name = name
+        self.label = label             # user-facing name of the dependency, for error messages
+        self.threads = max(1, threads)
+        self.queue = max(0, queue)
+        self.timeout = timeout or None
+        self._pool = ThreadPoolExecutor(self.threads, thread_name_prefix=f"bulkhead-{name}")
+        self._lock = threading.Lock()
+        self._pending = 0              # admitted and not yet finished (running + queued)
+        self._running = 0
+        self._avg_run = 1.0            # EWMA of call duration, for Retry-After
+        self._rejected = 0
+
+    def submit(self, fn, *args, **kwargs) -> Future:
+        """Admit `fn(*args, **kwargs)` to the pool, or raise BulkheadFull at once."""
+        with self._lock:
+            if self._pending >= self.threads + self.queue:
+                self._rejected += 1
+                retry_after = self._retry_after()
+                full = True
+            else:
+                self._pending += 1
+                full = False
+                self._publish()
+        if full:
+            metrics.incr(f"bulkhead.{self.name}.rejected")
+            raise BulkheadFull(self.name, self.label, retry_after)
+
+        enqueued = time.perf_counter()
+
+        def job():
+            started = time.perf_counter()
+            metrics.observe(f"bulkhead.{self.name}.wait", started - enqueued)
+            with self._lock:
+                self._running += 1
+                self._publish()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - started
+                metrics.observe(f"bulkhead.{self.name}.run", elapsed)
+                with self._lock:
+                    self._running -= 1
+                    self._avg_run = 0.8 * self._avg_run + 0.2 * elapsed
+
+        future = self._pool.submit(job)
+        future.add_done_callback(self._release)
+        return future
+
+    async def run(self, fn, *args, timeout: float | None = None, **kwargs):
+        """Await `fn(*args, **kwargs)` on this bulkhead (for async endpoints)."""
+        timeout = self.timeout if timeout is None else timeout
+        future = asyncio.wrap_future(self.submit(functools.partial(fn, *args, **kwargs)))
+        try:
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            metrics.incr(f"bulkhead.{self.name}.timeouts")
+            raise DependencyTimeout(self.name, self.label)
+
+    def call(self, fn, *args, timeout: float | None = None, **kwargs):
+        """Blocking `run` for code already on a worker thread. Never call it from a job
+        running on this same bulkhead: the job would wait on its own pool."""
+        timeout = self.timeout if timeout is None else timeout
+        future = self.submit(fn, *args, **kwargs)
+        try:
+            return future.result(timeout)
+        except FutureTimeout:
+            future.cancel()
+            metrics.incr(f"bulkhead.{self.name}.timeouts")
+            raise DependencyTimeout(self.name, self.label)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"threads": self.threads, "queue_limit": self.queue, "in_flight": self._running,
+                    "queued": self._pending - self._running, "rejected": self._rejected,
+                    "avg_run_ms": round(self._avg_run * 1000, 1)}
+
+    def _release(self, _future) -> None:
+        with self._lock:
+            self._pending -= 1
+            self._publish()
+
+    def _publish(self) -> None:
+        # Called with self._lock held.
+        metrics.set_gauge(f"bulkhead.{self.name}.in_flight", self._running)
+        metrics.set_gauge(f"bulkhead.{self.name}.queued", self._pending - self._running)
+
+    def _retry_after(self) -> int:
+        # Time for the pool to work through what is queued ahead of a new caller.
+        waves = (self._pending - self.threads + 1) / self.threads
+        return int(min(RETRY_AFTER_MAX, max(1, math.ceil(self._avg_run * max(1.0, waves)))))
+
+
+def _from_env(name: str, label: str, threads: int, queue: int, timeout: float) -> Bulkhead:
+    key = name.upper()
+    return Bulkhead(name, label,
+                    threads=int(os.getenv(f"{key}_THREADS", str(threads))),
+                    queue=int(os.getenv(f"{key}_QUEUE", str(queue))),
+                    timeout=float(os.getenv(f"{key}_TIMEOUT", str(timeout))))
+
+
+YFINANCE = _from_env("yfinance", "Market data", threads=8, queue=32, timeout=120)
+FIRESTORE = _from_env("firestore", "The database", threads=32, queue=256, timeout=10)
+OPENROUTER = _from_env("openrouter", "The AI service", threads=8, queue=32, timeout=150)
+KITE = _from_env("kite", "Zerodha", threads=4, queue=16, timeout=20)
+# Admission control (sandbox_admission) already queues, prioritises and rejects sandbox
+# runs; this pool gives every admitted or queued caller a thread of its own. Strategies on
+# the in-process fast path never reach admission but still run here, so the pool has
+# SANDBOX_FAST_THREADS on top of admission's capacity plus a queue: those short calls wait
+# for a thread instead of turning into a 503 ahead of admission's 429.
+SANDBOX_FAST_THREADS = int(os.getenv("SANDBOX_FAST_THREADS", "8"))
+SANDBOX = _from_env("sandbox", "The strategy sandbox",
+                    threads=sandbox_admission.MAX_CONCURRENT + sandbox_admission.MAX_QUEUE + SANDBOX_FAST_THREADS,
+                    queue=64, timeout=0)
+
+ALL = (YFINANCE, FIRESTORE, OPENROUTER, KITE, SANDBOX)
+
+
+def stats() -> dict:
+    return {b.name: b.stats() for b in ALL}
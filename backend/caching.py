@@ -0,0 +1,484 @@
+"""
+Size-bounded caches for computed results.
+
+Backtests, signal vectors and other derived data are pure functions of their inputs, so
+they can be cached under a content key: a hash of the strategy source, the parameters and
+a fingerprint of the input bars. A new bar changes the fingerprint, so stale entries are
+never returned — they simply stop being asked for and age out of the LRU.
+
+Two tiers, combined by `TieredCache`:
+  * `MemoryLRU` — per-process, bounded by the approximate pickled size of its values.
+  * `DiskLRU`   — one pickle file per key under PATTERNIQ_CACHE_DIR, bounded in bytes,
+                  evicted least-recently-read first. Survives restarts and is shared by
+                  every worker on the host.
+
+Cache files are unpickled, so anyone who can write the cache directory can run code in the
+API. `ensure_private_dir` creates it with mode 0700 and refuses a directory owned by
+another user (e.g. one planted under the world-writable default in /tmp).
+
+Data that is *not* content-addressed (today's quiz, this week's debrief, the leaderboard)
+goes through `LoadingCache` instead: a read-through cache with a TTL, stale-while-
+revalidate, single-flight loading and explicit invalidation.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import pickle
+import stat
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+CACHE_DIR = os.getenv("PATTERNIQ_CACHE_DIR", os.path.join(tempfile.gettempdir(), "patterniq-cache"))
+DISK_EVICT_TO = 0.9   # an eviction pass frees space down to this fraction of the byte budget
+
+_private_dirs: set = set()
+
+
+def ensure_private_dir(path: str) -> str:
+    """Create `path` (mode 0700) and check it is safe to unpickle from; returns it.
+
+    The directory, and the CACHE_DIR root when it lies inside it, must be a real directory
+    (not a symlink) owned by this user; group / other write bits are removed. Raises
+    PermissionError otherwise, which callers treat as "cache disabled".
+    """
+    path = os.path.abspath(path)
+    if path in _private_dirs:
+        return path
+    root = os.path.abspath(CACHE_DIR)
+    for directory in ([root] if path.startswith(root + os.sep) else []) + [path]:
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+        st = os.lstat(directory)
+        if not stat.S_ISDIR(st.st_mode):
+            raise PermissionError(f"{directory} is not a directory; refusing to cache in it")
+        if hasattr(os, "getuid") and st.st_uid != os.getuid():
+            raise PermissionError(f"{directory} is owned by uid {st.st_uid}, not this user; "
+                                  f"set PATTERNIQ_CACHE_DIR to a private directory")
+        if st.st_mode & 0o022:
+            logger.warning(f"Removing group/other write access from cache directory {directory}")
+            os.chmod(directory, stat.S_IMODE(st.st_mode) & ~0o022)
+    _private_dirs.add(path)
+    return path
+
+
+def hash_text(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def make_key(*parts) -> str:
+    """Stable key from JSON-serialisable parts (dict order does not matter)."""
+    return hash_text(json.dumps(parts, sort_keys=True, default=str))
+
+
+def fingerprint_frame(df: pd.DataFrame) -> str:
+    """Content fingerprint of a frame: index, columns and every value."""
+    h = hashlib.sha256()
+    h.update(",".join(map(str, df.columns)).encode("utf-8"))
+    h.update(pd.util.hash_pandas_object(df, index=True).to_numpy().tobytes())
+    return h.hexdigest()
+
+
+def pack_signals(signals: pd.Series) -> dict:
+    """Bit-pack a boolean signal vector (8 bars per byte) for caching."""
+    values = np.asarray(signals, dtype=bool)
+    return {"n": int(values.size), "bits": np.packbits(values).tobytes()}
+
+
+def unpack_signals(packed: dict, index) -> pd.Series:
+    bits = np.unpackbits(np.frombuffer(packed["bits"], dtype=np.uint8), count=packed["n"])
+    return pd.Series(bits.astype(bool), index=index)
+
+
+class MemoryLRU:
+    def __init__(self, max_bytes: int, name: str = "cache"):
+        self.max_bytes = max_bytes
+        self.name = name
+        self._items: OrderedDict = OrderedDict()  # key -> (value, size)
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str, default=None):
+        with self._lock:
+            hit = self._items.get(key)
+            if hit is None:
+                return default
+            self._items.move_to_end(key)
+            return hit[0]
+
+    def put(self, key: str, value, size: int | None = None) -> None:
+        if size is None:
+            size = len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._items[key] = (value, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes and self._items:
+                _, (_, evicted) = self._items.popitem(last=False)
+                self._bytes -= evicted
+                metrics.incr(f"{self.name}.memory.evictions")
+            metrics.set_gauge(f"{self.name}.memory.bytes", self._bytes)
+
+    def pop(self, key: str) -> None:
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+
+    def pop_prefix(self, prefix: str) -> int:
+        with self._lock:
+            keys = [k for k in self._items if k.startswith(prefix)]
+            for key in keys:
+                self._bytes -= self._items.pop(key)[1]
+        return len(keys)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+            self._bytes = 0
+
+
+class DiskLRU:
+    """Keeps a running total of the bytes it holds, so a put costs one write and one stat.
+    Only when the total passes `max_bytes` is the directory scanned (which also picks up what
+    other workers wrote) and the least recently read files removed, on a background thread."""
+
+    def __init__(self, directory: str, max_bytes: int, name: str = "cache"):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.name = name
+        self._lock = threading.Lock()
+        self._evicting = False
+        self._delta = 0   # bytes this process added / removed since an eviction pass's scan
+        try:
+            ensure_private_dir(directory)
+            self._bytes = sum(size for _, size, _ in self._scan())
+            self.enabled = True
+        except OSError as e:
+            logger.warning(f"Disk cache disabled for {directory}: {e}")
+            self._bytes = 0
+            self.enabled = False
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.pkl")
+
+    def get(self, key: str, default=None):
+        if not self.enabled:
+            return default
+        path = self._path(key)
+        try:
+            with open(path, "rb") as fh:
+                value = pickle.load(fh)
+            os.utime(path)  # mark as recently used
+            return value
+        except FileNotFoundError:
+            return default
+        except Exception as e:
+            logger.warning(f"Dropping unreadable cache entry {path}: {e}")
+            self.pop(key)
+            return default
+
+    def put(self, key: str, value) -> int:
+        """Write atomically (tmp + rename) and return the stored size in bytes."""
+        if not self.enabled:
+            return 0
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        if len(blob) > self.max_bytes:
+            return 0
+        path = self._path(key)
+        replaced = self._size(path)
+        try:
+            fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            with os.fdopen(fd, "wb") as fh:
+                fh.write(blob)
+            os.replace(tmp, path)
+        except OSError as e:
+            logger.warning(f"Disk cache write failed: {e}")
+            return 0
+        with self._lock:
+            self._bytes += len(blob) - replaced
+            self._delta += len(blob) - replaced
+            over = self._bytes > self.max_bytes and not self._evicting
+            self._evicting = self._evicting or over
+            metrics.set_gauge(f"{self.name}.disk.bytes", self._bytes)
+        if over:
+            _evict_pool.submit(self._evict)
+        return len(blob)
+
+    def pop(self, key: str) -> None:
+        path = self._path(key)
+        size = self._size(path)
+        try:
+            os.remove(path)
+        except OSError:
+            return
+        with self._lock:
+            self._bytes -= size
+            self._delta -= size
+
+    @staticmethod
+    def _size(path: str) -> int:
+        try:
+            return os.stat(path).st_size
+        except OSError:
+            return 0
+
+    def _scan(self) -> list:
+        """(mtime, size, path) of every entry file; stat errors mean another worker removed it."""
+        stats = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".pkl"):
+                try:
+                    st = entry.stat()
+                except OSError:
+                    continue
+                stats.append((st.st_mtime, st.st_size, entry.path))
+        return stats
+
+    def _evict(self) -> None:
+        try:
+            stats = self._scan()
+        except OSError:
+            stats = None
+        with self._lock:
+            self._delta = 0
+        if stats is not None:
+            total = sum(size for _, size, _ in stats)
+            for _, size, path in sorted(stats):
+                if total <= self.max_bytes * DISK_EVICT_TO:
+                    break
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                total -= size
+                metrics.incr(f"{self.name}.disk.evictions")
+        with self._lock:
+            if stats is not None:
+                # Resynced with the directory (other workers write to it too), plus what this
+                # process wrote or removed while the pass ran.
+                self._bytes = total + self._delta
+            self._evicting = False
+            metrics.set_gauge(f"{self.name}.disk.bytes", self._bytes)
+
+
+class TieredCache:
+    """Memory in front of disk: reads promote disk hits into memory, writes go to both."""
+
+    _MISS = object()
+
+    def __init__(self, name: str, memory_bytes: int, disk_bytes: int, directory: str | None = None):
+        self.name = name
+        self.memory = MemoryLRU(memory_bytes, name)
+        self.disk = DiskLRU(directory or os.path.join(CACHE_DIR, name), disk_bytes, name) if disk_bytes else None
+
+    def get(self, key: str, default=None):
+        value = self.memory.get(key, self._MISS)
+        if value is not self._MISS:
+            metrics.incr(f"{self.name}.hits.memory")
+            return value
+        if self.disk is not None:
+            value = self.disk.get(key, self._MISS)
+            if value is not self._MISS:
+                metrics.incr(f"{self.name}.hits.disk")
+                self.memory.put(key, value)
+                return value
+        metrics.incr(f"{self.name}.misses")
+        return default
+
+    def put(self, key: str, value) -> None:
+        size = self.disk.put(key, value) if self.disk is not None else None
+        self.memory.put(key, value, size or None)
+
+    def pop(self, key: str) -> None:
+        self.memory.pop(key)
+        if self.disk is not None:
+            self.disk.pop(key)
+
+
+# Disk evictions scan a directory, so they run here rather than in the caller of put().
+_evict_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="cache-evict")
+
+# Loaders (Firestore reads, LLM calls) run here, never on the event loop; waiters just
+# hold a future, so a stampede of identical requests occupies one thread, not N.
+_loader_pool = ThreadPoolExecutor(max_workers=int(os.getenv("CACHE_LOADER_THREADS", "8")),
+                                  thread_name_prefix="cache-loader")
+
+
+SHARED_LEASE_SECONDS = 120   # longest a worker waits for another worker's load (LLM calls are slow)
+
+
+class LoadingCache:
+    """Read-through cache for values produced by a slow loader.
+
+    An entry is fresh for `ttl` seconds; for `stale_ttl` seconds after that it is still
+    returned while one background reload replaces it (stale-while-revalidate). Concurrent
+    misses for a key share a single loader call (single-flight). A loader that raises
+    caches nothing and every waiter sees the exception. `invalidate(prefix)` drops the
+    matching entries, detaches their loads already in flight (the waiters they have get
+    the result, but it is not stored and later callers start a new load) and runs the
+    registered invalidation hooks; other keys are untouched.
+
+    With a `shared` store (shared_store.SharedStore) the cache spans every worker on the
+    host: a load first looks for a value another worker published, otherwise takes the
+    key's cross-process lease so only one worker calls the loader, and publishes the
+    result. Invalidation bumps the shared generation, which retires every worker's
+    in-memory copies.
+
+    Metrics: `{name}.hits`, `.stale_hits`, `.misses`, `.shared_hits`, `.coalesced`,
+    `.load_errors` and the `{name}.load` timer.
+    """
+
+    _MISS = object()
+
+    def __init__(self, name: str, ttl: float, stale_ttl: float = 0.0, memory_bytes: int = 8 * 1024 * 1024,
+                 shared=None):
+        self.name = name
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.shared = shared
+        self._memory = MemoryLRU(memory_bytes, name)
+        self._inflight: dict = {}   # key -> Future of its current load; only that load stores
+        self._lock = threading.Lock()
+        self._hooks: list = []
+
+    def add_invalidation_hook(self, hook) -> None:
+        """`hook(prefix)` runs after every invalidate(), e.g. to drop HTTP validators too."""
+        self._hooks.append(hook)
+
+    def get(self, key: str, loader, ttl: float | None = None, stale_ttl: float | None = None,
+            timeout: float | None = None, executor=None):
+        """The cached value for `key`, loading it with `loader()` when missing or expired.
+        `ttl` / `stale_ttl` override the cache defaults for entries this call stores; loads
+        run on `executor` (anything with `submit`, e.g. a bulkhead) or the shared loader pool."""
+        value, future = self._lookup(key, loader, ttl, stale_ttl, executor)
+        return value if future is None else future.result(timeout)
+
+    async def aget(self, key: str, loader, ttl: float | None = None, stale_ttl: float | None = None,
+                   executor=None):
+        """`get` for async endpoints: waiting for a load does not block the event loop."""
+        value, future = self._lookup(key, loader, ttl, stale_ttl, executor)
+        return value if future is None else await asyncio.wrap_future(future)
+
+    def fresh_for(self, key: str) -> float:
+        """Seconds until the cached value for `key` goes stale; 0 if missing or already stale.
+        Lets a response's max-age end when the value it was rendered from does."""
+        entry = self._memory.get(key)
+        return max(0.0, entry[1] - time.monotonic()) if entry is not None else 0.0
+
+    def invalidate(self, prefix: str) -> None:
+        with self._lock:
+            for key in [k for k in self._inflight if k.startswith(prefix)]:
+                del self._inflight[key]
+        dropped = self._memory.pop_prefix(prefix)
+        if self.shared is not None:
+            self.shared.delete_prefix(f"{self.name}:{prefix}")
+            self.shared.bump_generation(self.name)
+        metrics.incr(f"{self.name}.invalidations", dropped)
+        for hook in self._hooks:
+            hook(prefix)
+
+    def _lookup(self, key: str, loader, ttl: float | None, stale_ttl: float | None, executor=None):
+        entry = self._memory.get(key)
+        if entry is not None and self.shared is not None and entry[3] != self.shared.generation(self.name):
+            self._memory.pop(key)   # another worker invalidated since this copy was loaded
+            entry = None
+        if entry is not None:
+            value, fresh_until, stale_until, _ = entry
+            now = time.monotonic()
+            if now < fresh_until:
+                metrics.incr(f"{self.name}.hits")
+                return value, None
+            if now < stale_until:
+                metrics.incr(f"{self.name}.stale_hits")
+                self._load(key, loader, ttl, stale_ttl, executor)
+                return value, None
+        metrics.incr(f"{self.name}.misses")
+        return self._MISS, self._load(key, loader, ttl, stale_ttl, executor)
+
+    def _load(self, key: str, loader, ttl: float | None, stale_ttl: float | None, executor=None) -> Future:
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                metrics.incr(f"{self.name}.coalesced")
+                return future
+            future = self._inflight[key] = Future()
+        try:
+            (executor or _loader_pool).submit(self._run, key, loader, self.ttl if ttl is None else ttl,
+                                              self.stale_ttl if stale_ttl is None else stale_ttl, future)
+        except Exception as e:
+            # Refused by a saturated executor: every waiter sees the refusal, nothing is cached.
+            metrics.incr(f"{self.name}.load_errors")
+            self._retire(key, future)
+            future.set_exception(e)
+        return future
+
+    def _retire(self, key: str, future: Future) -> bool:
+        """Remove `future` as the key's current load; False if invalidate() already detached it."""
+        with self._lock:
+            if self._inflight.get(key) is not future:
+                return False
+            del self._inflight[key]
+            return True
+
+    def _run(self, key: str, loader, ttl: float, stale_ttl: float, future: Future) -> None:
+        start = time.perf_counter()
+        generation = self.shared.generation(self.name) if self.shared is not None else 0
+        try:
+            if self.shared is None:
+                value, fresh_for = loader(), ttl
+            else:
+                value, fresh_for = self._load_shared(key, loader, ttl, stale_ttl, generation)
+        except BaseException as e:
+            metrics.incr(f"{self.name}.load_errors")
+            logger.warning(f"{self.name}: loading {key} failed: {e}")
+            self._retire(key, future)
+            future.set_exception(e)
+            return
+        metrics.observe(f"{self.name}.load", time.perf_counter() - start)
+        with self._lock:
+            if self._inflight.get(key) is future:
+                now = time.monotonic()
+                self._memory.put(key, (value, now + fresh_for, now + fresh_for + stale_ttl, generation))
+                del self._inflight[key]
+        future.set_result(value)
+
+    def _load_shared(self, key: str, loader, ttl: float, stale_ttl: float, generation: int):
+        """(value, seconds it stays fresh): another worker's published value, else our load."""
+        shared_key = f"{self.name}:{key}"
+
+        def published():
+            entry = self.shared.get(shared_key)
+            if entry is not None and entry[1] > time.time():
+                metrics.incr(f"{self.name}.shared_hits")
+                return entry[0], entry[1] - time.time()
+            return None
+
+        found = published()
+        if found is not None:
+            return found
+        with self.shared.lease(shared_key, ttl=SHARED_LEASE_SECONDS, wait=SHARED_LEASE_SECONDS):
+            found = published()   # the previous lease holder may just have published it
+            if found is not None:
+                return found
+            value = loader()
+            if self.shared.generation(self.name) == generation:
+                self.shared.put(shared_key, (value, time.time() + ttl), ttl + stale_ttl)
+            return value, ttl
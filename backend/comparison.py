@@ -0,0 +1,79 @@
+"""
+Multi-strategy comparison runs (/api/backtest/compare) over one fetch of the bars.
+
+Each strategy is an entry dict (`label`, `code`, `tree`, `error`) built by the endpoint once
+its code is resolved. From there:
+
+  1. `cached_signals` fills in the signals already in the signal cache (keyed by code hash
+     and data fingerprint, as for single backtests) and returns the rest as sandbox jobs,
+     after one indicator pass over the union of the columns those scripts reference.
+  2. The caller runs the jobs in one batched sandbox invocation and hands the results to
+     `record_signals`, which caches them or turns a failed job into the entry's error.
+  3. `compare_report` simulates every entry with signals and aligns the equity curves on
+     one shared date axis; an entry with an error keeps its row with an empty curve.
+"""
+
+from __future__ import annotations
+
+import pandas as pd
+
+import backtest_engine
+from caching import hash_text, make_key, pack_signals, unpack_signals
+from indicators import DEFAULT_INDICATORS, compute_indicators, project
+from strategy_analysis import referenced_columns
+
+
+def cached_signals(entries: list, cache, data: pd.DataFrame, date_col: str, interval: str,
+                   data_fingerprint: str):
+    """Fill `signals` from `cache` where possible; returns (pending entries, their batch jobs)."""
+    needed = set()
+    pending = []
+    for e in entries:
+        if e["error"]:
+            continue
+        e["signal_key"] = make_key("signals", hash_text(e["code"]), data_fingerprint)
+        packed = cache.get(e["signal_key"])
+        if packed is not None:
+            e["signals"] = unpack_signals(packed, data.index)
+            continue
+        e["columns"] = referenced_columns(e["tree"])
+        needed |= e["columns"] if e["columns"] is not None else set(DEFAULT_INDICATORS)
+        pending.append(e)
+    if not pending:
+        return [], []
+    compute_indicators(data, needed, date_col, interval)
+    jobs = [(e["code"], project(data, e["columns"]) if e["columns"] is not None else data) for e in pending]
+    return pending, jobs
+
+
+def record_signals(pending: list, results: list, cache) -> None:
+    """Attach batch results (`return_exceptions=True` order) to their entries and cache them."""
+    for e, result in zip(pending, results):
+        if isinstance(result, Exception):
+            e["error"] = f"Strategy Script Error: {str(result)}"
+            continue
+        e["signals"] = result
+        cache.put(e["signal_key"], pack_signals(result))
+
+
+def compare_report(entries: list, data: pd.DataFrame, date_col: str, capital: float, sl_percent: float,
+                   target_percent: float, risk_percent: float) -> dict:
+    """Per-strategy metrics plus equity curves on the union of exit dates (forward-filled)."""
+    first_bar = data[date_col].iloc[0].strftime(backtest_engine.DATE_FORMAT)
+    curves, rows = [], []
+    for e in entries:
+        row = {"label": e["label"], "error": e["error"], "python_code": e.get("code", "")}
+        if "signals" in e and not e["error"]:
+            state = backtest_engine.new_state(capital)
+            trades, equity_points, _ = backtest_engine.simulate(
+                data, date_col, e["signals"], sl_percent, target_percent, risk_percent, state)
+            row.update(backtest_engine.summarize(state, capital))
+            curves.append(pd.Series({first_bar: capital, **{p["date"]: p["equity"] for p in equity_points}}))
+        else:
+            curves.append(pd.Series({first_bar: capital}))
+        rows.append(row)
+
+    aligned = pd.concat(curves, axis=1).sort_index().ffill()
+    for row, column in zip(rows, aligned.columns):
+        row["equity"] = [round(v, 2) for v in aligned[column]] if not row["error"] else []
+    return {"dates": list(aligned.index), "strategies": rows}
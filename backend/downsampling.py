@@ -0,0 +1,57 @@
+"""
+Largest-Triangle-Three-Buckets (LTTB) downsampling for chart series.
+
+A long intraday backtest produces tens of thousands of equity / drawdown points while the
+chart is about a thousand pixels wide. LTTB keeps the first and last point, splits the rest
+into `threshold - 2` equal buckets and from each bucket keeps the point forming the largest
+triangle with the previously kept point and the average of the next bucket. Peaks, troughs
+and drawdown spikes survive, unlike with a fixed stride.
+"""
+
+from __future__ import annotations
+
+import numpy as np
+
+
+def lttb(x, y, threshold: int) -> np.ndarray:
+    """Indices of the points LTTB keeps, ascending; all indices when `threshold` >= len(x)."""
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n = x.size
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    # Bucket i (of threshold - 2) covers [edges[i], edges[i + 1]); bucket averages come
+    # from cumulative sums, so only the triangle areas are evaluated per bucket.
+    edges = (np.floor(np.arange(threshold - 1) * ((n - 2) / (threshold - 2))) + 1).astype(int)
+    edges[-1] = n - 1
+    cx = np.concatenate(([0.0], np.cumsum(x)))
+    cy = np.concatenate(([0.0], np.cumsum(y)))
+    # The "next bucket" of the last bucket is the final point itself.
+    next_lo = np.append(edges[1:-1], n - 1)
+    next_hi = np.append(edges[2:], n)
+    avg_x = (cx[next_hi] - cx[next_lo]) / (next_hi - next_lo)
+    avg_y = (cy[next_hi] - cy[next_lo]) / (next_hi - next_lo)
+
+    keep = np.empty(threshold, dtype=int)
+    keep[0], keep[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        lo, hi = edges[i], edges[i + 1]
+        xa, ya = x[a], y[a]
+        area = np.abs((xa - avg_x[i]) * (y[lo:hi] - ya) - (xa - x[lo:hi]) * (avg_y[i] - ya))
+        a = lo + int(area.argmax())
+        keep[i + 1] = a
+    return keep
+
+
+def downsample_points(points: list, value_key: str, max_points: int) -> list:
+    """Keep at most `max_points` of an ordered list of chart dicts, LTTB on `value_key`.
+
+    The x axis is the position in the list (bar / trade order). `max_points` of 0 or a list
+    already within budget returns `points` unchanged.
+    """
+    if not max_points or len(points) <= max_points:
+        return points
+    y = np.fromiter((p[value_key] for p in points), dtype=float, count=len(points))
+    return [points[i] for i in lttb(np.arange(len(points)), y, max_points)]
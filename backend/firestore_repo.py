@@ -0,0 +1,78 @@
+"""
+Firestore access for the async endpoints, through a bounded thread-pool bridge.
+
+The firebase_admin Firestore client is synchronous: a `.get()` or `.stream()` written
+inline in an `async def` endpoint blocks the event loop for the whole round trip, so one
+slow read stalls every request on the worker. Here every call runs on the Firestore
+bulkhead (bulkheads.FIRESTORE, FIRESTORE_THREADS threads) and is awaited, so a worker keeps
+serving while its reads are in flight. Each call has a deadline (FIRESTORE_TIMEOUT seconds,
+also handed to the client so the RPC itself is abandoned) that surfaces as 504, and records
+a latency timer named `firestore.<op>` in /api/metrics.
+
+The helpers cover the shapes the endpoints use: read a document, list a query, add / set /
+update / delete. Anything more involved (a read followed by dependent writes, or a sync
+helper that mixes Firestore with other work) goes through `run()` as one function, so it
+costs one trip to the pool.
+"""
+
+from __future__ import annotations
+
+import time
+
+from fastapi import HTTPException
+
+import metrics
+from bulkheads import FIRESTORE, DependencyTimeout
+
+FIRESTORE_TIMEOUT = FIRESTORE.timeout
+
+
+async def run(op: str, fn, *args, timeout: float | None = None, **kwargs):
+    """Await `fn(*args, **kwargs)` on the Firestore pool; 504 if it outlives `timeout`,
+    503 if the pool and its queue are full."""
+    start = time.perf_counter()
+    try:
+        return await FIRESTORE.run(fn, *args, timeout=timeout, **kwargs)
+    except DependencyTimeout:
+        # The thread finishes (or hits the client deadline) on its own; the request stops waiting.
+        metrics.incr("firestore.timeouts")
+        raise
+    except HTTPException:
+        raise
+    except Exception:
+        metrics.incr("firestore.errors")
+        raise
+    finally:
+        metrics.observe(f"firestore.{op}", time.perf_counter() - start)
+
+
+async def get(op: str, ref) -> dict | None:
+    """The document's fields, or None if it does not exist."""
+    def read():
+        doc = ref.get(timeout=FIRESTORE_TIMEOUT)
+        return doc.to_dict() if doc.exists else None
+    return await run(op, read)
+
+
+async def documents(op: str, query) -> list:
+    """Every document a query yields, as `{'id': ..., **fields}` (the stream is drained
+    on the pool, since iterating it is what does the I/O)."""
+    return await run(op, lambda: [{'id': d.id, **d.to_dict()} for d in query.stream(timeout=FIRESTORE_TIMEOUT)])
+
+
+async def add(op: str, collection, data: dict) -> str:
+    """Create a document with a generated id and return the id."""
+    _, ref = await run(op, lambda: collection.add(data, timeout=FIRESTORE_TIMEOUT))
+    return ref.id
+
+
+async def set(op: str, ref, data: dict, merge: bool = False) -> None:
+    await run(op, lambda: ref.set(data, merge=merge, timeout=FIRESTORE_TIMEOUT))
+
+
+async def update(op: str, ref, data: dict) -> None:
+    await run(op, lambda: ref.update(data, timeout=FIRESTORE_TIMEOUT))
+
+
+async def delete(op: str, ref) -> None:
+    await run(op, lambda: ref.delete(timeout=FIRESTORE_TIMEOUT))
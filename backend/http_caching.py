@@ -0,0 +1,81 @@
+"""
+HTTP conditional caching (ETag / If-None-Match / Cache-Control) for read-mostly endpoints.
+
+A response body's ETag is a hash of its bytes. Computing it needs the body, and the body
+needs a Firestore read (or a scan), so ETags are also remembered per resource key for as
+long as the resource is known not to change: until midnight for daily data, for one scan
+tick for the anomaly scan, and until `invalidate()` for data that a write endpoint changes.
+A revalidation that arrives inside that window and still holds the current ETag is answered
+with 304 before the endpoint touches Firestore at all.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import threading
+import time
+from datetime import datetime, timedelta
+
+from fastapi.responses import Response
+
+import metrics
+
+_validators: dict = {}   # resource key -> (etag, valid until as epoch seconds)
+_lock = threading.Lock()
+
+
+def seconds_until_midnight() -> int:
+    """Seconds left in the current (server-local) day: the life of date.today()-keyed data."""
+    now = datetime.now()
+    midnight = datetime.combine(now.date() + timedelta(days=1), datetime.min.time())
+    return max(1, int((midnight - now).total_seconds()))
+
+
+def etag_of(body: bytes) -> str:
+    return '"' + hashlib.sha256(body).hexdigest()[:24] + '"'
+
+
+def _matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    tags = [t.strip() for t in if_none_match.split(",")]
+    # Weak comparison, as RFC 9110 requires for If-None-Match.
+    return "*" in tags or any(t.removeprefix("W/") == etag for t in tags)
+
+
+def _not_modified(etag: str, max_age: int) -> Response:
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": f"public, max-age={max_age}"})
+
+
+def precheck(key: str, if_none_match: str | None, max_age: int) -> Response | None:
+    """A 304 if the client already holds the remembered, still-valid version of `key`; its
+    max-age never outlasts the remembered version."""
+    with _lock:
+        entry = _validators.get(key)
+    now = time.time()
+    if entry is None or entry[1] <= now or not _matches(if_none_match, entry[0]):
+        return None
+    metrics.incr("http.not_modified")
+    return _not_modified(entry[0], min(max_age, int(entry[1] - now)))
+
+
+def conditional(response: Response, key: str, if_none_match: str | None, max_age: int,
+                valid_for: int | None = None) -> Response:
+    """Tag a freshly rendered `response` and remember its ETag for `valid_for` seconds
+    (default `max_age`); answers 304 instead when the client's copy is already current."""
+    etag = etag_of(response.body)
+    with _lock:
+        _validators[key] = (etag, time.time() + (valid_for if valid_for is not None else max_age))
+    if _matches(if_none_match, etag):
+        metrics.incr("http.not_modified")
+        return _not_modified(etag, max_age)
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = f"public, max-age={max_age}"
+    return response
+
+
+def invalidate(prefix: str) -> None:
+    """Forget remembered ETags for every key starting with `prefix` (call after writes)."""
+    with _lock:
+        for key in [k for k in _validators if k.startswith(prefix)]:
+            del _validators[key]
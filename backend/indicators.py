@@ -0,0 +1,173 @@
+"""
+On-demand technical indicators for the backtesting engine.
+
+Strategies reference indicators by their pandas_ta column names (`RSI_14`, `SMA_50`,
+`MACDs_12_26_9`, ...). Instead of guessing up front which indicators to append, the engine
+reads the column names a strategy actually uses (see `strategy_analysis.referenced_columns`)
+and asks this module to compute exactly those. Unknown names are simply left alone so the
+strategy fails with a clear KeyError instead of a silent wrong answer.
+
+A `@<interval>` suffix asks for a higher timeframe (`RSI_14@1d`, `Close@1h`). Those columns
+are computed on bars resampled from the same base series and forward-filled onto the base
+timeline by bar *close* time, so a base bar only ever sees higher-timeframe bars that had
+already completed when it closed (no lookahead).
+"""
+
+from __future__ import annotations
+
+import re
+from collections import defaultdict
+
+import pandas as pd
+import pandas_ta as ta
+
+from resampling import bar_close_times, can_derive, resample_ohlcv
+
+BASE_COLUMNS = ["Open", "High", "Low", "Close", "Volume"]
+MAX_LENGTH = 500  # upper bound on any indicator window parsed from a column name
+
+# Shown to the strategy-code generator so it only writes columns we can compute.
+SUPPORTED_INDICATORS = [
+    "RSI_<n>", "SMA_<n>", "EMA_<n>", "WMA_<n>",
+    "MACD_<fast>_<slow>_<signal>", "MACDh_<fast>_<slow>_<signal>", "MACDs_<fast>_<slow>_<signal>",
+    "BBL_<n>_<std>", "BBM_<n>_<std>", "BBU_<n>_<std>",
+    "ATRr_<n>", "ADX_<n>", "DMP_<n>", "DMN_<n>",
+    "STOCHk_<k>_<d>_<smooth>", "STOCHd_<k>_<d>_<smooth>",
+]
+TIMEFRAME_SEP = "@"
+TIMEFRAME_HINT = "Append @<interval> for a higher timeframe, e.g. 'RSI_14@1d', 'SMA_50@1h', 'Close@1d'."
+# What gets computed when a strategy's column use cannot be determined statically.
+DEFAULT_INDICATORS = ["RSI_14", "SMA_50", "MACD_12_26_9", "MACDh_12_26_9", "MACDs_12_26_9"]
+
+
+def _lengths_ok(*values) -> bool:
+    return all(0 < v <= MAX_LENGTH for v in values)
+
+
+def _moving(data, m):
+    kind, n = m.group(1), int(m.group(2))
+    if not _lengths_ok(n):
+        return None
+    fn = {"RSI": ta.rsi, "SMA": ta.sma, "EMA": ta.ema, "WMA": ta.wma}[kind]
+    return {m.group(0): fn(data["Close"], length=n)}
+
+
+def _macd(data, m):
+    fast, slow, signal = int(m.group(1)), int(m.group(2)), int(m.group(3))
+    if not _lengths_ok(fast, slow, signal) or fast >= slow:
+        return None
+    out = ta.macd(data["Close"], fast=fast, slow=slow, signal=signal)
+    return {c: out[c] for c in out.columns} if out is not None else None
+
+
+def _bbands(data, m):
+    n, std = int(m.group(1)), float(m.group(2))
+    if not _lengths_ok(n) or not 0 < std <= 10:
+        return None
+    out = ta.bbands(data["Close"], length=n, std=std)
+    if out is None:
+        return None
+    # pandas_ta versions disagree on the suffix (BBL_20_2.0 vs BBL_20_2.0_2.0); key by band.
+    bands = {}
+    for col in out.columns:
+        band = col.split("_", 1)[0]
+        bands[f"{band}_{n}_{m.group(2)}"] = out[col]
+    return bands
+
+
+def _atr(data, m):
+    n = int(m.group(1))
+    if not _lengths_ok(n):
+        return None
+    return {m.group(0): ta.atr(data["High"], data["Low"], data["Close"], length=n)}
+
+
+def _adx(data, m):
+    n = int(m.group(2))
+    if not _lengths_ok(n):
+        return None
+    out = ta.adx(data["High"], data["Low"], data["Close"], length=n)
+    return {c: out[c] for c in out.columns} if out is not None else None
+
+
+def _stoch(data, m):
+    k, d, smooth = int(m.group(2)), int(m.group(3)), int(m.group(4))
+    if not _lengths_ok(k, d, smooth):
+        return None
+    out = ta.stoch(data["High"], data["Low"], data["Close"], k=k, d=d, smooth_k=smooth)
+    return {c: out[c] for c in out.columns} if out is not None else None
+
+
+INDICATOR_PATTERNS = [
+    (re.compile(r"^(RSI|SMA|EMA|WMA)_(\d+)$"), _moving),
+    (re.compile(r"^MACD[hs]?_(\d+)_(\d+)_(\d+)$"), _macd),
+    (re.compile(r"^BB[LMUBP]_(\d+)_(\d+(?:\.\d+)?)$"), _bbands),
+    (re.compile(r"^ATRr_(\d+)$"), _atr),
+    (re.compile(r"^(ADX|DMP|DMN)_(\d+)$"), _adx),
+    (re.compile(r"^STOCH([kd])_(\d+)_(\d+)_(\d+)$"), _stoch),
+]
+
+
+def is_indicator(column: str) -> bool:
+    return any(p.match(column) for p, _ in INDICATOR_PATTERNS)
+
+
+def compute_indicators(data: pd.DataFrame, columns, date_col: str | None = None,
+                       interval: str | None = None) -> list:
+    """Append each requested indicator column that `data` does not already have.
+
+    Multi-output indicators (MACD, Bollinger, ADX, Stochastic) are computed once per
+    parameter set. `name@tf` columns need `date_col` and the base `interval`. Returns the
+    requested names that are neither present nor computable.
+    """
+    columns = set(columns)
+    timeframed = {c for c in columns if TIMEFRAME_SEP in c and c not in data.columns}
+    if timeframed and date_col is not None and interval is not None:
+        _compute_timeframe_columns(data, timeframed, date_col, interval)
+    unknown = sorted(c for c in timeframed if c not in data.columns)
+    for column in sorted(columns - timeframed):
+        if column in data.columns:
+            continue
+        for pattern, fn in INDICATOR_PATTERNS:
+            m = pattern.match(column)
+            if m:
+                produced = fn(data, m)
+                if produced:
+                    for name, series in produced.items():
+                        if series is not None and name not in data.columns:
+                            data[name] = series
+                break
+        if column not in data.columns:
+            unknown.append(column)
+    return unknown
+
+
+def _compute_timeframe_columns(data: pd.DataFrame, columns, date_col: str, interval: str) -> None:
+    wanted = defaultdict(set)
+    for column in columns:
+        name, timeframe = column.rsplit(TIMEFRAME_SEP, 1)
+        if timeframe != interval and can_derive(timeframe, interval):
+            wanted[timeframe].add(name)
+    if not wanted:
+        return
+    bars = data.set_index(date_col)[[c for c in BASE_COLUMNS if c in data.columns]]
+    tz = bars.index.tz
+    # A base bar can use a higher-timeframe value once the base bar itself has closed.
+    ready = pd.DataFrame({"ready": bar_close_times(bars.index, interval, tz)})
+    for timeframe, names in wanted.items():
+        higher = resample_ohlcv(bars, timeframe)
+        compute_indicators(higher, names)
+        present = [n for n in names if n in higher.columns]
+        if not present:
+            continue
+        right = higher[present].rename(columns=lambda n: f"{n}{TIMEFRAME_SEP}{timeframe}")
+        right.insert(0, "available", bar_close_times(higher.index, timeframe, tz))
+        merged = pd.merge_asof(ready, right.sort_values("available").reset_index(drop=True),
+                               left_on="ready", right_on="available", direction="backward")
+        for column in right.columns[1:]:
+            data[column] = merged[column].to_numpy()
+
+
+def project(data: pd.DataFrame, columns) -> pd.DataFrame:
+    """Only the referenced columns that exist (the index always ships with them)."""
+    return data[[c for c in data.columns if c in columns]]
@@ -1,16 +1,18 @@
 import os
+import asyncio
 import math
 import time
 import hashlib
+import hmac
 import threading
 from urllib.parse import quote
 import yfinance as yf
 import pandas as pd
 import pandas_ta as ta
 import requests
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Header
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from dotenv import load_dotenv
 from datetime import datetime, timedelta, date
 import firebase_admin
@@ -20,7 +22,26 @@ import logging
 import numpy as np
 from fastapi import Query
 from fastapi.concurrency import run_in_threadpool
-from strategy_sandbox import safe_execute_strategy
+from strategy_sandbox import safe_execute_batch, safe_execute_strategy, safe_execute_strategy_batch, validate_strategy
+from strategy_analysis import analyze_cost, referenced_columns
+from indicators import DEFAULT_INDICATORS, SUPPORTED_INDICATORS, TIMEFRAME_HINT, compute_indicators, project
+import backtest_engine
+import comparison
+from downsampling import downsample_points
+import market_data
+import monte_carlo
+import portfolio
+import response_formats
+from compression import CompressionMiddleware
+import http_caching
+import firestore_repo
+import bulkheads
+from shared_store import get_shared_store
+from response_formats import FastJSONResponse
+from paper_trading import PaperTradingEngine
+from caching import LoadingCache, TieredCache, fingerprint_frame, hash_text, make_key, pack_signals, unpack_signals
+from sandbox_admission import LANE_INTERACTIVE, SandboxBusy, sandbox_admission
+import metrics
 
 # --- Setup Logging ---
 logging.basicConfig(level=logging.INFO)
@@ -48,6 +69,7 @@ except Exception as e:
 load_dotenv()
 OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
 OPENROUTER_URL = "https://openrouter.ai/api/v1/chat/completions"
+OPENROUTER_REQUEST_TIMEOUT = 60  # seconds per completion; strategy generation makes two
 
 # --- Zerodha Kite Connect (optional broker integration; gated behind env credentials) ---
 # Set KITE_API_KEY / KITE_API_SECRET in the environment to enable "Connect Broker".
@@ -57,6 +79,8 @@ KITE_API_SECRET = os.getenv("KITE_API_SECRET")
 KITE_BASE = "https://api.kite.trade"
 
 app = FastAPI(title="PatternIQ API")
+# Large JSON bodies (backtests, feed, saved strategies) go out brotli/gzip-compressed.
+app.add_middleware(CompressionMiddleware)
 origins = [
     "http://localhost:5173",
     "http://localhost:3000",
@@ -247,36 +271,57 @@ def analyze_index_data(index_name: str):
         "live_alerts": live_alerts
     }
 
+SCAN_MAX_AGE = int(os.getenv("SCAN_MAX_AGE", "300"))  # seconds a scan result is served as current
+
+def run_anomaly_scan(index: str) -> dict:
+    """One live scan of `index`: log its alerts to Firestore and return the chart data."""
+    results = analyze_index_data(index)
+
+    if db and results["live_alerts"]:
+        batch = db.batch()
+        alerts_ref = db.collection("alerts")
+
+        old_docs = alerts_ref.order_by("timestamp", direction=firestore.Query.DESCENDING).offset(50).stream()
+        for doc in old_docs:
+            batch.delete(doc.reference)
+
+        for alert in results["live_alerts"]:
+            new_ref = alerts_ref.document()
+            db_alert = alert.copy()
+            db_alert["timestamp"] = firestore.SERVER_TIMESTAMP
+            batch.set(new_ref, db_alert)
+
+        batch.commit()
+
+    # Strips out Firebase Sentinel objects so React can read the JSON cleanly
+    return {
+        "scatterData": results["scatterData"],
+        "rsiData": results["rsiData"],
+        "distributionData": results["distributionData"],
+        "sectorData": results["sectorData"],
+        "radarData": results["radarData"]
+    }
+
 @app.get("/api/scan-anomalies")
-async def scan_anomalies(index: str = Query("NIFTY_50", description="The market index to scan")):
+async def scan_anomalies(index: str = Query("NIFTY_50", description="The market index to scan"),
+                         format: str | None = Query(None, description="json, columnar or msgpack"),
+                         accept: str | None = Header(None), if_none_match: str | None = Header(None)):
+    fmt = response_formats.negotiate(accept, format)
+    # One scan per SCAN_MAX_AGE: a client revalidating within it gets a 304 without a rescan.
+    # max-age and the remembered ETag both end when the cached snapshot goes stale.
+    cache_key, etag_key = f"scan:{index.upper()}", f"scan:{index.upper()}:{fmt}"
+    not_modified = http_caching.precheck(etag_key, if_none_match, SCAN_MAX_AGE)
+    if not_modified:
+        return not_modified
     try:
-        results = analyze_index_data(index)
-        
-        if db and results["live_alerts"]:
-            batch = db.batch()
-            alerts_ref = db.collection("alerts")
-            
-            old_docs = alerts_ref.order_by("timestamp", direction=firestore.Query.DESCENDING).offset(50).stream()
-            for doc in old_docs:
-                batch.delete(doc.reference)
-                
-            for alert in results["live_alerts"]:
-                new_ref = alerts_ref.document()
-                db_alert = alert.copy()
-                db_alert["timestamp"] = firestore.SERVER_TIMESTAMP
-                batch.set(new_ref, db_alert)
-                
-            batch.commit()
-        
-        # Strips out Firebase Sentinel objects so React can read the JSON cleanly
-        return {
-            "scatterData": results["scatterData"],
-            "rsiData": results["rsiData"],
-            "distributionData": results["distributionData"],
-            "sectorData": results["sectorData"],
-            "radarData": results["radarData"]
-        }
-        
+        # The snapshot is shared by every request and every worker until it ages out.
+        snapshot = await app_cache.aget(cache_key, lambda: run_anomaly_scan(index), ttl=SCAN_MAX_AGE,
+                                        executor=bulkheads.YFINANCE)
+        remaining = int(app_cache.fresh_for(cache_key))
+        return http_caching.conditional(response_formats.render(snapshot, fmt), etag_key, if_none_match,
+                                        remaining, valid_for=remaining)
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Scan failed: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail="Failed to run live anomaly scan")
@@ -298,12 +343,16 @@ def call_openrouter(prompt: str) -> str:
         "temperature": 0.2
     }
     
-    response = requests.post(OPENROUTER_URL, headers=headers, json=data)
+    response = requests.post(OPENROUTER_URL, headers=headers, json=data, timeout=OPENROUTER_REQUEST_TIMEOUT)
     response.raise_for_status()  # Will throw an exception for 4xx/5xx errors
     
     return response.json()['choices'][0]['message']['content']
 
 
+# Longest history a request may ask for (ten years of daily bars; intraday is bounded by
+# the provider horizon anyway). Larger values would only make the fetch and simulation slower.
+MAX_LOOKBACK_DAYS = 3650
+
 # --- NEW: Updated Pydantic Model for Backtest Request ---
 class BacktestRequest(BaseModel):
     symbol: str
@@ -315,162 +364,241 @@ class BacktestRequest(BaseModel):
     mode: str = "ai"           # NEW: 'ai' or 'python'
     strategy_text: str = ""    # Optional now
     custom_script: str = ""    # NEW: Used when mode is 'python'
+    userId: str = ""           # Used for fair sandbox scheduling between users
+    monte_carlo_runs: int = 10000  # trade-resampling simulations for confidence bands (0 = off)
+    lookback_days: int = Field(0, ge=0, le=MAX_LOOKBACK_DAYS)  # 0 = 59 days intraday / 180 days daily
+    max_points: int = 0        # chart point budget per curve (LTTB); 0 = full resolution
+    trades_limit: int = 0      # trades returned inline; 0 = all, the rest via /api/backtest/runs/{run_id}/trades
 
 INDEX_MAP = { "NIFTY": "^NSEI", "NIFTY 50": "^NSEI", "BANKNIFTY": "^NSEBANK", "NIFTY BANK": "^NSEBANK", "SENSEX": "^BSESN" }
 
+# Full backtest payloads keyed by (strategy source hash, exit/sizing params, symbol, interval,
+# fingerprint of the input bars). Re-running a saved or shared strategy on unchanged history
+# is a cache hit; any new bar changes the fingerprint and naturally misses. Payloads are
+# large, so endpoints get / put them via run_in_threadpool (pickling and disk I/O off the loop).
+backtest_cache = TieredCache(
+    "backtest_cache",
+    memory_bytes=int(os.getenv("BACKTEST_CACHE_MEMORY_MB", "64")) * 1024 * 1024,
+    disk_bytes=int(os.getenv("BACKTEST_CACHE_DISK_MB", "512")) * 1024 * 1024,
+)
+# Bit-packed entry signals keyed by (code hash, data fingerprint): changing only SL/target/
+# risk/capital re-uses them and jumps straight to the simulation stage.
+signal_cache = TieredCache("signal_cache", memory_bytes=16 * 1024 * 1024, disk_bytes=128 * 1024 * 1024)
+# Generated find_signals code per AI strategy text, so re-runs skip both LLM coding calls.
+strategy_code_cache = TieredCache("strategy_code_cache", memory_bytes=4 * 1024 * 1024, disk_bytes=32 * 1024 * 1024)
+# Read-mostly Firestore / LLM / scan data (calendar events, debrief, daily quiz, leaderboard,
+# anomaly scans): one loader call per key however many requests -- and uvicorn workers, via
+# the shared SQLite store -- ask together. Invalidating a key also drops its remembered
+# HTTP ETag, so the next revalidation re-reads.
+app_cache = LoadingCache("app_cache", ttl=300, shared=get_shared_store())
+app_cache.add_invalidation_hook(http_caching.invalidate)
+
+
+# Bars of history re-fed to the strategy ahead of the new bars when a saved run is continued,
+# so its own shift()/rolling() windows see the same context they had in the full run.
+CONTINUATION_WARMUP_BARS = 500
+
+
+def fetch_backtest_data(symbol: str, interval: str, days: int = 0):
+    """Cleaned OHLCV history for a backtest: (frame with a RangeIndex, date column name).
+
+    Bars come from the stitched local history (market_data), so `days` may reach past the
+    provider's single-request limit: intraday defaults to 59 days, daily to 180.
+    """
+    ticker = INDEX_MAP.get(symbol.upper(), f"{symbol.upper()}.NS")
+    is_intraday = interval in ["1m", "5m", "15m", "30m", "1h"]
+    start_date = datetime.now() - timedelta(days=days or (59 if is_intraday else 180))
+    end_date = datetime.now()
+
+    data = market_data.history(ticker, interval, start_date, end_date)
+    if data.empty:
+        raise HTTPException(404, "No data found for this symbol/timeframe combination.")
+
+    # Clean Data
+    data.columns = [col[0] if isinstance(col, tuple) else col for col in data.columns]
+    data.reset_index(inplace=True)
+    date_col = 'Datetime' if 'Datetime' in data.columns else 'Date'
+    data.dropna(inplace=True)
+    data.reset_index(drop=True, inplace=True)
+    return data, date_col
+
+
+def strategy_frame(tree, data: pd.DataFrame, date_col: str, interval: str) -> pd.DataFrame:
+    """Column projection: compute only the indicators the strategy reads (including
+    higher-timeframe `name@tf` columns) and keep only those columns (plus the index)."""
+    referenced = referenced_columns(tree)
+    compute_indicators(data, referenced if referenced is not None else DEFAULT_INDICATORS, date_col, interval)
+    return project(data, referenced) if referenced is not None else data
+
+
+def resolve_strategy_code(request: BacktestRequest, data: pd.DataFrame, date_col: str):
+    """Stage 2: the find_signals source for a request, generated by the LLM in AI mode.
+
+    Returns (code, code_cache_key); the key is set only for freshly generated code, which the
+    caller stores in strategy_code_cache once the code has run successfully.
+    """
+    code_cache_key = make_key("ai-code", " ".join(request.strategy_text.split()).lower(), date_col)
+    cached_code = strategy_code_cache.get(code_cache_key) if request.mode == "ai" else None
+    if cached_code:
+        return cached_code, None
+    if request.mode == "ai":
+        # AI as a PROJECT MANAGER (Strategy Parser)
+        parsing_prompt = f"""
+        You are a trading strategy analysis bot. Parse the user's strategy and convert it into a JSON object.
+        Strategy: "{request.strategy_text}"
+        Extract:
+        1. "entry_condition": Description of entry signal.
+        2. "pattern_to_find": Chart pattern name or "none".
+        Return ONLY the JSON object.
+        """
+        response_text = call_openrouter(parsing_prompt)
+        cleaned_response = response_text.strip().replace('```json', '').replace('```', '')
+        params = json.loads(cleaned_response)
+
+        # AI as a SPECIALIST CODER (TA Code Generator)
+        if params.get('pattern_to_find') != "none":
+            available_columns = ", ".join(f"'{col}'" for col in data.columns)
+            indicator_columns = ", ".join(SUPPORTED_INDICATORS)
+            coding_prompt = f"""
+            Write a single Python function named `find_signals` that takes a pandas DataFrame `data` as input.
+            Analyze the data for: "{params['entry_condition']}".
+            CRITICAL: Use ONLY these columns: {available_columns}. Use '{date_col}' for time.
+            Indicator columns use pandas_ta names and are computed automatically when referenced: {indicator_columns} (e.g. 'RSI_14', 'SMA_50', 'MACDs_12_26_9').
+            {TIMEFRAME_HINT} Higher-timeframe columns only change once that higher bar has closed.
+            SANDBOX RULES (mandatory): do NOT use any import statements, and do NOT reference the pandas or numpy modules (no `pd.`/`np.`).
+            Use only the `data` DataFrame, its columns, and operators/methods like .shift(), .rolling(), .mean(), &, |, >, <.
+            Return a pandas Series of booleans (True = entry signal).
+            Provide ONLY the Python code.
+            """
+            code_response_text = call_openrouter(coding_prompt)
+            code_to_execute = code_response_text.strip().replace('```python', '').replace('```', '')
+        else:
+            # Fallback for simple conditions. RSI_14 is computed by the column projection
+            # in Stage 3 (the sandbox forbids imports inside find_signals).
+            code_to_execute = "def find_signals(data):\n    return data['RSI_14'] < 30"
+    else:
+        # mode == 'python' (User provided their own script)
+        return request.custom_script, None
+    return code_to_execute, code_cache_key
+
+
+async def strategy_signals(code: str, tree, data: pd.DataFrame, date_col: str, interval: str,
+                           data_fingerprint: str, user_id: str = ""):
+    """(entry signals for `code` over `data`, whether they came from signal_cache)."""
+    signal_key = make_key("signals", hash_text(code), data_fingerprint)
+    packed = signal_cache.get(signal_key)
+    if packed is not None:
+        return unpack_signals(packed, data.index), True
+    strategy_data = strategy_frame(tree, data, date_col, interval)
+    # Run on the sandbox pool so the isolated-subprocess wait never blocks the event loop.
+    entry_signals = await bulkheads.SANDBOX.run(safe_execute_strategy, code, strategy_data, user_id=user_id or None)
+    signal_cache.put(signal_key, pack_signals(entry_signals))
+    return entry_signals, False
+
+
+# Curves thinned by shape_backtest_payload, with the field LTTB keeps the extremes of.
+DOWNSAMPLED_SERIES = {"equity_curve": "equity", "drawdown_curve": "drawdown", "scatter_data": "y"}
+MAX_TRADES_PAGE = 5000
+# Kept in the cached payload for the deferred AI review, never sent to the client.
+PRIVATE_PAYLOAD_FIELDS = ("analysis_prompt",)
+
+def shape_backtest_payload(payload: dict, run_id: str, max_points: int = 0, trades_limit: int = 0) -> dict:
+    """The response view of a cached full-resolution backtest payload.
+
+    Curves are LTTB-downsampled to `max_points` and the inline trades cut to `trades_limit`;
+    `run_id` addresses the full payload in backtest_cache for the paginated trades endpoint.
+    Returns a new dict: the cached payload itself is never modified.
+    """
+    shaped = {k: v for k, v in payload.items() if k not in PRIVATE_PAYLOAD_FIELDS}
+    shaped["run_id"] = run_id
+    full_sizes = {}
+    for key, value_key in DOWNSAMPLED_SERIES.items():
+        points = payload.get(key) or []
+        shaped[key] = downsample_points(points, value_key, max_points)
+        if len(shaped[key]) < len(points):
+            full_sizes[key] = len(points)
+    trades = payload.get("trades") or []
+    if trades_limit and len(trades) > trades_limit:
+        shaped["trades"] = trades[:trades_limit]
+    shaped["trades_total"] = len(trades)
+    shaped["downsampled"] = full_sizes
+    return shaped
 
 @app.post("/api/backtest")
-async def perform_backtest(request: BacktestRequest):
+async def perform_backtest(request: BacktestRequest,
+                           format: str | None = Query(None, description="json, columnar or msgpack"),
+                           accept: str | None = Header(None)):
+    fmt = response_formats.negotiate(accept, format)
     try:
         # --- STAGE 1: Data Fetching (Required for both modes) ---
-        ticker = INDEX_MAP.get(request.symbol.upper(), f"{request.symbol.upper()}.NS")
-        is_intraday = request.interval in ["1m", "5m", "15m", "30m", "1h"]
-        start_date = datetime.now() - timedelta(days=59 if is_intraday else 180)
-        end_date = datetime.now()
-        
-        data = yf.download(ticker, start=start_date, end=end_date, interval=request.interval, auto_adjust=True, progress=False)
-        if data.empty: 
-            raise HTTPException(404, "No data found for this symbol/timeframe combination.")
-        
-        # Clean Data
-        data.columns = [col[0] if isinstance(col, tuple) else col for col in data.columns]
-        data.reset_index(inplace=True)
-        date_col = 'Datetime' if 'Datetime' in data.columns else 'Date'
-        data.dropna(inplace=True)
-        data.reset_index(drop=True, inplace=True)
-
-        code_to_execute = ""
-        
+        data, date_col = await bulkheads.YFINANCE.run(fetch_backtest_data, request.symbol, request.interval,
+                                                      days=request.lookback_days)
+        # A still-forming bar must not become the engine state's last_timestamp.
+        data = backtest_engine.closed_bars(data, date_col, request.interval)
+        data_fingerprint = fingerprint_frame(data)
+
         # --- STAGE 2: Code Generation OR Custom Script Loading ---
-        if request.mode == "ai":
-            # AI as a PROJECT MANAGER (Strategy Parser)
-            parsing_prompt = f"""
-            You are a trading strategy analysis bot. Parse the user's strategy and convert it into a JSON object.
-            Strategy: "{request.strategy_text}"
-            Extract:
-            1. "entry_condition": Description of entry signal.
-            2. "pattern_to_find": Chart pattern name or "none".
-            3. "required_indicators": List of indicators (e.g., ["RSI", "MACD", "SMA_50"]).
-            Return ONLY the JSON object.
-            """
-            response_text = call_openrouter(parsing_prompt)
-            cleaned_response = response_text.strip().replace('```json', '').replace('```', '')
-            params = json.loads(cleaned_response)
-
-            # Append requested indicators
-            required_indicators = params.get('required_indicators', [])
-            if "RSI" in required_indicators: data.ta.rsi(length=14, append=True)
-            if "MACD" in required_indicators: data.ta.macd(append=True)
-            if "SMA_50" in required_indicators: data.ta.sma(length=50, append=True)
-            
-            # AI as a SPECIALIST CODER (TA Code Generator)
-            if params.get('pattern_to_find') != "none":
-                available_columns = ", ".join(f"'{col}'" for col in data.columns)
-                coding_prompt = f"""
-                Write a single Python function named `find_signals` that takes a pandas DataFrame `data` as input.
-                Analyze the data for: "{params['entry_condition']}".
-                CRITICAL: Use ONLY these columns: {available_columns}. Use '{date_col}' for time. All indicator columns already exist.
-                SANDBOX RULES (mandatory): do NOT use any import statements, and do NOT reference the pandas or numpy modules (no `pd.`/`np.`).
-                Use only the `data` DataFrame, its columns, and operators/methods like .shift(), .rolling(), .mean(), &, |, >, <.
-                Return a pandas Series of booleans (True = entry signal).
-                Provide ONLY the Python code.
-                """
-                code_response_text = call_openrouter(coding_prompt)
-                code_to_execute = code_response_text.strip().replace('```python', '').replace('```', '')
-            else:
-                # Fallback for simple conditions — attach the indicator OUTSIDE, then keep the
-                # strategy code pure (the sandbox forbids imports inside find_signals).
-                if 'RSI_14' not in data.columns:
-                    data.ta.rsi(length=14, append=True)
-                code_to_execute = "def find_signals(data):\n    return data['RSI_14'] < 30"
-        else:
-            # mode == 'python' (User provided their own script)
-            code_to_execute = request.custom_script
+        code_to_execute, code_cache_key = await bulkheads.OPENROUTER.run(resolve_strategy_code, request, data, date_col)
+
+        strategy_desc = request.strategy_text if request.mode == 'ai' else "Custom Python Script"
+        cache_key = make_key("backtest", hash_text(code_to_execute), request.symbol.upper(), request.interval,
+                             request.capital, request.risk_percent, request.sl_percent, request.target_percent,
+                             strategy_desc, request.monte_carlo_runs, data_fingerprint)
+        cached = await run_in_threadpool(backtest_cache.get, cache_key)
+        if cached is not None:
+            return response_formats.render(
+                shape_backtest_payload(cached, cache_key, request.max_points, request.trades_limit), fmt)
 
         # --- STAGE 3: Validate & Sandbox-Execute the Strategy Script ---
         # safe_execute_strategy validates the AST and runs find_signals with no access
         # to app globals, secrets, os, network or imports (see STRATEGY SANDBOX above).
         try:
-            # Run in a worker thread so the isolated-subprocess wait never blocks the event loop.
-            entry_signals = await run_in_threadpool(safe_execute_strategy, code_to_execute, data)
+            tree = validate_strategy(code_to_execute)
+            # Static cost pass: flags per-row loops / rolling-in-loop so the UI can show hints.
+            cost_report = analyze_cost(tree)
+            if cost_report["per_row_loops"]:
+                logger.info(f"Strategy cost {cost_report['complexity']}: {len(cost_report['per_row_loops'])} per-row loop(s), "
+                            f"vectorizable={cost_report['vectorizable']}")
+            entry_signals, signals_cached = await strategy_signals(code_to_execute, tree, data, date_col,
+                                                                   request.interval, data_fingerprint, request.userId)
+            if code_cache_key:
+                strategy_code_cache.put(code_cache_key, code_to_execute)
+        except SandboxBusy as e:
+            # Fast-fail instead of piling up subprocesses; the client retries after the hint.
+            raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+        except HTTPException:
+            raise
         except Exception as e:
             logger.error(f"Script Execution Error: {e}", exc_info=True)
             raise HTTPException(status_code=400, detail=f"Strategy Script Error: {str(e)}")
 
         # --- STAGE 4: Execute Backtest Loop ---
-        capital = request.capital
-        equity = [capital]
-        trades = []
-        in_trade = False
-        peak_equity = capital
-        drawdown_data = [{'date': data[date_col].iloc[0].strftime('%Y-%m-%d %H:%M'), 'drawdown': 0}]
-        
-        for i in range(1, len(data)):
-            if not in_trade and entry_signals.iloc[i]:
-                in_trade = True
-                entry_price = data['Close'][i]
-                stop_loss_price = entry_price * (1 - request.sl_percent / 100)
-                target_price = entry_price * (1 + request.target_percent / 100)
-                trade_info = {'entry_date': data[date_col][i], 'entry_price': entry_price}
-
-            elif in_trade:
-                current_price = data['Close'][i]
-                exit_reason = "Target" if current_price >= target_price else "Stop-Loss" if current_price <= stop_loss_price else None
-                if exit_reason:
-                    pnl_percent = (current_price / entry_price - 1) * 100
-                    trade_info.update({'exit_date': data[date_col][i], 'exit_price': current_price, 'pnl_percent': pnl_percent, 'reason': exit_reason})
-                    trades.append(trade_info)
-                    
-                    position_size = capital * (request.risk_percent / 100) / (request.sl_percent / 100) if request.sl_percent > 0 else capital
-                    capital += position_size * (pnl_percent / 100)
-                    equity.append(capital)
-                    
-                    peak_equity = max(peak_equity, capital)
-                    drawdown = (peak_equity - capital) / peak_equity * 100 if peak_equity > 0 else 0
-                    drawdown_data.append({'date': data[date_col][i].strftime('%Y-%m-%d %H:%M'), 'drawdown': drawdown})
-                    in_trade = False
+        # The engine state returned with the result lets a saved strategy be continued over
+        # only the bars that arrive later (see refresh_user_strategy).
+        engine_state = backtest_engine.new_state(request.capital)
+        trades, equity_points, drawdown_points = backtest_engine.simulate(
+            data, date_col, entry_signals, request.sl_percent, request.target_percent,
+            request.risk_percent, engine_state)
+        first_bar = data[date_col].iloc[0].strftime(backtest_engine.DATE_FORMAT)
+        drawdown_data = [{'date': first_bar, 'drawdown': 0}] + drawdown_points
+
+        # Confidence bands: resample the trade sequence (one vectorized matrix per chunk).
+        monte_carlo_report = await run_in_threadpool(
+            monte_carlo.simulate_trades, [t['pnl_percent'] for t in trades], request.capital,
+            request.risk_percent, request.sl_percent, request.monte_carlo_runs,
+            seed=int(cache_key[:8], 16))
 
         # --- STAGE 5: AI as a BUSINESS ANALYST (Performance Reviewer) ---
-        final_equity = equity[-1]
-        pnl = final_equity - request.capital
-        pnl_percent = (pnl / request.capital) * 100 if request.capital > 0 else 0
-        wins = [t for t in trades if t['pnl_percent'] > 0]
-        losses = [t for t in trades if t['pnl_percent'] <= 0]
-        win_rate = (len(wins) / len(trades)) * 100 if trades else 0
-        max_drawdown = max(d['drawdown'] for d in drawdown_data) if drawdown_data else 0
-        total_profit = sum(t['pnl_percent'] for t in wins)
-        total_loss = abs(sum(t['pnl_percent'] for t in losses))
-        profit_factor = total_profit / total_loss if total_loss > 0 else 999.0
-
-        avg_win = (sum(t['pnl_percent'] for t in wins) / len(wins)) if wins else 0
-        avg_loss = (abs(sum(t['pnl_percent'] for t in losses)) / len(losses)) if losses else 0
+        summary = backtest_engine.summarize(engine_state, request.capital)
+        final_equity = engine_state['capital']
+        pnl, pnl_percent = summary['pnl'], summary['pnl_percent']
+        win_rate, profit_factor, max_drawdown = summary['win_rate'], summary['profit_factor'], summary['max_drawdown']
 
         # Chart Data Formatting
-        scatter_data = []
-        monthly_pnl_map = {}
-        formatted_trades = []
-        
-        for i, trade in enumerate(trades):
-            duration_hours = (trade['exit_date'] - trade['entry_date']).total_seconds() / 3600
-            scatter_data.append({"id": i, "x": round(duration_hours, 1), "y": round(trade['pnl_percent'], 2)})
-            month_key = trade['exit_date'].strftime('%b %Y')
-            monthly_pnl_map[month_key] = monthly_pnl_map.get(month_key, 0) + trade['pnl_percent']
-            
-            trade_copy = trade.copy()
-            trade_copy['entry_date'] = trade['entry_date'].strftime('%Y-%m-%d %H:%M')
-            trade_copy['exit_date'] = trade['exit_date'].strftime('%Y-%m-%d %H:%M')
-            trade_copy['entry_price'] = round(trade['entry_price'], 2)
-            trade_copy['exit_price'] = round(trade['exit_price'], 2)
-            trade_copy['pnl_percent'] = round(trade['pnl_percent'], 2)
-            formatted_trades.append(trade_copy)
-
+        formatted_trades, scatter_data, monthly_pnl_map = backtest_engine.format_trades(trades)
         bar_data = [{"month": k, "pnl": round(v, 2)} for k, v in monthly_pnl_map.items()]
-        pie_data = [
-            {"id": 0, "value": len(wins), "label": "Winning Trades", "color": "#4caf50"},
-            {"id": 1, "value": len(losses), "label": "Losing Trades", "color": "#f44336"}
-        ]
+        pie_data = backtest_engine.pie_data(engine_state)
 
-        strategy_desc = request.strategy_text if request.mode == 'ai' else "Custom Python Script"
         analysis_prompt = f"""
         Analyze this backtest report in Markdown format.
         **Data:**
@@ -490,29 +618,294 @@ async def perform_backtest(request: BacktestRequest):
         ### Actionable Insight
         [suggestion]
         """
-        ai_explanation = call_openrouter(analysis_prompt).strip()
+        if signals_cached:
+            # Only exit / sizing parameters changed: answer in milliseconds and let the client
+            # fetch the review from /api/backtest/runs/{run_id}/explanation.
+            ai_explanation = None
+        else:
+            ai_explanation = (await bulkheads.OPENROUTER.run(call_openrouter, analysis_prompt)).strip()
         
-        equity_curve_data = [{'date': data[date_col].iloc[0].strftime('%Y-%m-%d %H:%M'), 'equity': request.capital}]
-        for i, trade in enumerate(trades):
-            equity_curve_data.append({'date': trade['exit_date'].strftime('%Y-%m-%d %H:%M'), 'equity': equity[i+1]})
+        equity_curve_data = [{'date': first_bar, 'equity': request.capital}] + equity_points
+        # Every trade return, so a refresh of a saved (trades_limit-cut) result keeps Monte Carlo whole.
+        backtest_engine.record_pnls(engine_state, trades)
 
         # --- STAGE 6: Return Response with Downloadable Python Code ---
-        return {
-            "pnl": round(pnl, 2), "pnl_percent": round(pnl_percent, 2),
-            "win_rate": round(win_rate, 2), "num_trades": len(trades),
-            "max_drawdown": round(max_drawdown, 2), "profit_factor": round(profit_factor, 2),
-            "avg_win": round(avg_win, 2), "avg_loss": round(avg_loss, 2),
+        payload = {
+            **summary,
             "equity_curve": equity_curve_data, "drawdown_curve": drawdown_data,
             "scatter_data": scatter_data, "bar_data": bar_data, "pie_data": pie_data,
             "ai_explanation": ai_explanation, "trades": formatted_trades,
+            "strategy_analysis": cost_report, "engine_state": engine_state,
+            "monte_carlo": monte_carlo_report, "analysis_prompt": analysis_prompt,
             "python_code": code_to_execute # <- THIS ENABLES THE .PY DOWNLOAD BUTTON
         }
+        await run_in_threadpool(backtest_cache.put, cache_key, payload)
+        return response_formats.render(
+            shape_backtest_payload(payload, cache_key, request.max_points, request.trades_limit), fmt)
     except HTTPException as http_exc:
         raise http_exc
     except Exception as e:
         logger.error(f"Unexpected error: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Unexpected server error: {str(e)}")
 
+@app.get("/api/backtest/runs/{run_id}/trades")
+async def get_backtest_trades(run_id: str, offset: int = Query(0, ge=0), limit: int = Query(500, ge=1, le=MAX_TRADES_PAGE),
+                              outcome: str = Query("all", pattern="^(all|wins|losses)$"),
+                              format: str | None = Query(None, description="json, columnar or msgpack"),
+                              accept: str | None = Header(None)):
+    """Full-resolution trades of a backtest run, a page at a time (run_id from /api/backtest)."""
+    fmt = response_formats.negotiate(accept, format)
+    payload = await run_in_threadpool(backtest_cache.get, run_id)
+    if payload is None or "trades" not in payload:
+        raise HTTPException(404, "Backtest run not found or expired. Re-run the backtest.")
+    trades = payload["trades"]
+    if outcome == "wins":
+        trades = [t for t in trades if t["pnl_percent"] > 0]
+    elif outcome == "losses":
+        trades = [t for t in trades if t["pnl_percent"] <= 0]
+    return response_formats.render({"run_id": run_id, "total": len(trades), "offset": offset, "limit": limit,
+                                    "trades": trades[offset:offset + limit]}, fmt)
+
+@app.get("/api/backtest/runs/{run_id}/explanation")
+async def get_backtest_explanation(run_id: str):
+    """AI review of a backtest run, for runs that answered without one (cached signals)."""
+    payload = await run_in_threadpool(backtest_cache.get, run_id)
+    if payload is None or "analysis_prompt" not in payload:
+        raise HTTPException(404, "Backtest run not found or expired. Re-run the backtest.")
+    if payload.get("ai_explanation") is None:
+        try:
+            explanation = (await bulkheads.OPENROUTER.run(call_openrouter, payload["analysis_prompt"])).strip()
+        except HTTPException:
+            raise
+        except Exception as e:
+            logger.error(f"Deferred AI review failed: {e}", exc_info=True)
+            raise HTTPException(502, "Could not generate the AI review. Please retry.")
+        payload = {**payload, "ai_explanation": explanation}
+        await run_in_threadpool(backtest_cache.put, run_id, payload)
+    return {"run_id": run_id, "ai_explanation": payload["ai_explanation"]}
+
+class WalkForwardRequest(BacktestRequest):
+    folds: int = 5
+    in_sample_percent: float = 70.0
+    lookback_days: int = Field(730, ge=0, le=MAX_LOOKBACK_DAYS)  # longer history to split into windows
+
+@app.post("/api/backtest/walk-forward")
+async def walk_forward_backtest(request: WalkForwardRequest):
+    """Rolling in-sample / out-of-sample analysis from a single signal pass over the history."""
+    if not 1 <= request.folds <= 50:
+        raise HTTPException(400, "folds must be between 1 and 50.")
+    data, date_col = await bulkheads.YFINANCE.run(fetch_backtest_data, request.symbol, request.interval,
+                                                  days=request.lookback_days)
+    data_fingerprint = fingerprint_frame(data)
+    code, code_cache_key = await bulkheads.OPENROUTER.run(resolve_strategy_code, request, data, date_col)
+
+    cache_key = make_key("walk-forward", hash_text(code), request.symbol.upper(), request.interval,
+                         request.capital, request.risk_percent, request.sl_percent, request.target_percent,
+                         request.folds, request.in_sample_percent, data_fingerprint)
+    cached = await run_in_threadpool(backtest_cache.get, cache_key)
+    if cached is not None:
+        return cached
+
+    try:
+        tree = validate_strategy(code)
+        entry_signals, _ = await strategy_signals(code, tree, data, date_col, request.interval, data_fingerprint,
+                                                  request.userId)
+    except SandboxBusy as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Script Execution Error: {e}", exc_info=True)
+        raise HTTPException(status_code=400, detail=f"Strategy Script Error: {str(e)}")
+    if code_cache_key:
+        strategy_code_cache.put(code_cache_key, code)
+
+    try:
+        report = backtest_engine.walk_forward(
+            data, date_col, entry_signals, request.sl_percent, request.target_percent, request.risk_percent,
+            request.capital, folds=request.folds, in_sample_fraction=request.in_sample_percent / 100)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    payload = {**report, "python_code": code}
+    await run_in_threadpool(backtest_cache.put, cache_key, payload)
+    return payload
+
+class CompareStrategy(BaseModel):
+    label: str = ""
+    mode: str = "ai"           # 'ai' or 'python', as in BacktestRequest
+    strategy_text: str = ""
+    custom_script: str = ""
+
+class CompareRequest(BaseModel):
+    symbol: str
+    interval: str
+    capital: float
+    risk_percent: float
+    sl_percent: float
+    target_percent: float
+    strategies: list[CompareStrategy]
+    userId: str = ""
+    lookback_days: int = Field(0, ge=0, le=MAX_LOOKBACK_DAYS)
+
+MAX_COMPARE_STRATEGIES = 10
+
+@app.post("/api/backtest/compare")
+async def compare_strategies(request: CompareRequest):
+    """Side-by-side backtests of several strategies on one symbol/interval.
+
+    The bars are fetched and enriched once (union of all referenced indicators), every
+    script not already in signal_cache runs in one batched sandbox invocation, and the
+    equity curves come back on a shared date axis.
+    """
+    if not 1 <= len(request.strategies) <= MAX_COMPARE_STRATEGIES:
+        raise HTTPException(400, f"Compare between 1 and {MAX_COMPARE_STRATEGIES} strategies.")
+    data, date_col = await bulkheads.YFINANCE.run(fetch_backtest_data, request.symbol, request.interval,
+                                                  days=request.lookback_days)
+    data_fingerprint = fingerprint_frame(data)
+    common = request.model_dump(exclude={"strategies"})
+
+    async def resolve(i: int, strategy: CompareStrategy) -> dict:
+        single = BacktestRequest(**common, mode=strategy.mode, strategy_text=strategy.strategy_text,
+                                 custom_script=strategy.custom_script)
+        label = strategy.label or (strategy.strategy_text[:40] if strategy.mode == "ai" else f"Script {i + 1}")
+        entry = {"label": label, "error": None}
+        try:
+            entry["code"], entry["code_cache_key"] = await bulkheads.OPENROUTER.run(resolve_strategy_code, single,
+                                                                                    data, date_col)
+            entry["tree"] = validate_strategy(entry["code"])
+        except HTTPException:
+            raise
+        except Exception as e:
+            entry["error"] = f"Strategy Script Error: {str(e)}"
+        return entry
+
+    # Code generation for all strategies at once; the LLM round trips dominate otherwise.
+    entries = list(await asyncio.gather(*(resolve(i, strategy) for i, strategy in enumerate(request.strategies))))
+
+    # One enrichment pass for every strategy, then one batch for the signal cache misses.
+    pending, jobs = await run_in_threadpool(comparison.cached_signals, entries, signal_cache, data, date_col,
+                                            request.interval, data_fingerprint)
+    if jobs:
+        try:
+            results = await bulkheads.SANDBOX.run(safe_execute_batch, jobs, user_id=request.userId or None,
+                                                  lane=LANE_INTERACTIVE, return_exceptions=True)
+        except SandboxBusy as e:
+            raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+        comparison.record_signals(pending, results, signal_cache)
+        for e in pending:
+            if not e["error"] and e["code_cache_key"]:
+                strategy_code_cache.put(e["code_cache_key"], e["code"])
+
+    return comparison.compare_report(entries, data, date_col, request.capital, request.sl_percent,
+                                     request.target_percent, request.risk_percent)
+
+class PortfolioBacktestRequest(BaseModel):
+    index: str = "NIFTY_50"    # a MARKET_INDICES key, used when `symbols` is empty
+    symbols: list[str] = []
+    interval: str = "1d"
+    capital: float
+    risk_percent: float
+    sl_percent: float
+    target_percent: float
+    max_positions: int = 10
+    mode: str = "ai"
+    strategy_text: str = ""
+    custom_script: str = ""
+    userId: str = ""
+    lookback_days: int = Field(1095, ge=0, le=MAX_LOOKBACK_DAYS)
+
+MAX_PORTFOLIO_SYMBOLS = 100
+
+PORTFOLIO_FETCH_CONCURRENCY = 8   # fetches in flight per portfolio request, each on the yfinance bulkhead
+
+async def _fetch_basket(symbols: list, interval: str, days: int) -> dict:
+    limit = asyncio.Semaphore(PORTFOLIO_FETCH_CONCURRENCY)
+
+    async def fetch(symbol):
+        async with limit:
+            return await _try_fetch(symbol, interval, days)
+
+    fetched = await asyncio.gather(*(fetch(sym) for sym in symbols))
+    return {sym: f for sym, f in zip(symbols, fetched) if f is not None}
+
+async def _try_fetch(symbol: str, interval: str, days: int):
+    try:
+        return await bulkheads.YFINANCE.run(fetch_backtest_data, symbol, interval, days=days)
+    except (bulkheads.BulkheadFull, bulkheads.DependencyTimeout):
+        raise   # the whole basket fails fast rather than silently dropping symbols
+    except HTTPException:
+        return None
+    except Exception as e:
+        logger.warning(f"Portfolio fetch failed for {symbol}: {e}")
+        return None
+
+async def _portfolio_run(request: PortfolioBacktestRequest, symbols: list) -> dict:
+    frames = await _fetch_basket(symbols, request.interval, request.lookback_days)
+    if not frames:
+        raise HTTPException(404, "No data found for any symbol in the basket.")
+    names = list(frames)
+    first, date_col = frames[names[0]]
+
+    single = BacktestRequest(symbol=names[0], **request.model_dump(
+        include={"interval", "capital", "risk_percent", "sl_percent", "target_percent",
+                 "mode", "strategy_text", "custom_script", "userId", "lookback_days"}))
+    code, code_cache_key = await bulkheads.OPENROUTER.run(resolve_strategy_code, single, first, date_col)
+    try:
+        tree = validate_strategy(code)
+        datasets = await run_in_threadpool(
+            lambda: [strategy_frame(tree, frames[sym][0], date_col, request.interval) for sym in names])
+        # Every symbol's frame through one batched sandbox invocation.
+        results = await bulkheads.SANDBOX.run(safe_execute_strategy_batch, code, datasets,
+                                              user_id=request.userId or None, lane=LANE_INTERACTIVE,
+                                              return_exceptions=True)
+    except (SandboxBusy, HTTPException):
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Strategy Script Error: {str(e)}")
+    if code_cache_key and not all(isinstance(r, Exception) for r in results):
+        strategy_code_cache.put(code_cache_key, code)
+    return await run_in_threadpool(_portfolio_report, request, symbols, frames, date_col, results, code)
+
+def _portfolio_report(request: PortfolioBacktestRequest, symbols: list, frames: dict, date_col: str,
+                      results: list, code: str) -> dict:
+    closes, signals, skipped = {}, {}, {sym: "no data" for sym in symbols if sym not in frames}
+    for sym, result in zip(frames, results):
+        if isinstance(result, Exception):
+            skipped[sym] = str(result)
+            continue
+        data = frames[sym][0]
+        closes[sym] = pd.Series(data['Close'].to_numpy(), index=data[date_col])
+        signals[sym] = pd.Series(result.to_numpy(dtype=bool), index=data[date_col])
+    if not closes:
+        raise HTTPException(400, "The strategy failed on every symbol in the basket.")
+
+    # (time x symbol) matrices on the union of bar times; missing bars are NaN / no signal.
+    close_matrix = pd.DataFrame(closes).sort_index()
+    signal_matrix = pd.DataFrame(signals).reindex(close_matrix.index).fillna(False).astype(bool)
+    result = portfolio.simulate_portfolio(
+        close_matrix.to_numpy(dtype=float), signal_matrix.to_numpy(), request.capital, request.risk_percent,
+        request.sl_percent, request.target_percent, max_positions=request.max_positions)
+    report = portfolio.portfolio_report(result, close_matrix.index, list(close_matrix.columns), request.capital)
+    return {**report, "symbols": list(close_matrix.columns), "skipped": skipped, "python_code": code}
+
+@app.post("/api/backtest/portfolio")
+async def portfolio_backtest(request: PortfolioBacktestRequest,
+                             format: str | None = Query(None, description="json, columnar or msgpack"),
+                             accept: str | None = Header(None)):
+    """One strategy over a basket with shared capital, concurrent positions and a position limit."""
+    fmt = response_formats.negotiate(accept, format)
+    symbols = [s.upper() for s in request.symbols] or MARKET_INDICES.get(request.index.upper())
+    if not symbols:
+        raise HTTPException(400, f"Unknown index '{request.index}'. Use one of: {', '.join(MARKET_INDICES)}.")
+    if len(symbols) > MAX_PORTFOLIO_SYMBOLS:
+        raise HTTPException(400, f"At most {MAX_PORTFOLIO_SYMBOLS} symbols per portfolio backtest.")
+    if request.max_positions < 1:
+        raise HTTPException(400, "max_positions must be at least 1.")
+    try:
+        return response_formats.render(await _portfolio_run(request, symbols), fmt)
+    except SandboxBusy as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+
 NIFTY_50_SAMPLE = ["RELIANCE.NS", "TCS.NS", "HDFCBANK.NS", "INFY.NS", "HINDUNILVR.NS", "ICICIBANK.NS", "BHARTIARTL.NS", "SBIN.NS", "ITC.NS", "LT.NS"]
 
 def scan_stocks_for_anomalies_task():
@@ -654,8 +1047,8 @@ def fetch_kite_holdings(user_id: str) -> list:
         logger.warning(f"Kite holdings fetch failed for {user_id}: {e}")
         return []
 
-def build_portfolio(user_id: str) -> dict:
-    """Assemble a live portfolio from manual + broker holdings, priced via yfinance."""
+def read_manual_holdings(user_id: str) -> list:
+    """The user's manually entered holdings from Firestore ([] if they cannot be read)."""
     manual = []
     try:
         for doc in db.collection('users').document(user_id).collection('holdings').stream():
@@ -665,9 +1058,14 @@ def build_portfolio(user_id: str) -> dict:
                                "avg_price": float(d["avg_price"]), "source": "manual"})
     except Exception as e:
         logger.error(f"Failed to read holdings for {user_id}: {e}")
-
-    broker = get_broker_connection(user_id)
-    broker_holdings = fetch_kite_holdings(user_id) if broker.get("connected") else []
+    return manual
+
+async def build_portfolio(user_id: str) -> dict:
+    """Assemble a live portfolio from manual + broker holdings, priced via yfinance.
+    Firestore, Kite and yfinance are each called on their own bulkhead."""
+    manual = await firestore_repo.run("holdings.list", read_manual_holdings, user_id)
+    broker = await firestore_repo.run("broker.status", get_broker_connection, user_id)
+    broker_holdings = await bulkheads.KITE.run(fetch_kite_holdings, user_id) if broker.get("connected") else []
     all_holdings = manual + broker_holdings
 
     if not all_holdings:
@@ -677,7 +1075,7 @@ def build_portfolio(user_id: str) -> dict:
             "risk": {"level": "N/A", "score": 0, "detail": "Add holdings or connect your broker to begin."},
         }
 
-    prices = fetch_prices_and_vol(list({h["symbol"] for h in all_holdings}))
+    prices = await bulkheads.YFINANCE.run(fetch_prices_and_vol, list({h["symbol"] for h in all_holdings}))
     holdings, sector_alloc = [], {}
     total_invested = total_current = 0.0
     for h in all_holdings:
@@ -717,7 +1115,9 @@ async def get_portfolio(user_id: str):
     if not db:
         raise HTTPException(500, "Firestore not initialized.")
     try:
-        return build_portfolio(user_id)
+        return await build_portfolio(user_id)
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Failed to build portfolio for {user_id}: {e}", exc_info=True)
         raise HTTPException(500, "Failed to build portfolio.")
@@ -729,7 +1129,7 @@ async def upsert_holding(h: HoldingInput):
     symbol = h.symbol.upper().strip().replace(".NS", "")
     if not symbol or h.quantity <= 0 or h.avg_price <= 0:
         raise HTTPException(400, "A symbol with a positive quantity and average price is required.")
-    db.collection('users').document(h.userId).collection('holdings').document(symbol).set({
+    await firestore_repo.set("holdings.set", db.collection('users').document(h.userId).collection('holdings').document(symbol), {
         "symbol": symbol, "quantity": h.quantity, "avg_price": h.avg_price,
         "source": "manual", "updated": firestore.SERVER_TIMESTAMP,
     })
@@ -741,7 +1141,7 @@ async def delete_holding(user_id: str, symbol: str):
         raise HTTPException(500, "Firestore not initialized.")
     # Match the doc-id normalisation used by upsert_holding (which strips ".NS").
     sym = symbol.upper().strip().replace(".NS", "")
-    db.collection('users').document(user_id).collection('holdings').document(sym).delete()
+    await firestore_repo.delete("holdings.delete", db.collection('users').document(user_id).collection('holdings').document(sym))
     return {"status": "success"}
 
 
@@ -756,7 +1156,7 @@ class KiteConnectRequest(BaseModel):
 
 @app.get("/api/broker/status/{user_id}")
 async def broker_status(user_id: str):
-    status = get_broker_connection(user_id)
+    status = await firestore_repo.run("broker.status", get_broker_connection, user_id)
     status["configured"] = bool(KITE_API_KEY)
     return status
 
@@ -780,12 +1180,12 @@ async def kite_connect(req: KiteConnectRequest):
         checksum = hashlib.sha256(
             (KITE_API_KEY + req.request_token + KITE_API_SECRET).encode("utf-8")
         ).hexdigest()
-        resp = requests.post(
+        resp = await bulkheads.KITE.run(lambda: requests.post(
             f"{KITE_BASE}/session/token",
             data={"api_key": KITE_API_KEY, "request_token": req.request_token, "checksum": checksum},
             headers={"X-Kite-Version": "3"},
             timeout=15,
-        )
+        ))
         if resp.status_code != 200:
             logger.error(f"Kite session exchange failed: {resp.status_code} {resp.text[:300]}")
             raise HTTPException(400, "Could not connect to Zerodha. The login may have expired — please try again.")
@@ -793,13 +1193,13 @@ async def kite_connect(req: KiteConnectRequest):
         access_token = data.get("access_token")
         if not access_token:
             raise HTTPException(400, "Zerodha did not return an access token.")
-        db.collection('users').document(req.userId).collection('broker').document('kite').set({
+        await firestore_repo.set("broker.connect", db.collection('users').document(req.userId).collection('broker').document('kite'), {
             "access_token": access_token,
             "kite_user_id": data.get("user_id"),
             "kite_user_name": data.get("user_name"),
             "connected_at": firestore.SERVER_TIMESTAMP,
         })
-        imported = fetch_kite_holdings(req.userId)
+        imported = await bulkheads.KITE.run(fetch_kite_holdings, req.userId)
         return {"status": "success", "broker": "Zerodha Kite", "holdings_imported": len(imported)}
     except HTTPException:
         raise
@@ -811,7 +1211,7 @@ async def kite_connect(req: KiteConnectRequest):
 async def kite_disconnect(user_id: str):
     if not db:
         raise HTTPException(500, "Firestore not initialized.")
-    db.collection('users').document(user_id).collection('broker').document('kite').delete()
+    await firestore_repo.delete("broker.disconnect", db.collection('users').document(user_id).collection('broker').document('kite'))
     return {"status": "disconnected"}
 
 @app.post("/api/portfolio/analyze")
@@ -823,8 +1223,10 @@ async def analyze_portfolio(req: PortfolioAnalysisRequest):
         
         Portfolio Data: {req.portfolio_summary}
         """
-        explanation = call_openrouter(prompt)
+        explanation = await bulkheads.OPENROUTER.run(call_openrouter, prompt)
         return {"analysis": explanation.strip()}
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"AI Risk Analysis failed: {e}")
         raise HTTPException(status_code=500, detail="Failed to generate risk analysis.")
@@ -878,34 +1280,47 @@ def generate_weekly_scenario() -> dict:
         logger.warning(f"Weekly scenario generation failed, using default. Error: {e}")
         return DEFAULT_DEBRIEF
 
+def load_weekly_scenario(week_id: str) -> dict:
+    """This week's stored scenario, generated and persisted on first use."""
+    ref = db.collection('debriefs').document(week_id)
+    doc = ref.get()
+    if doc.exists and doc.to_dict().get("title"):
+        data = doc.to_dict()
+        return {"title": data["title"], "description": data["description"]}
+    scenario = generate_weekly_scenario()
+    ref.set({"title": scenario["title"], "description": scenario["description"],
+             "week_id": week_id, "created": str(date.today())}, merge=True)
+    return scenario
+
 @app.get("/api/debrief/current")
-async def get_current_debrief():
+async def get_current_debrief(if_none_match: str | None = Header(None)):
     week_id = current_week_id()
     if not db:
         s = DEFAULT_DEBRIEF
         return {"id": week_id, "title": s["title"], "description": s["description"], "date": str(date.today())}
+    # The body carries today's date, so it is current until midnight.
+    max_age = http_caching.seconds_until_midnight()
+    not_modified = http_caching.precheck("debrief:current", if_none_match, max_age)
+    if not_modified:
+        return not_modified
     try:
-        ref = get_week_doc()
-        doc = ref.get()
-        if doc.exists and doc.to_dict().get("title"):
-            data = doc.to_dict()
-            return {"id": week_id, "title": data["title"], "description": data["description"], "date": str(date.today())}
-        # Cache miss → generate this week's scenario once and persist it.
-        scenario = generate_weekly_scenario()
-        ref.set({"title": scenario["title"], "description": scenario["description"],
-                 "week_id": week_id, "created": str(date.today())}, merge=True)
+        scenario = await app_cache.aget(f"debrief:{week_id}", lambda: load_weekly_scenario(week_id), ttl=max_age,
+                                        executor=bulkheads.OPENROUTER)
     except Exception as e:
         logger.error(f"Debrief current failed: {e}", exc_info=True)
         scenario = DEFAULT_DEBRIEF
-    return {"id": week_id, "title": scenario["title"], "description": scenario["description"], "date": str(date.today())}
+        # A fallback scenario must not be pinned in client caches.
+        return {"id": week_id, "title": scenario["title"], "description": scenario["description"], "date": str(date.today())}
+    body = {"id": week_id, "title": scenario["title"], "description": scenario["description"], "date": str(date.today())}
+    return http_caching.conditional(FastJSONResponse(body), "debrief:current", if_none_match, max_age)
 
 @app.post("/api/debrief/submit")
 async def submit_debrief(submission: DebriefSubmission):
     if not db: raise HTTPException(500, "Firestore not initialized.")
     try:
         # Ensure the week document exists so analyses are attached to a real scenario.
-        await get_current_debrief()
-        doc_ref = get_week_doc().collection('analyses').add({
+        await get_current_debrief(None)
+        analysis_id = await firestore_repo.add("debrief.submit", get_week_doc().collection('analyses'), {
             'userId': submission.userId,
             'displayName': submission.displayName,
             'picture': submission.picture,
@@ -914,7 +1329,9 @@ async def submit_debrief(submission: DebriefSubmission):
             'votes': 0,
             'timestamp': firestore.SERVER_TIMESTAMP
         })
-        return {"status": "success", "id": doc_ref[1].id}
+        return {"status": "success", "id": analysis_id}
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Debrief submit failed: {e}", exc_info=True)
         raise HTTPException(500, "Failed to submit analysis.")
@@ -924,8 +1341,10 @@ async def get_debrief_analyses():
     if not db: raise HTTPException(500, "Firestore not initialized.")
     try:
         # This week's analyses, ordered by highest votes first.
-        docs = get_week_doc().collection('analyses').order_by('votes', direction=firestore.Query.DESCENDING).stream()
-        return [{'id': doc.id, **doc.to_dict()} for doc in docs]
+        query = get_week_doc().collection('analyses').order_by('votes', direction=firestore.Query.DESCENDING)
+        return await firestore_repo.documents("debrief.analyses", query)
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Debrief fetch failed: {e}", exc_info=True)
         raise HTTPException(500, "Failed to fetch community analyses.")
@@ -935,8 +1354,10 @@ async def vote_debrief(analysis_id: str):
     if not db: raise HTTPException(500, "Firestore not initialized.")
     try:
         ref = get_week_doc().collection('analyses').document(analysis_id)
-        ref.update({'votes': firestore.Increment(1)})
+        await firestore_repo.update("debrief.vote", ref, {'votes': firestore.Increment(1)})
         return {"status": "success"}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(500, "Failed to register vote.")
     
@@ -970,7 +1391,7 @@ async def create_community_post(post: CommunityPost):
         # Convert tags to lowercase for easier searching
         search_tags = [tag.lower().strip() for tag in post.tags]
         
-        doc_ref = db.collection('community_posts').add({
+        post_id = await firestore_repo.add("community.post", db.collection('community_posts'), {
             'userId': post.userId,
             'displayName': post.displayName,
             'picture': post.picture,
@@ -984,7 +1405,9 @@ async def create_community_post(post: CommunityPost):
             'commentsCount': 0,
             'timestamp': firestore.SERVER_TIMESTAMP
         })
-        return {"status": "success", "id": doc_ref[1].id}
+        return {"status": "success", "id": post_id}
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Failed to create post: {e}")
         raise HTTPException(500, "Failed to publish post.")
@@ -1001,24 +1424,22 @@ async def get_community_feed(tag: str = None):
         else:
             query = query.order_by('timestamp', direction=firestore.Query.DESCENDING).limit(50)
             
-        docs = query.stream()
-        
-        feed = []
-        for doc in docs:
-            data = doc.to_dict()
+        feed = await firestore_repo.documents("community.feed", query)
+        for data in feed:
             # Convert timestamp to string for frontend
             if 'timestamp' in data and data['timestamp']:
                 data['createdAt'] = data['timestamp'].strftime('%b %d, %Y %H:%M')
             else:
                 data['createdAt'] = 'Just now'
-            feed.append({'id': doc.id, **data})
             
         # If we used a tag filter, we must sort in Python because Firestore 
         # requires a composite index to where() and order_by() together on different fields.
         if tag:
             feed = sorted(feed, key=lambda x: x.get('upvotes', 0), reverse=True)
             
-        return feed
+        return FastJSONResponse(feed)
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Failed to fetch feed: {e}")
         raise HTTPException(500, "Failed to fetch community feed.")
@@ -1029,10 +1450,12 @@ async def vote_post(post_id: str, vote: VoteAction):
     try:
         ref = db.collection('community_posts').document(post_id)
         if vote.action == 'upvote':
-            ref.update({'upvotes': firestore.Increment(1)})
+            await firestore_repo.update("community.vote", ref, {'upvotes': firestore.Increment(1)})
         elif vote.action == 'downvote':
-            ref.update({'downvotes': firestore.Increment(1)})
+            await firestore_repo.update("community.vote", ref, {'downvotes': firestore.Increment(1)})
         return {"status": "success"}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(500, "Failed to register vote.")
 
@@ -1055,7 +1478,7 @@ class SavedStrategy(BaseModel):
 async def save_user_strategy(strategy: SavedStrategy):
     if not db: raise HTTPException(500, "Firestore not initialized.")
     try:
-        doc_ref = db.collection('users').document(strategy.userId).collection('saved_strategies').add({
+        strategy_id = await firestore_repo.add("strategies.save", db.collection('users').document(strategy.userId).collection('saved_strategies'), {
             'name': strategy.name,
             'symbol': strategy.symbol,
             'interval': strategy.interval,
@@ -1067,7 +1490,9 @@ async def save_user_strategy(strategy: SavedStrategy):
             'resultData': strategy.resultData,
             'timestamp': firestore.SERVER_TIMESTAMP
         })
-        return {"status": "success", "id": doc_ref[1].id}
+        return {"status": "success", "id": strategy_id}
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Failed to save strategy: {e}")
         raise HTTPException(500, "Failed to save strategy.")
@@ -1076,46 +1501,179 @@ async def save_user_strategy(strategy: SavedStrategy):
 async def get_user_strategies(user_id: str):
     if not db: raise HTTPException(500, "Firestore not initialized.")
     try:
-        docs = db.collection('users').document(user_id).collection('saved_strategies').order_by('timestamp', direction=firestore.Query.DESCENDING).stream()
-        strategies = []
-        for doc in docs:
-            data = doc.to_dict()
+        query = db.collection('users').document(user_id).collection('saved_strategies').order_by('timestamp', direction=firestore.Query.DESCENDING)
+        strategies = await firestore_repo.documents("strategies.list", query)
+        for data in strategies:
             if 'timestamp' in data and data['timestamp']:
                 data['createdAt'] = data['timestamp'].strftime('%b %d, %Y %H:%M')
             else:
                 data['createdAt'] = 'Just now'
-            strategies.append({'id': doc.id, **data})
-        return strategies
+        return FastJSONResponse(strategies)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(500, "Failed to fetch saved strategies.")
 
+REFRESHED_EXPLANATION = ("_This result was extended with bars that arrived after the original analysis. "
+                         "Re-run the backtest for an updated AI review._")
+
+@app.post("/api/user/strategies/{user_id}/{strategy_id}/refresh")
+async def refresh_user_strategy(user_id: str, strategy_id: str):
+    """Bring a saved strategy's result up to date by simulating only the bars after its last run.
+
+    The stored engine state carries the open position and equity; the strategy itself is
+    re-run on the new bars plus CONTINUATION_WARMUP_BARS of context (indicators are
+    recomputed over the fetched history, so no indicator state needs to be stored).
+    """
+    if not db: raise HTTPException(500, "Firestore not initialized.")
+    doc_ref = db.collection('users').document(user_id).collection('saved_strategies').document(strategy_id)
+    saved = await firestore_repo.get("strategies.get", doc_ref)
+    if saved is None:
+        raise HTTPException(404, "Saved strategy not found.")
+    result = saved.get('resultData') or {}
+    # The saved curves keep the point budget of the response they were saved from.
+    max_points = len(result.get('equity_curve') or []) if 'equity_curve' in (result.get('downsampled') or {}) else 0
+    # Response-view fields of the original run; they no longer describe the extended result.
+    result = {k: v for k, v in result.items() if k not in ('run_id', 'trades_total', 'downsampled')}
+    state, code = result.get('engine_state'), result.get('python_code')
+    if not state or not code or not state.get('last_timestamp'):
+        raise HTTPException(409, "This strategy was saved before incremental refresh existed. Re-run and save it once.")
+
+    data, date_col = await bulkheads.YFINANCE.run(fetch_backtest_data, saved['symbol'], saved['interval'])
+    data = backtest_engine.closed_bars(data, date_col, saved['interval'])
+    is_new = (data[date_col] > pd.Timestamp(state['last_timestamp'])).to_numpy()
+    if not is_new.any():
+        return result
+    first_new = int(is_new.argmax())
+    if first_new == 0:
+        # The gap since the last run is wider than the history we can fetch for this interval.
+        raise HTTPException(409, "Saved result is older than the available history. Re-run the full backtest.")
+
+    try:
+        tree = validate_strategy(code)
+        cost_report = analyze_cost(tree)
+        offset = max(0, first_new - CONTINUATION_WARMUP_BARS)
+        window = strategy_frame(tree, data, date_col, saved['interval']).iloc[offset:].reset_index(drop=True)
+        entry_signals = await bulkheads.SANDBOX.run(safe_execute_strategy, code, window, user_id=user_id)
+    except SandboxBusy as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Strategy refresh error: {e}", exc_info=True)
+        raise HTTPException(status_code=400, detail=f"Strategy Script Error: {str(e)}")
+
+    trades, equity_points, drawdown_points = backtest_engine.simulate(
+        data.iloc[offset:].reset_index(drop=True), date_col, entry_signals, saved['slPercent'],
+        saved['targetPercent'], saved['riskPercent'], state, start=first_new - offset)
+    previous_report = result.get('monte_carlo')
+    had_trades = bool(result.get('num_trades'))
+    result = backtest_engine.extend_result(result, state, saved['capital'], trades, equity_points, drawdown_points,
+                                           max_points=max_points)
+    # Everything derived from the whole trade list is recomputed; the AI review is not re-run.
+    # No report means either Monte Carlo was off (monte_carlo_runs=0) or there were no trades yet.
+    default_runs = BacktestRequest.model_fields['monte_carlo_runs'].default
+    runs = previous_report['simulations'] if previous_report else (0 if had_trades else default_runs)
+    result['monte_carlo'] = await run_in_threadpool(
+        monte_carlo.simulate_trades, state['pnls'], saved['capital'], saved['riskPercent'],
+        saved['slPercent'], runs, seed=int(hash_text(code)[:8], 16))
+    result['strategy_analysis'] = cost_report
+    result['ai_explanation'] = REFRESHED_EXPLANATION
+    try:
+        await firestore_repo.update("strategies.refresh", doc_ref, {'resultData': result, 'refreshedAt': firestore.SERVER_TIMESTAMP})
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Failed to store refreshed strategy: {e}")
+        raise HTTPException(500, "Failed to store refreshed strategy.")
+    metrics.incr("strategies.refreshed")
+    return result
+
+# --- PAPER TRADING (live evaluation of saved strategies) ---
+class PaperSubscriptionRequest(BaseModel):
+    userId: str
+    strategyId: str
+
+paper_engine = PaperTradingEngine(db, fetch_backtest_data) if db else None
+
+@app.on_event("startup")
+def _start_paper_trading():
+    # Optional in-process scheduler; an external cron hitting /api/paper/tick works as well.
+    interval = int(os.getenv("PAPER_TRADING_INTERVAL", "0"))
+    if paper_engine and interval > 0:
+        paper_engine.start(max(60, interval))
+        logger.info(f"Paper trading loop started (every {max(60, interval)}s).")
+
+@app.post("/api/paper/subscribe")
+async def paper_subscribe(req: PaperSubscriptionRequest):
+    if not paper_engine: raise HTTPException(500, "Firestore not initialized.")
+    saved = await firestore_repo.get("strategies.get", db.collection('users').document(req.userId)
+                                     .collection('saved_strategies').document(req.strategyId))
+    if saved is None:
+        raise HTTPException(404, "Saved strategy not found.")
+    try:
+        subscription_id = await firestore_repo.run("paper.subscribe", paper_engine.subscribe, req.userId, req.strategyId, saved)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    return {"status": "success", "id": subscription_id}
+
+@app.get("/api/paper/subscriptions/{user_id}")
+async def paper_subscriptions(user_id: str):
+    if not paper_engine: raise HTTPException(500, "Firestore not initialized.")
+    return await firestore_repo.run("paper.subscriptions", paper_engine.list_subscriptions, user_id)
+
+@app.delete("/api/paper/subscriptions/{user_id}/{subscription_id}")
+async def paper_unsubscribe(user_id: str, subscription_id: str):
+    if not paper_engine: raise HTTPException(500, "Firestore not initialized.")
+    try:
+        await firestore_repo.run("paper.unsubscribe", paper_engine.unsubscribe, user_id, subscription_id)
+    except KeyError:
+        raise HTTPException(404, "Subscription not found.")
+    return {"status": "success"}
+
+@app.get("/api/paper/fills/{user_id}")
+async def paper_fills(user_id: str, limit: int = Query(100, ge=1, le=1000)):
+    if not db: raise HTTPException(500, "Firestore not initialized.")
+    query = (db.collection('users').document(user_id).collection('paper_fills')
+             .order_by('createdAt', direction=firestore.Query.DESCENDING).limit(limit))
+    return await firestore_repo.documents("paper.fills", query)
+
+@app.post("/api/paper/tick")
+async def paper_tick(x_paper_token: str = Header(None)):
+    """Evaluate all subscriptions on newly closed bars (for an external scheduler)."""
+    if not paper_engine: raise HTTPException(500, "Firestore not initialized.")
+    token = os.getenv("PAPER_TICK_TOKEN")
+    if not token:
+        raise HTTPException(403, "Paper tick endpoint is disabled: PAPER_TICK_TOKEN is not configured.")
+    if not x_paper_token or not hmac.compare_digest(x_paper_token, token):
+        raise HTTPException(403, "Invalid paper tick token.")
+    return await run_in_threadpool(paper_engine.tick)
+
 @app.get("/api/community/user-posts/{user_id}")
 async def get_user_community_posts(user_id: str):
     if not db: raise HTTPException(500, "Firestore not initialized.")
     try:
-        docs = db.collection('community_posts').where('userId', '==', user_id).stream()
-        posts = []
-        for doc in docs:
-            data = doc.to_dict()
+        posts = await firestore_repo.documents("community.user_posts",
+                                               db.collection('community_posts').where('userId', '==', user_id))
+        for data in posts:
             if 'timestamp' in data and data['timestamp']:
                 data['createdAt'] = data['timestamp'].strftime('%b %d, %Y %H:%M')
             else:
                 data['createdAt'] = 'Just now'
-            posts.append({'id': doc.id, **data})
             
         # Sort in python because we used a where clause
         posts = sorted(posts, key=lambda x: x.get('timestamp', 0), reverse=True)
         return posts
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(500, "Failed to fetch user posts.")
     
 
 # --- CALENDAR ENDPOINTS ---
 
-@app.get("/api/calendar/ai-events")
-async def get_ai_events():
-    if not db: raise HTTPException(500, "Firestore not initialized.")
-    today_str = str(date.today())
+def load_ai_events(today_str: str) -> list:
+    """Today's AI calendar events from Firestore, generated and stored on the first read of the day."""
     doc_ref = db.collection('calendar').document('ai_generated_events')
     try:
         doc = doc_ref.get()
@@ -1125,30 +1683,43 @@ async def get_ai_events():
         logger.warning(f"Could not read cache, will regenerate. Error: {e}")
 
     logger.info("Cache miss. Generating new AI events.")
+    prompt = f"""
+    **Instruction:** You are a JSON data generation engine. Your sole function is to generate a JSON array of objects based on the provided schema and context. Your entire response must be ONLY the raw JSON array.
+    **Context:** The user is a retail trader in the Indian stock market. Today's date is: {today_str}
+    **JSON Schema:** Each object must have keys: "date" (YYYY-MM-DD), "event" (string), "type" (one of ["Domestic", "Global", "Corporate", "Geopolitical"]), and "impact" (one of ["High", "Medium", "Low"]).
+    **Task:** Generate an array of 7 distinct, relevant events for the Indian market for today and the near future.
+    """
+    response_text = call_openrouter(prompt)
+
+    if not response_text:
+        raise ValueError("AI returned an empty response.")
+
+    cleaned_text = response_text.strip().replace('```json', '').replace('```', '')
+    events_json = json.loads(cleaned_text)
+
+    # Validate that the AI returned a list
+    if not isinstance(events_json, list):
+        raise ValueError("AI did not return a list as expected.")
+
+    doc_ref.set({'last_updated': today_str, 'events': events_json})
+    return events_json
+
+@app.get("/api/calendar/ai-events")
+async def get_ai_events(if_none_match: str | None = Header(None)):
+    if not db: raise HTTPException(500, "Firestore not initialized.")
+    today_str = str(date.today())
+    max_age = http_caching.seconds_until_midnight()  # events are regenerated daily
+    not_modified = http_caching.precheck("calendar:ai-events", if_none_match, max_age)
+    if not_modified:
+        return not_modified
     try:
-        prompt = f"""
-        **Instruction:** You are a JSON data generation engine. Your sole function is to generate a JSON array of objects based on the provided schema and context. Your entire response must be ONLY the raw JSON array.
-        **Context:** The user is a retail trader in the Indian stock market. Today's date is: {today_str}
-        **JSON Schema:** Each object must have keys: "date" (YYYY-MM-DD), "event" (string), "type" (one of ["Domestic", "Global", "Corporate", "Geopolitical"]), and "impact" (one of ["High", "Medium", "Low"]).
-        **Task:** Generate an array of 7 distinct, relevant events for the Indian market for today and the near future.
-        """
-        response_text = call_openrouter(prompt)
-        
-        if not response_text:
-            raise ValueError("AI returned an empty response.")
-        
-        cleaned_text = response_text.strip().replace('```json', '').replace('```', '')
-        events_json = json.loads(cleaned_text)
-        
-        # Validate that the AI returned a list
-        if not isinstance(events_json, list):
-            raise ValueError("AI did not return a list as expected.")
-            
-        doc_ref.set({'last_updated': today_str, 'events': events_json})
-        return events_json
+        events = await app_cache.aget(f"calendar:ai-events:{today_str}", lambda: load_ai_events(today_str),
+                                      ttl=max_age, executor=bulkheads.OPENROUTER)
     except Exception as e:
+        # Failures are not cached: the next request tries again.
         logger.error(f"FATAL: AI calendar generation failed. Error: {e}", exc_info=True)
         return []
+    return http_caching.conditional(FastJSONResponse(events), "calendar:ai-events", if_none_match, max_age)
 
 
 @app.get("/api/calendar/user-events/{user_id}")
@@ -1156,12 +1727,10 @@ async def get_user_events(user_id: str):
     """ The 'Personal Diary' Reader - Fetches all events for a specific user. """
     if not db: raise HTTPException(500, "Firestore not initialized.")
     try:
-        events = []
-        docs = db.collection('users').document(user_id).collection('calendar_events').stream()
-        for doc in docs:
-            event_data = doc.to_dict(); event_data['id'] = doc.id
-            events.append(event_data)
-        return events
+        return await firestore_repo.documents("calendar.user_events",
+                                              db.collection('users').document(user_id).collection('calendar_events'))
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(500, str(e))
 
@@ -1170,11 +1739,13 @@ async def add_user_event(event: UserCalendarEvent):
     """ Adds a new personal event to a user's diary. """
     if not db: raise HTTPException(500, "Firestore not initialized.")
     try:
-        doc_ref = db.collection('users').document(event.userId).collection('calendar_events').add({
+        event_id = await firestore_repo.add("calendar.add", db.collection('users').document(event.userId).collection('calendar_events'), {
             'date': event.date, 'title': event.title, 'type': event.type,
             'timestamp': firestore.SERVER_TIMESTAMP
         })
-        return {"status": "success", "eventId": doc_ref[1].id}
+        return {"status": "success", "eventId": event_id}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(500, str(e))
 
@@ -1183,10 +1754,12 @@ async def update_user_event(user_id: str, event_id: str, event: UserCalendarEven
     """ Edits an existing personal event in a user's diary. """
     if not db: raise HTTPException(500, "Firestore not initialized.")
     try:
-        db.collection('users').document(user_id).collection('calendar_events').document(event_id).update({
+        await firestore_repo.update("calendar.update", db.collection('users').document(user_id).collection('calendar_events').document(event_id), {
             'date': event.date, 'title': event.title, 'type': event.type
         })
         return {"status": "success"}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(500, str(e))
 
@@ -1195,8 +1768,10 @@ async def delete_user_event(user_id: str, event_id: str):
     """ Deletes a personal event from a user's diary. """
     if not db: raise HTTPException(500, "Firestore not initialized.")
     try:
-        db.collection('users').document(user_id).collection('calendar_events').document(event_id).delete()
+        await firestore_repo.delete("calendar.delete", db.collection('users').document(user_id).collection('calendar_events').document(event_id))
         return {"status": "success"}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(500, str(e))
     
@@ -1215,15 +1790,16 @@ class QuizSubmission(BaseModel):
 async def create_or_update_profile(profile: UserProfile):
     if not db: raise HTTPException(500, "Firestore not initialized.")
     doc_ref = db.collection('users').document(profile.userId)
-    doc = doc_ref.get()
+    existing = await firestore_repo.get("users.profile", doc_ref)
     
-    if not doc.exists:
+    if existing is None:
         logger.info(f"New user detected. Creating profile for: {profile.displayName} ({profile.userId})")
-        doc_ref.set({'displayName': profile.displayName, 'picture': profile.picture, 'arenaScore': 0, 'dailyQuizCompleted': None})
+        await firestore_repo.set("users.create", doc_ref, {'displayName': profile.displayName, 'picture': profile.picture, 'arenaScore': 0, 'dailyQuizCompleted': None})
+        app_cache.invalidate("arena:leaderboard")
         return {"status": "Profile created."}
     else:
         logger.info(f"Existing user signed in: {profile.displayName} ({profile.userId})")
-        return {"status": "Profile already exists.", "data": doc.to_dict()}
+        return {"status": "Profile already exists.", "data": existing}
 
 # --- ARENA ENDPOINTS ---
 def get_difficulty_tier(level: int) -> str:
@@ -1232,48 +1808,63 @@ def get_difficulty_tier(level: int) -> str:
     if level <= 15: return "Advanced"
     return "Expert"
 
-@app.get("/api/arena/daily-quiz/{level}")
-async def get_daily_quiz(level: int):
-    if not db: raise HTTPException(500, "Firestore not initialized.")
-    today_str = str(date.today())
+def load_daily_quiz(today_str: str, level: int) -> dict:
+    """Today's questions and answers for `level`, generated and stored on the first request."""
     level_key = f"level_{level}"
     doc_ref = db.collection('arena').document('daily_quizzes').collection(today_str).document('levels')
     doc = doc_ref.get()
-
     if doc.exists and level_key in doc.to_dict():
-        quiz_data = doc.to_dict()[level_key]; return quiz_data
-    
+        return doc.to_dict()[level_key]
+
     logger.info(f"Generating new quiz for Level {level}...")
+    difficulty = get_difficulty_tier(level)
+    prompt = f"""
+    **Instruction:** You are a JSON data generation engine for an Indian financial market quiz. Your sole function is to generate a JSON object. Do not provide any conversational text, explanations, or introductory sentences. Your entire response must be ONLY the raw JSON object.
+    **JSON Schema:** The root object must have a "questions" key (an array of 10 question objects). Each question object must have: "question" (string), "options" (an array of 4 strings), and "correct" (the 0-based index of the correct option).
+    **Difficulty:** The questions must be of **{difficulty}** difficulty.
+    **Topics:** Cover a mix of recent Indian market news, global market events, and cryptocurrency concepts.
+    """
+    response_text = call_openrouter(prompt)
+
+    if not response_text:
+        raise ValueError("AI returned an empty response.")
+
+    cleaned_text = response_text.strip().replace('```json', '').replace('```', '')
+
     try:
-        difficulty = get_difficulty_tier(level)
-        prompt = f"""
-        **Instruction:** You are a JSON data generation engine for an Indian financial market quiz. Your sole function is to generate a JSON object. Do not provide any conversational text, explanations, or introductory sentences. Your entire response must be ONLY the raw JSON object.
-        **JSON Schema:** The root object must have a "questions" key (an array of 10 question objects). Each question object must have: "question" (string), "options" (an array of 4 strings), and "correct" (the 0-based index of the correct option).
-        **Difficulty:** The questions must be of **{difficulty}** difficulty.
-        **Topics:** Cover a mix of recent Indian market news, global market events, and cryptocurrency concepts.
-        """
-        response_text = call_openrouter(prompt)
-        
-        if not response_text:
-            raise ValueError("AI returned an empty response.")
-        
-        cleaned_text = response_text.strip().replace('```json', '').replace('```', '')
+        quiz_json = json.loads(cleaned_text)
+    except json.JSONDecodeError:
+        logger.error(f"FATAL: AI returned invalid JSON even after cleaning! Raw text was: '{response_text}'")
+        raise ValueError("AI response was not valid JSON.")
 
-        try:
-            quiz_json = json.loads(cleaned_text)
-        except json.JSONDecodeError:
-            logger.error(f"FATAL: AI returned invalid JSON even after cleaning! Raw text was: '{response_text}'")
-            raise ValueError("AI response was not valid JSON.")
+    answers = [q['correct'] for q in quiz_json['questions']]
+    for q in quiz_json['questions']: del q['correct']
 
-        answers = [q['correct'] for q in quiz_json['questions']]
-        for q in quiz_json['questions']: del q['correct']
-            
-        doc_ref.set({level_key: {"questions": quiz_json['questions'], "answers": answers}}, merge=True)
-        return {"questions": quiz_json['questions']}
+    quiz = {"questions": quiz_json['questions'], "answers": answers}
+    doc_ref.set({level_key: quiz}, merge=True)
+    return quiz
 
+@app.get("/api/arena/daily-quiz/{level}")
+async def get_daily_quiz(level: int, if_none_match: str | None = Header(None)):
+    if not db: raise HTTPException(500, "Firestore not initialized.")
+    today_str = str(date.today())
+    etag_key = f"arena:quiz:{level}"
+    max_age = http_caching.seconds_until_midnight()  # one quiz per level per day
+    not_modified = http_caching.precheck(etag_key, if_none_match, max_age)
+    if not_modified:
+        return not_modified
+    try:
+        # Single-flight: simultaneous first requests for a new day's quiz share one generation.
+        quiz = await app_cache.aget(f"arena:quiz:{today_str}:{level}", lambda: load_daily_quiz(today_str, level),
+                                    ttl=max_age, executor=bulkheads.OPENROUTER)
+    except bulkheads.BulkheadFull:
+        raise
     except Exception as e:
         logger.error(f"FATAL: AI quiz generation for Level {level} failed. Error: {e}", exc_info=True)
         raise HTTPException(500, "Could not generate the daily quiz. The AI service may be temporarily unavailable or returned an invalid format.")
+    # Only the questions: the answers stay server-side for grading.
+    return http_caching.conditional(FastJSONResponse({"questions": quiz["questions"]}), etag_key,
+                                    if_none_match, max_age)
 
 @app.post("/api/arena/submit-quiz")
 async def submit_quiz(submission: QuizSubmission):
@@ -1283,11 +1874,11 @@ async def submit_quiz(submission: QuizSubmission):
     
     try:
         quiz_doc_ref = db.collection('arena').document('daily_quizzes').collection(today_str).document('levels')
-        quiz_doc = quiz_doc_ref.get()
-        if not quiz_doc.exists:
+        quiz_doc = await firestore_repo.get("arena.quiz", quiz_doc_ref)
+        if quiz_doc is None:
             raise HTTPException(404, "The daily quiz could not be found or has expired.")
         
-        level_data = quiz_doc.to_dict().get(level_key)
+        level_data = quiz_doc.get(level_key)
         if not level_data:
             raise HTTPException(404, f"Quiz data for Level {submission.level} is not available.")
         
@@ -1308,15 +1899,16 @@ async def submit_quiz(submission: QuizSubmission):
         # ... (Inside submit_quiz, replace the user_ref section with this) ...
         
         user_ref = db.collection('users').document(submission.userId)
-        # Only update the score if it's greater than zero
+        # Always mark the quiz as completed; only add to the score if it's greater than zero
+        user_update = {'dailyQuizCompleted': today_str}
         if score > 0:
-            user_ref.update({'arenaScore': firestore.Increment(score)})
-        # Always mark the quiz as completed
-        user_ref.update({'dailyQuizCompleted': today_str})
+            user_update['arenaScore'] = firestore.Increment(score)
+        await firestore_repo.update("arena.score", user_ref, user_update)
+        app_cache.invalidate("arena:leaderboard")
         
         # --- NEW: Save the historical record ---
         history_ref = user_ref.collection('quiz_history').document(today_str)
-        history_ref.set({
+        await firestore_repo.set("arena.history_write", history_ref, {
             'date': today_str,
             'level': submission.level,
             'score': score,
@@ -1337,27 +1929,48 @@ async def get_arena_history(user_id: str):
     if not db: raise HTTPException(500, "Firestore not initialized.")
     try:
         # Fetch history ordered by date (newest first)
-        docs = db.collection('users').document(user_id).collection('quiz_history').order_by('date', direction=firestore.Query.DESCENDING).stream()
-        history = [{'id': doc.id, **doc.to_dict()} for doc in docs]
-        return history
+        query = db.collection('users').document(user_id).collection('quiz_history').order_by('date', direction=firestore.Query.DESCENDING)
+        return await firestore_repo.documents("arena.history", query)
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Failed to fetch arena history for {user_id}: {e}", exc_info=True)
         raise HTTPException(500, "Could not fetch history")
 
+# Scores change on every quiz submission, which invalidates the cached board and its ETag;
+# the TTL only bounds how stale another worker's copy can be. A board up to
+# LEADERBOARD_STALE_SECONDS past its TTL is served while a background reload replaces it.
+LEADERBOARD_MAX_AGE = 60
+LEADERBOARD_STALE_SECONDS = 300
+
+def load_leaderboard() -> list:
+    docs = db.collection('users').order_by('arenaScore', direction=firestore.Query.DESCENDING).limit(10).stream()
+    return [{'id': doc.id, **doc.to_dict()} for doc in docs]
+
 @app.get("/api/arena/leaderboard")
-async def get_leaderboard():
+async def get_leaderboard(if_none_match: str | None = Header(None)):
     if not db: raise HTTPException(500, "Firestore not initialized.")
-    docs = db.collection('users').order_by('arenaScore', direction=firestore.Query.DESCENDING).limit(10).stream()
-    leaderboard = [{'id': doc.id, **doc.to_dict()} for doc in docs]
-    return leaderboard
+    not_modified = http_caching.precheck("arena:leaderboard", if_none_match, LEADERBOARD_MAX_AGE)
+    if not_modified:
+        return not_modified
+    leaderboard = await app_cache.aget("arena:leaderboard", load_leaderboard, ttl=LEADERBOARD_MAX_AGE,
+                                       stale_ttl=LEADERBOARD_STALE_SECONDS, executor=bulkheads.FIRESTORE)
+    return http_caching.conditional(FastJSONResponse(leaderboard), "arena:leaderboard", if_none_match,
+                                    LEADERBOARD_MAX_AGE)
 
 @app.get("/api/arena/profile/{user_id}")
 async def get_profile(user_id: str):
     if not db: raise HTTPException(500, "Firestore not initialized.")
-    doc = db.collection('users').document(user_id).get()
-    if doc.exists: return {'id': doc.id, **doc.to_dict()}
+    data = await firestore_repo.get("users.profile", db.collection('users').document(user_id))
+    if data is not None: return {'id': user_id, **data}
     raise HTTPException(404, "User not found.")
 
+@app.get("/api/metrics")
+def get_metrics():
+    """Process-local counters, gauges and latency timers (sandbox queue depth, wait time, ...)
+    plus the occupancy of each dependency's bulkhead pool."""
+    return {**metrics.snapshot(), "sandbox": sandbox_admission.stats(), "bulkheads": bulkheads.stats()}
+
 @app.get("/")
 def read_root():
     return {"status": "PatternIQ API is running"}
@@ -0,0 +1,252 @@
+"""
+OHLCV history assembler: chunked parallel fetches stitched into a locally cached series.
+
+yfinance serves intraday bars only in bounded spans per request (7 days of 1m bars, 60
+days of 5m-30m) and only within a trailing horizon. `history()` therefore:
+
+  1. Loads the series already stored for (ticker, interval) from PATTERNIQ_CACHE_DIR.
+  2. Works out which parts of the requested range are missing — older bars before the
+     stored head (within the provider horizon) and new bars after the stored tail.
+  3. Fetches each missing range in provider-sized chunks, at most MAX_PARALLEL_FETCHES
+     requests in flight, deduplicates overlapping bars and checks continuity.
+  4. Stores the stitched series back, so repeat requests read it without refetching and
+     intraday history keeps growing past the provider's trailing horizon over time.
+
+Steps 1-4 for a (ticker, interval) run under a cross-process lease in the shared store, so
+when several uvicorn workers want the same bars one of them fetches and the others read
+the series it stored.
+
+Coarser intraday intervals (15m, 30m, 1h) are not downloaded separately: they are resampled
+from the stored RESAMPLE_BASE series on the NSE session grid whenever that series covers
+the requested range, so switching interval on a symbol costs no network request.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import pickle
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from datetime import datetime, timedelta
+
+import pandas as pd
+import yfinance as yf
+
+import metrics
+from caching import CACHE_DIR, ensure_private_dir
+from resampling import can_derive, resample_ohlcv
+from shared_store import get_shared_store
+
+logger = logging.getLogger(__name__)
+
+HISTORY_DIR = os.path.join(CACHE_DIR, "history")
+MAX_PARALLEL_FETCHES = int(os.getenv("HISTORY_MAX_PARALLEL_FETCHES", "4"))
+RESAMPLE_BASE = os.getenv("HISTORY_RESAMPLE_BASE", "5m")
+OHLCV = ["Open", "High", "Low", "Close", "Volume"]
+INTRADAY = {"1m", "2m", "5m", "15m", "30m", "60m", "90m", "1h"}
+
+# (days per request, how far back the provider serves this interval); None = unbounded.
+PROVIDER_LIMITS = {
+    "1m": (7, 29), "2m": (30, 59), "5m": (30, 59), "15m": (30, 59), "30m": (30, 59),
+    "60m": (180, 729), "90m": (30, 59), "1h": (180, 729),
+    "1d": (3650, None), "5d": (3650, None), "1wk": (3650, None), "1mo": (3650, None),
+}
+BAR_LENGTH = {
+    "1m": timedelta(minutes=1), "2m": timedelta(minutes=2), "5m": timedelta(minutes=5),
+    "15m": timedelta(minutes=15), "30m": timedelta(minutes=30), "60m": timedelta(hours=1),
+    "90m": timedelta(minutes=90), "1h": timedelta(hours=1), "1d": timedelta(days=1),
+}
+# A stored tail younger than this is served as-is instead of asking for newer bars.
+TAIL_REFRESH = {True: timedelta(minutes=1), False: timedelta(hours=1)}  # keyed by is-intraday
+FETCH_LEASE_SECONDS = 90  # longest one worker waits for another's fetch of the same series
+EXCHANGE_TZ = "Asia/Kolkata"  # all range arithmetic below is naive wall-clock time on the exchange
+
+_locks: dict = {}
+_locks_guard = threading.Lock()
+
+
+def _lock_for(key: str) -> threading.Lock:
+    with _locks_guard:
+        return _locks.setdefault(key, threading.Lock())
+
+
+def _fetch_lease(key: str):
+    """Serializes stitching of one series across worker processes (no-op without the store)."""
+    store = get_shared_store()
+    return store.lease(f"history:{key}", ttl=FETCH_LEASE_SECONDS, wait=FETCH_LEASE_SECONDS) if store else nullcontext()
+
+
+def _path(ticker: str, interval: str) -> str:
+    safe = "".join(c if c.isalnum() or c in "-_." else "_" for c in ticker)
+    return os.path.join(HISTORY_DIR, f"{safe}_{interval}.pkl")
+
+
+def _load(ticker: str, interval: str):
+    try:
+        ensure_private_dir(HISTORY_DIR)   # never unpickle from a directory someone else controls
+        with open(_path(ticker, interval), "rb") as fh:
+            return pickle.load(fh)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logger.warning(f"Ignoring unreadable history cache for {ticker} {interval}: {e}")
+        return None
+
+
+def _store(ticker: str, interval: str, entry: dict) -> None:
+    try:
+        ensure_private_dir(HISTORY_DIR)
+        fd, tmp = tempfile.mkstemp(dir=HISTORY_DIR, suffix=".tmp")
+        with os.fdopen(fd, "wb") as fh:
+            pickle.dump(entry, fh, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, _path(ticker, interval))
+    except OSError as e:
+        logger.warning(f"History cache write failed for {ticker} {interval}: {e}")
+
+
+def _fetch_chunk(ticker: str, interval: str, start: datetime, end: datetime) -> pd.DataFrame:
+    # Ticker.history keeps no module-level state, unlike yf.download, so chunks can run in parallel.
+    with metrics.timed("history.fetch"):
+        frame = yf.Ticker(ticker).history(start=_aware(start), end=_aware(end), interval=interval, auto_adjust=True)
+    if frame is None or frame.empty:
+        return pd.DataFrame(columns=OHLCV)
+    frame = frame[[c for c in OHLCV if c in frame.columns]]
+    if interval not in INTRADAY and frame.index.tz is not None:
+        frame.index = frame.index.tz_localize(None)  # daily bars are dates, as with yf.download
+    return frame
+
+
+def _chunks(start: datetime, end: datetime, days: int) -> list:
+    spans, cursor = [], start
+    while cursor < end:
+        stop = min(end, cursor + timedelta(days=days))
+        spans.append((cursor, stop))
+        cursor = stop
+    return spans
+
+
+def _fetch_ranges(ticker: str, interval: str, ranges: list) -> list:
+    chunk_days = PROVIDER_LIMITS.get(interval, (3650, None))[0]
+    spans = [span for start, end in ranges for span in _chunks(start, end, chunk_days)]
+    if not spans:
+        return []
+    metrics.incr("history.chunks", len(spans))
+    with ThreadPoolExecutor(max_workers=min(MAX_PARALLEL_FETCHES, len(spans))) as pool:
+        return list(pool.map(lambda s: _fetch_chunk(ticker, interval, *s), spans))
+
+
+def _naive(ts) -> datetime:
+    """Bar time as naive exchange time; tz-naive bar labels (daily dates) already are."""
+    ts = pd.Timestamp(ts)
+    return (ts.tz_convert(EXCHANGE_TZ).tz_localize(None) if ts.tz is not None else ts).to_pydatetime()
+
+
+def _aware(ts: datetime) -> pd.Timestamp:
+    return pd.Timestamp(ts).tz_localize(EXCHANGE_TZ)
+
+
+def _exchange_now() -> datetime:
+    return pd.Timestamp.now(tz=EXCHANGE_TZ).tz_localize(None).to_pydatetime()
+
+
+def _to_exchange(ts: datetime) -> datetime:
+    """Caller-supplied bound as naive exchange time. A naive value is server-local time (what
+    `datetime.now()` returns), which differs from IST whenever the host runs in another zone."""
+    ts = pd.Timestamp(ts)
+    if ts.tz is None:
+        ts = pd.Timestamp(ts.to_pydatetime().astimezone())
+    return _naive(ts)
+
+
+def check_continuity(frame: pd.DataFrame, interval: str) -> dict:
+    """Ordering / duplicate / gap report. Overnight and weekend gaps are expected; a gap
+    longer than 1.5 bars *within* one trading day is reported as missing data."""
+    index = frame.index
+    report = {"bars": len(frame), "monotonic": bool(index.is_monotonic_increasing),
+              "duplicates": int(index.duplicated().sum()), "intraday_gaps": 0}
+    bar = BAR_LENGTH.get(interval)
+    if interval in INTRADAY and bar is not None and len(frame) > 1:
+        times = pd.Series(index)
+        same_day = times.dt.date.eq(times.shift().dt.date)
+        report["intraday_gaps"] = int((times.diff().gt(bar * 1.5) & same_day).sum())
+    return report
+
+
+def history(ticker: str, interval: str, start: datetime, end: datetime | None = None) -> pd.DataFrame:
+    """OHLCV bars for [start, end] indexed by bar time ('Datetime' intraday, 'Date' daily).
+
+    Naive `start` / `end` are server-local time; tz-aware ones may be in any zone.
+    """
+    start = _to_exchange(start)
+    end = _to_exchange(end) if end is not None else _exchange_now()
+    if interval in INTRADAY and interval != RESAMPLE_BASE and can_derive(interval, RESAMPLE_BASE):
+        # Whole sessions only, so the first derived bar is not built from a partial bucket.
+        day_start = start.replace(hour=0, minute=0, second=0, microsecond=0)
+        base = _stitched(ticker, RESAMPLE_BASE, day_start, end)
+        # A few days of slack: the range may open on a weekend or holiday.
+        if not base.empty and _naive(base.index[0]) <= day_start + timedelta(days=4):
+            metrics.incr("history.resampled")
+            return resample_ohlcv(base, interval)
+    return _stitched(ticker, interval, start, end)
+
+
+def _stitched(ticker: str, interval: str, start: datetime, end: datetime) -> pd.DataFrame:
+    is_intraday = interval in INTRADAY
+    horizon = PROVIDER_LIMITS.get(interval, (3650, None))[1]
+    earliest = end - timedelta(days=horizon) if horizon else None
+
+    key = f"{ticker}|{interval}"
+    with _lock_for(key), _fetch_lease(key):
+        entry = _load(ticker, interval)
+        stored = entry["bars"] if entry else pd.DataFrame(columns=OHLCV)
+        fetch_from = max(start, earliest) if earliest else start
+        # requested_from is the oldest start of a fetch that returned bars: older ranges are
+        # not re-requested (the symbol may simply not have bars that far back).
+        # attempted_from is the oldest start asked for at all. A range that came back empty
+        # -- possibly a transient provider failure -- is retried only once the entry is
+        # stale, so one empty response never pins the series.
+        requested_from = entry.get("requested_from") if entry else None
+        attempted_from = entry.get("attempted_from", requested_from) if entry else None
+        stale = entry is None or _exchange_now() - entry["fetched_at"] > TAIL_REFRESH[is_intraday]
+        new_attempt = attempted_from is None or fetch_from < attempted_from - timedelta(days=1)
+        ranges, head_from = [], None
+        if stored.empty:
+            if stale or new_attempt:
+                ranges.append((fetch_from, end))
+                head_from = fetch_from
+        else:
+            head, tail = _naive(stored.index[0]), _naive(stored.index[-1])
+            if fetch_from < min(head, requested_from or head) - timedelta(days=1) and (stale or new_attempt):
+                ranges.append((fetch_from, head))
+                head_from = fetch_from
+            if stale:
+                # Re-read from the last stored bar: it may have been incomplete when stored.
+                ranges.append((tail, end))
+
+        if ranges:
+            parts = [p for p in [stored, *_fetch_ranges(ticker, interval, ranges)] if not p.empty]
+            merged = pd.concat(parts) if parts else stored
+            merged = merged[~merged.index.duplicated(keep="last")].sort_index()
+            merged.index.name = "Datetime" if is_intraday else "Date"
+            if head_from is not None:
+                attempted_from = min(attempted_from or head_from, head_from)
+                if not merged.empty and (stored.empty or merged.index[0] < stored.index[0]):
+                    requested_from = min(requested_from or head_from, head_from)
+            report = check_continuity(merged, interval)
+            if report["intraday_gaps"]:
+                logger.warning(f"{ticker} {interval}: {report['intraday_gaps']} intra-day gap(s) in stitched history")
+            metrics.incr("history.refreshed")
+            _store(ticker, interval, {"bars": merged, "fetched_at": _exchange_now(), "requested_from": requested_from,
+                                      "attempted_from": attempted_from, "continuity": report})
+            stored = merged
+        else:
+            metrics.incr("history.cache_hits")
+
+    if stored.empty:
+        return stored
+    index = stored.index
+    lo, hi = (_aware(start), _aware(end)) if index.tz is not None else (pd.Timestamp(start), pd.Timestamp(end))
+    return stored[(index >= lo) & (index <= hi)].copy()
@@ -0,0 +1,75 @@
+"""
+Process-local metrics registry for the API.
+
+Subsystems record into named counters, gauges and timers; `GET /api/metrics` returns a
+JSON snapshot. Everything is thread-safe because the sandbox, thread-pool endpoints and
+background loops all record from worker threads. Timers keep a bounded reservoir of the
+most recent samples so percentiles stay cheap and memory stays flat under load.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+RESERVOIR_SIZE = 512  # recent samples kept per timer for percentiles
+
+_lock = threading.Lock()
+_counters: dict = {}
+_gauges: dict = {}
+_timers: dict = {}
+
+
+def incr(name: str, value: float = 1) -> None:
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+
+
+def set_gauge(name: str, value: float) -> None:
+    with _lock:
+        _gauges[name] = value
+
+
+def observe(name: str, seconds: float) -> None:
+    """Record one duration sample (seconds) for a timer."""
+    with _lock:
+        t = _timers.get(name)
+        if t is None:
+            t = _timers[name] = {"count": 0, "total": 0.0, "max": 0.0, "recent": deque(maxlen=RESERVOIR_SIZE)}
+        t["count"] += 1
+        t["total"] += seconds
+        t["max"] = max(t["max"], seconds)
+        t["recent"].append(seconds)
+
+
+@contextmanager
+def timed(name: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - start)
+
+
+def _percentile(sorted_vals: list, q: float) -> float:
+    if not sorted_vals:
+        return 0.0
+    return sorted_vals[min(len(sorted_vals) - 1, int(q * len(sorted_vals)))]
+
+
+def snapshot() -> dict:
+    """A JSON-safe copy of every metric; timers report count/mean/max and recent p50/p95."""
+    with _lock:
+        timers = {}
+        for name, t in _timers.items():
+            recent = sorted(t["recent"])
+            timers[name] = {
+                "count": t["count"],
+                "mean_ms": round(t["total"] / t["count"] * 1000, 3) if t["count"] else 0.0,
+                "max_ms": round(t["max"] * 1000, 3),
+                "p50_ms": round(_percentile(recent, 0.50) * 1000, 3),
+                "p95_ms": round(_percentile(recent, 0.95) * 1000, 3),
+            }
+        return {"counters": dict(_counters), "gauges": dict(_gauges), "timers": timers}
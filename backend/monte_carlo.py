@@ -0,0 +1,92 @@
+"""
+Monte Carlo trade resampling for backtest confidence intervals.
+
+One backtest yields one ordering of its trades; the equity curve and drawdown it shows are a
+single draw. Here the per-trade returns are resampled thousands of times as one NumPy matrix
+per chunk (simulations x trades) and compounded with the engine's position sizing:
+
+    bootstrap  draw trades with replacement — uncertainty in the trade distribution itself
+    permute    shuffle the actual trades — same final equity, different path / drawdown
+
+Everything is vectorized (no per-simulation Python loop), so 10k simulations of 1k trades
+run in a fraction of a second and the stage can be on by default.
+"""
+
+from __future__ import annotations
+
+import numpy as np
+
+METHODS = ("bootstrap", "permute")
+PERCENTILES = (5, 25, 50, 75, 95)
+CHUNK_CELLS = 1_000_000   # simulations x trades per matrix, bounds peak memory (~8 MB float64)
+BAND_POINTS = 50          # trade steps sampled for the equity fan chart
+MAX_SIMULATIONS = 50_000
+
+
+def _bands(values: np.ndarray, decimals: int = 2) -> dict:
+    return {f"p{p}": round(float(v), decimals) for p, v in zip(PERCENTILES, np.percentile(values, PERCENTILES))}
+
+
+def simulate_trades(pnl_percents, capital: float, risk_percent: float, sl_percent: float,
+                    simulations: int = 10_000, method: str = "bootstrap", ruin_percent: float = 50.0,
+                    seed: int | None = None) -> dict | None:
+    """Percentile bands for final equity and max drawdown, plus the probability of ruin.
+
+    Position sizing matches backtest_engine.simulate: each trade moves equity by
+    `risk/sl * pnl%` of current equity (all-in when sl is 0). Ruin means equity falling at
+    any point to `ruin_percent` below the starting capital. Returns None without trades.
+    """
+    returns = np.asarray(pnl_percents, dtype=float)
+    if returns.size == 0 or simulations <= 0:
+        return None
+    if method not in METHODS:
+        raise ValueError(f"method must be one of {METHODS}")
+    simulations = min(int(simulations), MAX_SIMULATIONS)
+    leverage = (risk_percent / sl_percent) if sl_percent > 0 else 1.0
+    # Work in log-equity relative to the starting capital: compounding becomes a cumulative
+    # sum and drawdowns a difference, with no per-cell division. A trade that would take
+    # equity to or below zero is floored at a tiny positive factor (it counts as ruin).
+    log_factors = np.log(np.clip(1 + leverage * returns / 100, 1e-12, None))
+    n = log_factors.size
+    log_ruin = np.log(max(1 - ruin_percent / 100, 1e-12))
+
+    rng = np.random.default_rng(seed)
+    steps = np.unique(np.linspace(0, n - 1, min(n, BAND_POINTS)).astype(int))
+    final_log = np.empty(simulations)
+    worst_log_dd = np.empty(simulations)
+    ruined = np.empty(simulations, dtype=bool)
+    path_samples = np.empty((simulations, steps.size))
+
+    rows = max(1, CHUNK_CELLS // n)
+    for lo in range(0, simulations, rows):
+        hi = min(simulations, lo + rows)
+        if method == "bootstrap":
+            sample = log_factors[rng.integers(0, n, size=(hi - lo, n))]
+        else:
+            sample = rng.permuted(np.broadcast_to(log_factors, (hi - lo, n)), axis=1)
+        log_equity = np.cumsum(sample, axis=1, out=sample)
+        peak = np.maximum.accumulate(log_equity, axis=1)
+        np.maximum(peak, 0.0, out=peak)          # the starting capital is the first peak
+        final_log[lo:hi] = log_equity[:, -1]
+        worst_log_dd[lo:hi] = np.subtract(log_equity, peak, out=peak).min(axis=1)
+        ruined[lo:hi] = log_equity.min(axis=1) <= log_ruin
+        path_samples[lo:hi] = log_equity[:, steps]
+
+    finals = capital * np.exp(final_log)
+    drawdowns = (1 - np.exp(worst_log_dd)) * 100
+    path_bands = capital * np.exp(np.percentile(path_samples, PERCENTILES, axis=0))
+
+    return {
+        "method": method, "simulations": simulations, "trades": int(n),
+        "final_equity": _bands(finals),
+        "return_percent": _bands((finals / capital - 1) * 100),
+        "max_drawdown": _bands(drawdowns),
+        "probability_of_profit": round(float((finals > capital).mean() * 100), 2),
+        "probability_of_ruin": round(float(ruined.mean() * 100), 2),
+        "ruin_threshold_percent": ruin_percent,
+        # Fan chart: equity percentiles after trade k (k = 1-based trade number).
+        "equity_bands": [
+            {"trade": int(k) + 1, **{f"p{p}": round(float(v), 2) for p, v in zip(PERCENTILES, path_bands[:, j])}}
+            for j, k in enumerate(steps)
+        ],
+    }
@@ -0,0 +1,234 @@
+"""
+Paper trading: evaluate every subscribed saved strategy live as new bars close.
+
+Work is organised per (symbol, interval), never per strategy:
+
+  1. Active subscriptions are loaded once per tick and grouped by (symbol, interval).
+  2. Each group fetches its bars once and computes the union of the indicators its
+     strategies reference once, over a trailing window of PAPER_WINDOW_BARS bars.
+  3. Strategies with identical code are evaluated once; the distinct scripts of a group go
+     through `safe_execute_batch` together on the sandbox bulkhead, i.e. one sandbox child
+     per symbol, not one process per strategy per bar. They are admitted as PAPER_USER,
+     with paper trading's own running cap; a group that finds the sandbox busy is deferred
+     untouched and picked up by the next tick.
+  4. Each subscription carries a `backtest_engine` state, so the new closed bars are
+     simulated exactly as the backtester would, and the resulting entries/exits are written
+     as simulated fills under users/{uid}/paper_fills.
+
+Groups run PAPER_GROUP_CONCURRENCY at a time. A tick holds the shared-store lease
+`paper:tick` from reading the subscriptions until their new states are committed, so with
+several uvicorn workers (each running its own loop) only one of them ticks at a time; the
+others skip. Fill documents get ids derived from the subscription, side and bar time, so
+even a tick that is repeated writes the same fills again rather than new ones.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+import backtest_engine
+import bulkheads
+import metrics
+from backtest_engine import closed_bars
+from indicators import DEFAULT_INDICATORS, compute_indicators, project
+from sandbox_admission import LANE_BATCH, PAPER_USER, SandboxBusy
+from shared_store import get_shared_store
+from strategy_analysis import referenced_columns
+from strategy_sandbox import safe_execute_batch, validate_strategy
+
+logger = logging.getLogger(__name__)
+
+COLLECTION = "paper_subscriptions"
+PAPER_WINDOW_BARS = int(os.getenv("PAPER_WINDOW_BARS", "600"))
+GROUP_TIMEOUT = int(os.getenv("PAPER_GROUP_TIMEOUT", "60"))
+GROUP_CONCURRENCY = int(os.getenv("PAPER_GROUP_CONCURRENCY", "4"))
+# Cross-worker tick lease; outlives any tick (a group is bounded by its fetch plus GROUP_TIMEOUT).
+TICK_LEASE_SECONDS = int(os.getenv("PAPER_TICK_LEASE_SECONDS", "900"))
+FIRESTORE_BATCH_LIMIT = 500  # max writes per Firestore batch commit
+
+class PaperTradingEngine:
+    def __init__(self, db, fetch_bars):
+        """`fetch_bars(symbol, interval)` returns (frame with a RangeIndex, date column name)."""
+        self.db = db
+        self.fetch_bars = fetch_bars
+        self._tick_lock = threading.Lock()  # ticks never overlap
+
+    # --- subscriptions ---
+
+    def subscribe(self, user_id: str, strategy_id: str, saved: dict) -> str:
+        code = (saved.get("resultData") or {}).get("python_code")
+        if not code:
+            raise ValueError("Saved strategy has no generated code to run.")
+        validate_strategy(code)
+        _, ref = self.db.collection(COLLECTION).add({
+            "userId": user_id, "strategyId": strategy_id, "name": saved.get("name", ""),
+            "symbol": saved["symbol"].upper(), "interval": saved["interval"], "code": code,
+            "capital": saved["capital"], "riskPercent": saved["riskPercent"],
+            "slPercent": saved["slPercent"], "targetPercent": saved["targetPercent"],
+            "engine_state": backtest_engine.new_state(saved["capital"]),
+            "active": True, "lastError": None, "createdAt": time.time(),
+        })
+        return ref.id
+
+    def unsubscribe(self, user_id: str, subscription_id: str) -> None:
+        ref = self.db.collection(COLLECTION).document(subscription_id)
+        doc = ref.get()
+        if not doc.exists or doc.to_dict().get("userId") != user_id:
+            raise KeyError(subscription_id)
+        ref.update({"active": False})
+
+    def list_subscriptions(self, user_id: str) -> list:
+        docs = self.db.collection(COLLECTION).where("userId", "==", user_id).stream()
+        return [{"id": d.id, **{k: v for k, v in d.to_dict().items() if k != "code"}} for d in docs]
+
+    # --- evaluation ---
+
+    def tick(self) -> dict:
+        """Evaluate all active subscriptions on any newly closed bars."""
+        if not self._tick_lock.acquire(blocking=False):
+            return {"skipped": "previous tick still running"}
+        try:
+            store = get_shared_store()
+            if store is None:
+                return self._tick()
+            with store.lease("paper:tick", ttl=TICK_LEASE_SECONDS, wait=0) as held:
+                if not held:
+                    metrics.incr("paper.tick_skipped")
+                    return {"skipped": "another worker is ticking"}
+                return self._tick()
+        finally:
+            self._tick_lock.release()
+
+    def _tick(self) -> dict:
+        with metrics.timed("paper.tick"):
+            groups = defaultdict(list)
+            for doc in self.db.collection(COLLECTION).where("active", "==", True).stream():
+                sub = doc.to_dict()
+                groups[(sub["symbol"], sub["interval"])].append((doc.reference, sub))
+
+            summary = {"groups": len(groups), "evaluated": 0, "fills": 0, "errors": 0, "deferred": 0}
+            with ThreadPoolExecutor(max(1, GROUP_CONCURRENCY), thread_name_prefix="paper-group") as pool:
+                futures = {key: pool.submit(self._run_group, *key, subs) for key, subs in groups.items()}
+            for (symbol, interval), future in futures.items():
+                try:
+                    evaluated, fills, errors = future.result()
+                except SandboxBusy:
+                    summary["deferred"] += 1   # nothing was written; the next tick retries the group
+                    continue
+                except Exception as e:
+                    logger.warning(f"Paper group {symbol}/{interval} failed: {e}")
+                    evaluated, fills, errors = 0, 0, len(groups[(symbol, interval)])
+                summary["evaluated"] += evaluated
+                summary["fills"] += fills
+                summary["errors"] += errors
+        metrics.incr("paper.evaluated", summary["evaluated"])
+        metrics.incr("paper.fills", summary["fills"])
+        metrics.incr("paper.deferred", summary["deferred"])
+        return summary
+
+    def _run_group(self, symbol: str, interval: str, subs: list):
+        data, date_col = bulkheads.YFINANCE.call(self.fetch_bars, symbol, interval)
+        data = closed_bars(data, date_col, interval).iloc[-PAPER_WINDOW_BARS:].reset_index(drop=True)
+        if len(data) < 2:
+            return 0, 0, 0
+        dates = data[date_col]
+        last_bar = dates.iloc[-1]
+
+        due = [(ref, sub) for ref, sub in subs
+               if not sub["engine_state"].get("last_timestamp")
+               or pd.Timestamp(sub["engine_state"]["last_timestamp"]) < last_bar]
+        if not due:
+            return 0, 0, 0
+
+        by_code = defaultdict(list)
+        for ref, sub in due:
+            by_code[sub["code"]].append((ref, sub))
+        codes = list(by_code)
+
+        # One indicator pass for the whole group, then a projected frame per distinct script.
+        referenced, needed = {}, set()
+        for code in codes:
+            try:
+                referenced[code] = referenced_columns(validate_strategy(code))
+            except ValueError:
+                referenced[code] = None
+            needed |= referenced[code] if referenced[code] is not None else set(DEFAULT_INDICATORS)
+        compute_indicators(data, needed, date_col, interval)
+        jobs = [(code, project(data, referenced[code]) if referenced[code] is not None else data) for code in codes]
+        results = bulkheads.SANDBOX.call(safe_execute_batch, jobs, total_seconds=GROUP_TIMEOUT, user_id=PAPER_USER,
+                                         lane=LANE_BATCH, return_exceptions=True)
+
+        writes, evaluated, fills, errors = [], 0, 0, 0
+        for code, signals in zip(codes, results):
+            for ref, sub in by_code[code]:
+                if isinstance(signals, Exception):
+                    errors += 1
+                    writes.append((ref, {"lastError": str(signals)[:500]}))
+                    continue
+                state = sub["engine_state"]
+                previous = state.get("last_timestamp")
+                if previous:
+                    start = max(1, int((dates > pd.Timestamp(previous)).to_numpy().argmax()))
+                else:
+                    start = len(data) - 1  # new subscription: trade from the latest closed bar on
+                trades, _, _ = backtest_engine.simulate(
+                    data, date_col, signals, sub["slPercent"], sub["targetPercent"], sub["riskPercent"], state, start)
+                new_fills = self._fills(sub, trades, state, previous)
+                fills_ref = self.db.collection("users").document(sub["userId"]).collection("paper_fills")
+                for fill in new_fills:
+                    writes.append((fills_ref.document(f"{ref.id}_{fill['side']}_{fill['time']}"), fill))
+                writes.append((ref, {"engine_state": state, "lastError": None, "lastEvaluated": time.time()}))
+                evaluated += 1
+                fills += len(new_fills)
+        self._commit(writes)
+        return evaluated, fills, errors
+
+    @staticmethod
+    def _fills(sub: dict, trades: list, state: dict, previous) -> list:
+        base = {"strategyId": sub["strategyId"], "symbol": sub["symbol"], "interval": sub["interval"],
+                "name": sub.get("name", ""), "createdAt": time.time()}
+        since = pd.Timestamp(previous) if previous else None
+
+        def is_new(ts) -> bool:
+            return since is None or pd.Timestamp(ts) > since
+
+        fills = []
+        for t in trades:
+            if is_new(t["entry_date"]):
+                fills.append({**base, "side": "BUY", "price": t["entry_price"], "time": t["entry_date"].isoformat()})
+            fills.append({**base, "side": "SELL", "price": t["exit_price"], "time": t["exit_date"].isoformat(),
+                          "reason": t["reason"], "pnl_percent": t["pnl_percent"]})
+        if state["in_trade"] and is_new(state["entry_date"]):
+            fills.append({**base, "side": "BUY", "price": state["entry_price"], "time": state["entry_date"]})
+        return fills
+
+    def _commit(self, writes: list) -> None:
+        """Apply (ref, fields) writes in Firestore batches; new fill docs are `set`, subscriptions `update`d."""
+        for i in range(0, len(writes), FIRESTORE_BATCH_LIMIT):
+            batch = self.db.batch()
+            for ref, fields in writes[i:i + FIRESTORE_BATCH_LIMIT]:
+                if ref.parent.id == COLLECTION:
+                    batch.update(ref, fields)
+                else:
+                    batch.set(ref, fields)
+            batch.commit()
+
+    # --- background loop ---
+
+    def start(self, interval_seconds: int) -> None:
+        def loop():
+            while True:
+                time.sleep(interval_seconds)
+                try:
+                    summary = self.tick()
+                    logger.info(f"Paper trading tick: {summary}")
+                except Exception as e:
+                    logger.warning(f"Paper trading tick failed: {e}")
+        threading.Thread(target=loop, daemon=True, name="paper-trading").start()
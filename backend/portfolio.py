@@ -0,0 +1,123 @@
+"""
+Portfolio backtests: one strategy over a basket of symbols with shared capital.
+
+The single-symbol engine (backtest_engine) holds one position at a time. Here state is kept
+as arrays laid out (time x symbol) / (symbol,) instead of per-trade dicts: closes and
+signals are T x S matrices, open positions are S-vectors of shares / entry / stop / target,
+and each bar is one vectorized step across all symbols. The per-bar rules match the
+single-symbol engine so a one-symbol basket reproduces it:
+
+  * exits first: a held symbol whose close is at or beyond its target / stop is sold
+  * then entries: signalled, flat, tradable symbols (not exited this bar) are bought in
+    basket order while free slots (`max_positions`) and buying power remain
+  * each entry's notional is `equity * risk% / sl%` (all equity when sl is 0), capped so
+    total exposure stays within `max_leverage * equity`
+"""
+
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+
+
+def simulate_portfolio(close: np.ndarray, signals: np.ndarray, capital: float, risk_percent: float,
+                       sl_percent: float, target_percent: float, max_positions: int = 10,
+                       max_leverage: float = 1.0) -> dict:
+    """Run the basket; `close` may hold NaN where a symbol has no bar (no trading then)."""
+    T, S = close.shape
+    tradable = ~np.isnan(close)
+    mark_px = pd.DataFrame(close).ffill().fillna(0.0).to_numpy()   # valuation uses the last known close
+    signals = signals & tradable
+    signals[0] = False                                              # as in the engine: bar 0 only warms up
+    size_fraction = risk_percent / sl_percent if sl_percent > 0 else 1.0
+
+    shares = np.zeros(S)
+    entry_px = np.full(S, np.nan)
+    stop_px = np.full(S, np.nan)
+    target_px = np.full(S, np.nan)
+    entry_bar = np.full(S, -1)
+    cash = float(capital)
+    equity = np.empty(T)
+    open_positions = np.zeros(T, dtype=np.int32)
+    trades = {k: [] for k in ("symbol", "entry_bar", "exit_bar", "entry_price", "exit_price", "pnl_percent", "target_hit")}
+
+    for t in range(T):
+        px = close[t]
+        held = shares > 0
+        exits = np.zeros(S, dtype=bool)
+        if held.any():
+            with np.errstate(invalid="ignore"):
+                hit_target = held & (px >= target_px)
+                exits = hit_target | (held & (px <= stop_px))
+            if exits.any():
+                cash += float((shares[exits] * px[exits]).sum())
+                for key, values in (
+                    ("symbol", np.flatnonzero(exits)), ("entry_bar", entry_bar[exits]),
+                    ("exit_bar", np.full(exits.sum(), t)), ("entry_price", entry_px[exits]),
+                    ("exit_price", px[exits]), ("pnl_percent", (px[exits] / entry_px[exits] - 1) * 100),
+                    ("target_hit", hit_target[exits]),
+                ):
+                    trades[key].append(values)
+                shares[exits] = 0.0
+                entry_px[exits] = stop_px[exits] = target_px[exits] = np.nan
+
+        held = shares > 0
+        exposure = float((shares * mark_px[t]).sum())
+        equity_t = cash + exposure
+        slots = max_positions - int(held.sum())
+        candidates = signals[t] & ~held & ~exits
+        if slots > 0 and equity_t > 0 and candidates.any():
+            picks = np.flatnonzero(candidates)[:slots]
+            notional = equity_t * size_fraction
+            affordable = int((max_leverage * equity_t - exposure) // notional) if notional > 0 else 0
+            picks = picks[:max(0, affordable)]
+            if picks.size:
+                shares[picks] = notional / px[picks]
+                entry_px[picks] = px[picks]
+                stop_px[picks] = px[picks] * (1 - sl_percent / 100)
+                target_px[picks] = px[picks] * (1 + target_percent / 100)
+                entry_bar[picks] = t
+                cash -= notional * picks.size
+
+        equity[t] = cash + float((shares * mark_px[t]).sum())
+        open_positions[t] = int((shares > 0).sum())
+
+    trade_arrays = {k: (np.concatenate(v) if v else np.array([])) for k, v in trades.items()}
+    return {"equity": equity, "open_positions": open_positions, "trades": trade_arrays}
+
+
+def portfolio_report(result: dict, dates, symbols: list, capital: float) -> dict:
+    """JSON-ready summary, per-symbol breakdown and curves for a simulate_portfolio result."""
+    equity = result["equity"]
+    trades = result["trades"]
+    peak = np.maximum.accumulate(np.maximum(equity, capital))
+    drawdown = (peak - equity) / peak * 100
+    pnl = trades["pnl_percent"]
+    wins, losses = pnl[pnl > 0], pnl[pnl <= 0]
+    labels = pd.DatetimeIndex(dates).strftime("%Y-%m-%d %H:%M")
+
+    per_symbol = []
+    symbol_idx = trades["symbol"].astype(int) if pnl.size else np.array([], dtype=int)
+    counts = np.bincount(symbol_idx, minlength=len(symbols))
+    sums = np.bincount(symbol_idx, weights=pnl, minlength=len(symbols)) if pnl.size else np.zeros(len(symbols))
+    won = np.bincount(symbol_idx, weights=(pnl > 0).astype(float), minlength=len(symbols)) if pnl.size else np.zeros(len(symbols))
+    for i, symbol in enumerate(symbols):
+        per_symbol.append({
+            "symbol": symbol, "trades": int(counts[i]), "total_pnl_percent": round(float(sums[i]), 2),
+            "win_rate": round(float(won[i] / counts[i] * 100), 2) if counts[i] else 0,
+        })
+
+    return {
+        "final_equity": round(float(equity[-1]), 2),
+        "pnl": round(float(equity[-1] - capital), 2),
+        "pnl_percent": round(float((equity[-1] / capital - 1) * 100), 2),
+        "max_drawdown": round(float(drawdown.max()), 2),
+        "num_trades": int(pnl.size),
+        "win_rate": round(float(wins.size / pnl.size * 100), 2) if pnl.size else 0,
+        "profit_factor": round(float(wins.sum() / -losses.sum()), 2) if losses.sum() < 0 else 999.0,
+        "avg_open_positions": round(float(result["open_positions"].mean()), 2),
+        "max_open_positions": int(result["open_positions"].max()),
+        "per_symbol": sorted(per_symbol, key=lambda r: r["total_pnl_percent"], reverse=True),
+        "equity_curve": [{"date": d, "equity": round(float(v), 2)} for d, v in zip(labels, equity)],
+        "drawdown_curve": [{"date": d, "drawdown": round(float(v), 2)} for d, v in zip(labels, drawdown)],
+    }
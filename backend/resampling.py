@@ -0,0 +1,64 @@
+"""
+OHLCV resampling aligned to NSE trading sessions.
+
+Coarser bars are derived locally from a finer cached series instead of downloading every
+interval separately: open=first, high=max, low=min, close=last, volume=sum. Intraday
+buckets are anchored at the 09:15 IST session open, so a derived 1h series has bars at
+09:15, 10:15, ..., 15:15 — the same grid the exchange (and yfinance) uses — and the last
+bucket of the day is the partial 15:15-15:30 one.
+"""
+
+from __future__ import annotations
+
+import pandas as pd
+
+SESSION_OPEN = pd.Timedelta(hours=9, minutes=15)
+SESSION_CLOSE = pd.Timedelta(hours=15, minutes=30)
+OHLCV_AGG = {"Open": "first", "High": "max", "Low": "min", "Close": "last", "Volume": "sum"}
+
+INTERVAL_RULES = {
+    "1m": "1min", "2m": "2min", "5m": "5min", "15m": "15min", "30m": "30min",
+    "60m": "60min", "90m": "90min", "1h": "60min", "1d": "1D",
+}
+INTRADAY_MINUTES = {"1m": 1, "2m": 2, "5m": 5, "15m": 15, "30m": 30, "60m": 60, "90m": 90, "1h": 60}
+
+
+def can_derive(target: str, base: str) -> bool:
+    """True when every `target` bar is a whole number of `base` bars on the session grid."""
+    if target in INTRADAY_MINUTES and base in INTRADAY_MINUTES:
+        t, b = INTRADAY_MINUTES[target], INTRADAY_MINUTES[base]
+        return t >= b and t % b == 0
+    return base in INTRADAY_MINUTES and target == "1d"
+
+
+def resample_ohlcv(frame: pd.DataFrame, interval: str) -> pd.DataFrame:
+    """Aggregate a bar-time-indexed OHLCV frame to `interval`; bars are labelled by their start.
+
+    Daily bars are labelled with the (tz-naive) session date, like provider daily bars.
+    Empty buckets (nights, weekends, holidays) are dropped.
+    """
+    rule = INTERVAL_RULES[interval]
+    agg = {c: f for c, f in OHLCV_AGG.items() if c in frame.columns}
+    if interval in INTRADAY_MINUTES:
+        out = frame.resample(rule, origin="start_day", offset=SESSION_OPEN, label="left", closed="left").agg(agg)
+    else:
+        index = frame.index.tz_localize(None) if frame.index.tz is not None else frame.index
+        out = frame.set_axis(index.normalize()).resample(rule, label="left", closed="left").agg(agg)
+    out = out.dropna(subset=["Open"])
+    out.index.name = frame.index.name if interval in INTRADAY_MINUTES else "Date"
+    return out
+
+
+def bar_close_times(index: pd.DatetimeIndex, interval: str, tz=None) -> pd.DatetimeIndex:
+    """When each bar labelled by `index` is complete, i.e. its values become knowable.
+
+    Intraday buckets end `interval` after their label but never after the 15:30 session
+    close (the last 1h bucket, 15:15-15:30, is complete at 15:30). A daily bar is complete
+    at 15:30 on its date; `tz` localizes tz-naive daily labels to the intraday timeline.
+    """
+    if interval in INTRADAY_MINUTES:
+        end = index + pd.Timedelta(minutes=INTRADAY_MINUTES[interval])
+        session_end = index.normalize() + SESSION_CLOSE
+        return end.where(end <= session_end, session_end)
+    days = index.tz_localize(tz) if tz is not None and index.tz is None else index
+    return days.normalize() + SESSION_CLOSE
@@ -0,0 +1,151 @@
+"""
+Negotiated response encodings for the large chart / table endpoints.
+
+The default JSON bodies repeat every key per point (`{"date": ..., "equity": ...}` x N).
+Two compact alternatives carry the same data:
+
+    columnar  JSON where every list of uniform row dicts becomes a table of parallel
+              arrays, `{"date": [...], "equity": [...]}`, and time columns become integer
+              epoch seconds (exchange-local wall-clock time, i.e. render them as UTC)
+    msgpack   the columnar body encoded as MessagePack (optional `msgpack` dependency)
+
+A client selects one with `?format=columnar|msgpack` or via the Accept header
+(COLUMNAR_MEDIA_TYPE / application/msgpack); anything else gets the plain JSON body.
+
+JSON bodies are encoded with orjson when it is installed: NumPy scalars and arrays and
+datetimes are serialized natively, and NaN / infinity become null inside the encoder, so
+payloads need no per-value jsonable_encoder walk or clean_val pass before encoding.
+"""
+
+from __future__ import annotations
+
+import json
+import math
+from datetime import date, datetime
+
+import numpy as np
+import pandas as pd
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse, Response
+
+try:
+    import msgpack
+except ImportError:  # optional: only needed for the binary encoding
+    msgpack = None
+try:
+    import orjson
+except ImportError:  # optional: the stdlib encoder is the fallback
+    orjson = None
+
+FORMAT_JSON, FORMAT_COLUMNAR, FORMAT_MSGPACK = "json", "columnar", "msgpack"
+COLUMNAR_MEDIA_TYPE = "application/vnd.patterniq.columnar+json"
+MSGPACK_MEDIA_TYPES = ("application/msgpack", "application/x-msgpack", "application/vnd.msgpack")
+TIME_COLUMNS = {"date", "entry_date", "exit_date", "time"}
+TIME_FORMAT = "%Y-%m-%d %H:%M"
+
+
+def negotiate(accept: str | None, requested: str | None = None) -> str:
+    """The encoding for a request: an explicit `requested` name wins over the Accept header."""
+    if requested:
+        requested = requested.lower()
+        if requested not in (FORMAT_JSON, FORMAT_COLUMNAR, FORMAT_MSGPACK):
+            raise HTTPException(400, f"Unknown format '{requested}'. Use json, columnar or msgpack.")
+        fmt = requested
+    else:
+        accept = (accept or "").lower()
+        if any(t in accept for t in MSGPACK_MEDIA_TYPES):
+            fmt = FORMAT_MSGPACK
+        elif COLUMNAR_MEDIA_TYPE in accept:
+            fmt = FORMAT_COLUMNAR
+        else:
+            fmt = FORMAT_JSON
+    if fmt == FORMAT_MSGPACK and msgpack is None:
+        raise HTTPException(406, "MessagePack responses are not available on this server.")
+    return fmt
+
+
+def epoch_seconds(labels: list) -> list:
+    """`TIME_FORMAT` strings (or ISO timestamps) to integer epoch seconds, in one pass."""
+    try:
+        parsed = pd.to_datetime(pd.Series(labels), format=TIME_FORMAT)
+    except ValueError:
+        parsed = pd.to_datetime(pd.Series(labels), format="ISO8601")
+    if parsed.dt.tz is not None:
+        parsed = parsed.dt.tz_localize(None)
+    return (parsed.to_numpy().astype("datetime64[s]").astype("int64")).tolist()
+
+
+def _table(rows: list) -> dict | None:
+    """Parallel arrays for a list of dicts sharing one key set, else None."""
+    keys = list(rows[0])
+    key_set = set(keys)
+    if any(not isinstance(r, dict) or r.keys() != key_set for r in rows):
+        return None
+    table = {}
+    for key in keys:
+        column = [r[key] for r in rows]
+        if key in TIME_COLUMNS and all(isinstance(v, str) for v in column):
+            column = epoch_seconds(column)
+        table[key] = column
+    return table
+
+
+def to_columnar(value):
+    """Recursively turn every list of uniform row dicts in `value` into a column table."""
+    if isinstance(value, dict):
+        return {k: to_columnar(v) for k, v in value.items()}
+    if isinstance(value, list) and value and isinstance(value[0], dict):
+        table = _table(value)
+        return table if table is not None else [to_columnar(v) for v in value]
+    return value
+
+
+def _default(value):
+    """Encoder fallback: NumPy scalars / arrays and timestamps (incl. Firestore's subclass)."""
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not serializable")
+
+
+def _finite(value):
+    """Non-finite floats to None, for the stdlib fallback (orjson does this natively)."""
+    if isinstance(value, float):
+        return value if math.isfinite(value) else None
+    if isinstance(value, dict):
+        return {k: _finite(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_finite(v) for v in value]
+    if isinstance(value, np.ndarray) and value.dtype.kind == "f":
+        return np.where(np.isfinite(value), value, None).tolist()
+    return value
+
+
+def dumps(value) -> bytes:
+    """Compact UTF-8 JSON; non-finite numbers are encoded as null."""
+    if orjson is not None:
+        return orjson.dumps(value, default=_default, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(_finite(value), default=_default, allow_nan=False, ensure_ascii=False,
+                      separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse encoded with `dumps`. Return it directly from an endpoint so FastAPI
+    skips its own jsonable_encoder pass over the content."""
+
+    def render(self, content) -> bytes:
+        return dumps(content)
+
+
+def render(payload: dict, fmt: str) -> Response:
+    """A Response for `payload` in the negotiated encoding."""
+    headers = {"Vary": "Accept"}
+    if fmt == FORMAT_COLUMNAR:
+        return Response(dumps(to_columnar(payload)), media_type=COLUMNAR_MEDIA_TYPE, headers=headers)
+    if fmt == FORMAT_MSGPACK:
+        return Response(msgpack.packb(to_columnar(payload), default=_default, use_bin_type=True),
+                        media_type=MSGPACK_MEDIA_TYPES[0], headers=headers)
+    return FastJSONResponse(payload, headers=headers)
@@ -0,0 +1,212 @@
+"""
+Admission control for sandbox executions.
+
+Every sandboxed strategy run is a child process allowed ~1.5 GB of address space, so the
+number running at once has to be bounded or one busy user can starve everyone else (or
+OOM the container). This module gates the spawn behind a small scheduler:
+
+  1. A global concurrency limit (SANDBOX_MAX_CONCURRENT) plus a per-user running cap.
+  2. A bounded wait queue. When it is full, or a caller waits longer than
+     SANDBOX_MAX_WAIT, the request fails fast with `SandboxBusy`, which carries a
+     Retry-After estimate (the API turns it into a 429).
+  3. Priority lanes: interactive backtests are always dispatched ahead of batch work
+     (sweeps, walk-forward, comparisons).
+  4. Fair round-robin across users inside a lane, so a user with ten queued jobs gets
+     one slot per turn like everyone else.
+  5. Background work runs under system identities (PAPER_USER) with their own running cap
+     instead of sharing the "anonymous" quota with unauthenticated callers.
+
+Queue depth, running count, wait time and rejections are exported through `metrics`.
+"""
+
+from __future__ import annotations
+
+import math
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+
+import metrics
+
+LANE_INTERACTIVE = 0  # a user is waiting on the response
+LANE_BATCH = 1        # sweeps / walk-forward / comparisons / paper trading
+LANES = (LANE_INTERACTIVE, LANE_BATCH)
+_LANE_NAMES = {LANE_INTERACTIVE: "interactive", LANE_BATCH: "batch"}
+
+MAX_CONCURRENT = max(1, int(os.getenv("SANDBOX_MAX_CONCURRENT", "2")))
+MAX_PER_USER = max(1, int(os.getenv("SANDBOX_MAX_PER_USER", "1")))
+MAX_QUEUE = max(0, int(os.getenv("SANDBOX_MAX_QUEUE", "16")))
+MAX_QUEUED_PER_USER = max(1, int(os.getenv("SANDBOX_MAX_QUEUED_PER_USER", "4")))
+MAX_WAIT = float(os.getenv("SANDBOX_MAX_WAIT", "20"))  # seconds a caller may queue
+
+PAPER_USER = "system:paper"  # paper-trading ticks
+# By default paper trading leaves at least one slot to users (when there is more than one).
+PAPER_MAX_RUNNING = max(1, int(os.getenv("SANDBOX_PAPER_MAX_RUNNING", str(max(1, MAX_CONCURRENT - 1)))))
+
+
+class SandboxBusy(Exception):
+    """Raised when a sandbox slot cannot be granted; `retry_after` is in whole seconds."""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class _Waiter:
+    __slots__ = ("user", "event", "granted", "enqueued")
+
+    def __init__(self, user: str):
+        self.user = user
+        self.event = threading.Event()
+        self.granted = False
+        self.enqueued = time.monotonic()
+
+
+class AdmissionController:
+    def __init__(self, max_concurrent=MAX_CONCURRENT, max_per_user=MAX_PER_USER, max_queue=MAX_QUEUE,
+                 max_queued_per_user=MAX_QUEUED_PER_USER, max_wait=MAX_WAIT, user_limits=None, name="sandbox"):
+        self.max_concurrent = max_concurrent
+        self.max_per_user = max_per_user
+        self.user_limits = dict(user_limits or {})     # user -> running cap overriding max_per_user
+        self.max_queue = max_queue
+        self.max_queued_per_user = max_queued_per_user
+        self.max_wait = max_wait
+        self.name = name
+        self._lock = threading.Lock()
+        self._running: dict = {}                           # user -> running count
+        self._lanes = {lane: OrderedDict() for lane in LANES}  # lane -> {user: deque[_Waiter]}
+        self._queued = 0
+        self._avg_run = 2.0                                # EWMA of slot hold time (seconds)
+
+    # --- public API -------------------------------------------------------------------
+    @contextmanager
+    def slot(self, user_id: str | None = None, lane: int = LANE_INTERACTIVE):
+        """Hold one sandbox slot for the duration of the block (blocks while queued)."""
+        user = user_id or "anonymous"
+        self.acquire(user, lane)
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release(user, time.monotonic() - start)
+
+    def acquire(self, user: str, lane: int = LANE_INTERACTIVE) -> None:
+        if lane not in self._lanes:
+            raise ValueError(f"Unknown sandbox lane: {lane}")
+        with self._lock:
+            if self._queued == 0 and self._can_run(user):
+                self._grant_locked(user)
+                metrics.observe(f"{self.name}.queue_wait", 0.0)
+                return
+            if self._queued >= self.max_queue:
+                self._reject_locked("queue_full")
+                raise SandboxBusy("The strategy sandbox is at capacity. Please retry shortly.",
+                                  self._retry_after_locked())
+            user_q = self._lanes[lane].get(user)
+            if user_q is not None and len(user_q) >= self.max_queued_per_user:
+                self._reject_locked("user_queue_full")
+                raise SandboxBusy("You already have several backtests queued. Please wait for them to finish.",
+                                  self._retry_after_locked())
+            waiter = _Waiter(user)
+            self._lanes[lane].setdefault(user, deque()).append(waiter)
+            self._queued += 1
+            self._dispatch_locked()  # a slot may be free for this user even if others wait
+            self._publish_locked()
+
+        waiter.event.wait(self.max_wait)
+
+        with self._lock:
+            if waiter.granted:
+                metrics.observe(f"{self.name}.queue_wait", time.monotonic() - waiter.enqueued)
+                return
+            # Timed out while queued: withdraw so the slot goes to someone still waiting.
+            user_q = self._lanes[lane].get(user)
+            if user_q is not None and waiter in user_q:
+                user_q.remove(waiter)
+                if not user_q:
+                    del self._lanes[lane][user]
+                self._queued -= 1
+            self._reject_locked("wait_timeout")
+            raise SandboxBusy("Timed out waiting for a free strategy sandbox. Please retry shortly.",
+                              self._retry_after_locked())
+
+    def release(self, user: str, held_seconds: float = 0.0) -> None:
+        with self._lock:
+            left = self._running.get(user, 0) - 1
+            if left > 0:
+                self._running[user] = left
+            else:
+                self._running.pop(user, None)
+            self._avg_run = 0.8 * self._avg_run + 0.2 * held_seconds
+            self._dispatch_locked()
+            self._publish_locked()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "running": sum(self._running.values()),
+                "queued": self._queued,
+                "queued_by_lane": {_LANE_NAMES[l]: sum(len(q) for q in users.values())
+                                   for l, users in self._lanes.items()},
+                "max_concurrent": self.max_concurrent,
+                "max_queue": self.max_queue,
+            }
+
+    # --- scheduling (caller holds self._lock) --------------------------------------------
+    def _can_run(self, user: str) -> bool:
+        return (sum(self._running.values()) < self.max_concurrent
+                and self._running.get(user, 0) < self._limit(user))
+
+    def _limit(self, user: str) -> int:
+        return self.user_limits.get(user, self.max_per_user)
+
+    def _grant_locked(self, user: str) -> None:
+        self._running[user] = self._running.get(user, 0) + 1
+        metrics.incr(f"{self.name}.admitted")
+        self._publish_locked()
+
+    def _dispatch_locked(self) -> None:
+        """Hand free slots out: highest-priority lane first, round-robin across its users."""
+        while sum(self._running.values()) < self.max_concurrent:
+            picked = None
+            for lane in LANES:
+                users = self._lanes[lane]
+                for user in users:
+                    if self._running.get(user, 0) < self._limit(user):
+                        picked = (lane, user)
+                        break
+                if picked:
+                    break
+            if picked is None:
+                return
+            lane, user = picked
+            user_q = self._lanes[lane][user]
+            waiter = user_q.popleft()
+            if user_q:
+                self._lanes[lane].move_to_end(user)  # next turn goes to another user
+            else:
+                del self._lanes[lane][user]
+            self._queued -= 1
+            waiter.granted = True
+            self._grant_locked(user)
+            waiter.event.set()
+
+    def _retry_after_locked(self) -> int:
+        waves = (self._queued + 1) / self.max_concurrent
+        return max(1, math.ceil(self._avg_run * waves))
+
+    def _reject_locked(self, reason: str) -> None:
+        metrics.incr(f"{self.name}.rejected")
+        metrics.incr(f"{self.name}.rejected.{reason}")
+
+    def _publish_locked(self) -> None:
+        metrics.set_gauge(f"{self.name}.running", sum(self._running.values()))
+        metrics.set_gauge(f"{self.name}.queue_depth", self._queued)
+        for lane, users in self._lanes.items():
+            metrics.set_gauge(f"{self.name}.queue_depth.{_LANE_NAMES[lane]}", sum(len(q) for q in users.values()))
+
+
+# Shared controller for every sandbox spawn in this worker process.
+sandbox_admission = AdmissionController(user_limits={PAPER_USER: PAPER_MAX_RUNNING})
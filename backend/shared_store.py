@@ -0,0 +1,147 @@
+"""
+Cross-process key/value store for every uvicorn worker on a host (WAL-mode SQLite).
+
+With several workers (uvicorn --workers N, or WEB_CONCURRENCY=N) each process has its own
+memory caches, so without a shared tier every worker would fetch the same bars, run the
+same scan and ask the LLM the same question. This store gives them:
+
+  * atomic publish / cheap reads — one row per key, written in a single transaction; WAL
+    mode lets readers proceed while a writer commits, so a read is one indexed SELECT
+  * leases — a cross-process mutex per name, so one worker loads while the others wait
+    for its published result instead of calling the upstream themselves
+  * generations — a counter per namespace that invalidations bump, so workers can tell
+    their in-memory copies are out of date
+
+Values are pickled, so the file's directory must be private (`caching.ensure_private_dir`).
+The file lives at SHARED_CACHE_PATH (default PATTERNIQ_CACHE_DIR/shared.sqlite3);
+`get_shared_store()` returns None when it cannot be opened, and callers then behave as
+single-process caches.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import pickle
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+import metrics
+from caching import CACHE_DIR, ensure_private_dir
+
+logger = logging.getLogger(__name__)
+
+SHARED_CACHE_PATH = os.getenv("SHARED_CACHE_PATH", os.path.join(CACHE_DIR, "shared.sqlite3"))
+PURGE_EVERY = 200   # puts between sweeps of expired rows
+LEASE_POLL_SECONDS = 0.05
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL NOT NULL);
+CREATE TABLE IF NOT EXISTS leases (name TEXT PRIMARY KEY, token TEXT NOT NULL, expires_at REAL NOT NULL);
+CREATE TABLE IF NOT EXISTS generations (name TEXT PRIMARY KEY, gen INTEGER NOT NULL);
+"""
+
+
+class SharedStore:
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()   # one connection per thread
+        self._puts = 0
+        ensure_private_dir(os.path.dirname(os.path.abspath(path)))   # values are unpickled
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(_SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA synchronous=NORMAL")   # durable enough for a cache, far fewer fsyncs
+            conn.execute("PRAGMA busy_timeout=10000")
+            self._local.conn = conn
+        return conn
+
+    # --- entries ---
+
+    def get(self, key: str, default=None):
+        row = self._conn().execute("SELECT value, expires_at FROM entries WHERE key = ?", (key,)).fetchone()
+        if row is None or row[1] <= time.time():
+            metrics.incr("shared_store.misses")
+            return default
+        metrics.incr("shared_store.hits")
+        return pickle.loads(row[0])
+
+    def put(self, key: str, value, ttl: float) -> None:
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        conn = self._conn()
+        conn.execute("INSERT OR REPLACE INTO entries (key, value, expires_at) VALUES (?, ?, ?)",
+                     (key, blob, time.time() + ttl))
+        self._puts += 1
+        if self._puts % PURGE_EVERY == 0:
+            conn.execute("DELETE FROM entries WHERE expires_at <= ?", (time.time(),))
+
+    def delete_prefix(self, prefix: str) -> None:
+        self._conn().execute("DELETE FROM entries WHERE substr(key, 1, ?) = ?", (len(prefix), prefix))
+
+    # --- generations ---
+
+    def generation(self, name: str) -> int:
+        row = self._conn().execute("SELECT gen FROM generations WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else 0
+
+    def bump_generation(self, name: str) -> None:
+        self._conn().execute("INSERT INTO generations (name, gen) VALUES (?, 1) "
+                             "ON CONFLICT(name) DO UPDATE SET gen = gen + 1", (name,))
+
+    # --- leases ---
+
+    def try_acquire(self, name: str, ttl: float) -> str | None:
+        """A token if `name` was free (or its holder's lease expired), else None."""
+        token, now = uuid.uuid4().hex, time.time()
+        cur = self._conn().execute(
+            "INSERT INTO leases (name, token, expires_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET token = excluded.token, expires_at = excluded.expires_at "
+            "WHERE leases.expires_at <= ?", (name, token, now + ttl, now))
+        return token if cur.rowcount == 1 else None
+
+    def release(self, name: str, token: str) -> None:
+        self._conn().execute("DELETE FROM leases WHERE name = ? AND token = ?", (name, token))
+
+    @contextmanager
+    def lease(self, name: str, ttl: float = 60.0, wait: float = 60.0):
+        """Hold `name` across processes; yields False if it could not be had within `wait`
+        seconds (the caller then proceeds unserialized rather than failing)."""
+        deadline = time.monotonic() + wait
+        token = self.try_acquire(name, ttl)
+        if token is None:
+            metrics.incr("shared_store.lease_waits")
+        while token is None and time.monotonic() < deadline:
+            time.sleep(LEASE_POLL_SECONDS)
+            token = self.try_acquire(name, ttl)
+        try:
+            yield token is not None
+        finally:
+            if token is not None:
+                self.release(name, token)
+
+
+_store = None
+_store_lock = threading.Lock()
+_store_failed = False
+
+
+def get_shared_store() -> SharedStore | None:
+    global _store, _store_failed
+    if _store is not None or _store_failed:
+        return _store
+    with _store_lock:
+        if _store is None and not _store_failed:
+            try:
+                _store = SharedStore(SHARED_CACHE_PATH)
+            except (sqlite3.Error, OSError) as e:
+                logger.warning(f"Shared cache disabled ({SHARED_CACHE_PATH}): {e}")
+                _store_failed = True
+    return _store
@@ -0,0 +1,421 @@
+"""
+Static analysis of validated strategy code.
+
+`strategy_sandbox` decides whether a script is *safe*; this module estimates what it will
+*cost* and, where it can prove equivalence, makes it cheaper. It only ever looks at an AST
+that already passed `validate_strategy`, and anything it emits is re-validated before it
+runs.
+
+  * `analyze_cost(tree)` estimates the complexity of `find_signals` in the number of rows
+    and flags per-row Python loops, scalar indexing inside them and rolling-window
+    recomputation inside loops (each iteration re-reads the whole series), with hints.
+  * `referenced_columns(tree)` lists the `data[...]` columns `find_signals` reads, so the
+    engine can compute only those indicators and ship only those columns to the sandbox.
+  * `vectorize_loops(tree)` recognises the classic "walk the rows and mark a signal"
+    loop and rewrites it into one vectorized expression over shifted columns, which the
+    sandbox can then evaluate on its in-process fast path.
+
+The rewrite is deliberately narrow: it only fires when every row reference is a column
+read at `i` or `i - k` with a constant `k` no larger than the loop's start, so the loop can
+never wrap around to negative positions and the shifted form reproduces it exactly.
+"""
+
+from __future__ import annotations
+
+import ast
+import copy
+
+import pandas as pd
+
+# Methods that recompute over a whole series/window when called.
+WINDOW_METHODS = {"rolling", "ewm", "expanding"}
+SERIES_RECOMPUTE_METHODS = WINDOW_METHODS | {"apply", "cumsum", "cumprod", "shift", "diff", "pct_change"}
+ROW_ITER_METHODS = {"iterrows", "itertuples", "items"}
+SCALAR_INDEXERS = {"iloc", "loc", "at", "iat", "values"}
+
+
+# --- Cost analysis -----------------------------------------------------------------------
+def _find_signals(tree: ast.Module):
+    for node in tree.body:
+        if isinstance(node, ast.FunctionDef) and node.name == "find_signals":
+            return node
+    return None
+
+
+def _is_len_of(node, arg_name: str, aliases=()) -> bool:
+    """len(data), len(data['col']), len(data.index), len(<column alias>) or data.shape[0]."""
+    if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id == "len" \
+            and len(node.args) == 1 and not node.keywords:
+        target = node.args[0]
+        if isinstance(target, ast.Name) and target.id in aliases:
+            return True
+        if isinstance(target, (ast.Subscript, ast.Attribute)):
+            target = target.value
+        return isinstance(target, ast.Name) and target.id == arg_name
+    if (isinstance(node, ast.Subscript) and isinstance(node.value, ast.Attribute) and node.value.attr == "shape"
+            and isinstance(node.value.value, ast.Name) and node.value.value.id == arg_name):
+        return isinstance(node.slice, ast.Constant) and node.slice.value == 0
+    return False
+
+
+def _is_row_loop(node, arg_name: str) -> bool:
+    if isinstance(node, ast.While):
+        return True  # no static bound; treat as per-row
+    it = node.iter
+    if isinstance(it, ast.Call) and isinstance(it.func, ast.Name) and it.func.id in ("range", "enumerate", "zip"):
+        return any(_is_len_of(a, arg_name) or _mentions(a, arg_name) for a in it.args)
+    if isinstance(it, ast.Call) and isinstance(it.func, ast.Attribute) and it.func.attr in ROW_ITER_METHODS:
+        return True
+    # Iterating a column or the frame's index walks every row.
+    return _mentions(it, arg_name)
+
+
+def _mentions(node, name: str) -> bool:
+    return any(isinstance(n, ast.Name) and n.id == name for n in ast.walk(node))
+
+
+class _CostVisitor(ast.NodeVisitor):
+    def __init__(self, arg_name: str):
+        self.arg_name = arg_name
+        self.depth = 0               # current per-row loop nesting
+        self.max_exponent = 1        # vectorized code is already O(n)
+        self.row_loops = []
+        self.window_in_loop = []
+        self.scalar_indexing = []
+        self.unbounded = []
+
+    def _loop(self, node):
+        per_row = _is_row_loop(node, self.arg_name)
+        if per_row:
+            self.depth += 1
+            self.row_loops.append({"line": node.lineno, "kind": "while" if isinstance(node, ast.While) else "for"})
+            if isinstance(node, ast.While):
+                self.unbounded.append(node.lineno)
+            self.max_exponent = max(self.max_exponent, self.depth)
+        self.generic_visit(node)
+        if per_row:
+            self.depth -= 1
+
+    visit_For = _loop
+    visit_While = _loop
+
+    def visit_Call(self, node):
+        if self.depth and isinstance(node.func, ast.Attribute) and node.func.attr in SERIES_RECOMPUTE_METHODS:
+            if node.func.attr in WINDOW_METHODS:
+                self.window_in_loop.append(node.lineno)
+            # Each iteration redoes O(n) work over the full series.
+            self.max_exponent = max(self.max_exponent, self.depth + 1)
+        self.generic_visit(node)
+
+    def visit_Subscript(self, node):
+        if self.depth and isinstance(node.ctx, ast.Load) and not isinstance(node.slice, ast.Constant):
+            value = node.value
+            if isinstance(value, ast.Attribute) and value.attr in SCALAR_INDEXERS:
+                self.scalar_indexing.append(node.lineno)
+            elif isinstance(value, ast.Subscript) or (isinstance(value, ast.Name) and value.id != self.arg_name):
+                self.scalar_indexing.append(node.lineno)
+        self.generic_visit(node)
+
+
+def _big_o(exponent: int) -> str:
+    return "O(n)" if exponent <= 1 else f"O(n^{exponent})"
+
+
+def analyze_cost(tree: ast.Module) -> dict:
+    """Estimate the row-complexity of a validated strategy and list vectorization hints."""
+    fn = _find_signals(tree)
+    if fn is None or not fn.args.args:
+        return {"complexity": "unknown", "per_row_loops": [], "rolling_in_loop": [],
+                "scalar_indexing": [], "hints": [], "vectorizable": False}
+    v = _CostVisitor(fn.args.args[0].arg)
+    v.visit(fn)
+
+    hints = []
+    if v.row_loops:
+        hints.append("Per-row Python loop detected: it runs once per bar in the interpreter. "
+                     "Prefer whole-column expressions such as data['Close'] > data['Close'].shift(1).")
+    if v.scalar_indexing:
+        hints.append("Scalar indexing inside a loop (data['col'][i], .iloc[i]) — replace it with "
+                     ".shift(k) on the whole column.")
+    if v.window_in_loop:
+        hints.append("rolling/ewm/expanding is recomputed on every loop iteration — compute it once "
+                     "before the loop (or drop the loop entirely).")
+    if v.unbounded:
+        hints.append("while-loops have no static bound and will hit the sandbox CPU limit on long histories.")
+
+    rewritable = vectorize_loops(tree) is not None
+    if rewritable:
+        hints.append("This loop matches a known pattern and is rewritten to a vectorized form automatically.")
+    return {
+        "complexity": _big_o(v.max_exponent),
+        "per_row_loops": v.row_loops,
+        "rolling_in_loop": sorted(set(v.window_in_loop)),
+        "scalar_indexing": sorted(set(v.scalar_indexing)),
+        "hints": hints,
+        "vectorizable": rewritable,
+    }
+
+
+# --- Column projection ----------------------------------------------------------------------
+def _str_const(node):
+    if isinstance(node, ast.Constant) and isinstance(node.value, str):
+        return node.value
+    return None
+
+
+def referenced_columns(tree: ast.Module):
+    """Return the set of column names `find_signals` reads from its data argument, or None
+    when the frame is used in a way that cannot be projected (dynamic keys, whole-frame
+    methods, iteration, passing `data` along, rebinding it)."""
+    fn = _find_signals(tree)
+    if fn is None or len(fn.args.args) != 1:
+        return None
+    arg_name = fn.args.args[0].arg
+    parents = {}
+    for node in ast.walk(fn):
+        for child in ast.iter_child_nodes(node):
+            parents[child] = node
+
+    columns = set()
+    for node in ast.walk(fn):
+        if not (isinstance(node, ast.Name) and node.id == arg_name):
+            continue
+        if not isinstance(node.ctx, ast.Load):
+            return None  # data is rebound
+        parent = parents.get(node)
+        if isinstance(parent, ast.Subscript) and parent.value is node:
+            key = parent.slice
+            if _str_const(key) is not None:
+                columns.add(key.value)
+            elif isinstance(key, (ast.List, ast.Tuple)) and key.elts and all(_str_const(e) is not None for e in key.elts):
+                columns.update(e.value for e in key.elts)
+            else:
+                return None
+        elif isinstance(parent, ast.Attribute) and parent.value is node:
+            if parent.attr == "index":
+                continue  # the index always ships with the projection
+            if hasattr(pd.DataFrame, parent.attr) or isinstance(parents.get(parent), ast.Call) \
+                    and parents[parent].func is parent:
+                return None  # whole-frame method/property (data.mean(), data.columns, ...)
+            columns.add(parent.attr)  # data.Close attribute-style column access
+        elif (isinstance(parent, ast.Call) and isinstance(parent.func, ast.Name) and parent.func.id == "len"
+              and parent.args == [node]):
+            continue  # len(data) is preserved by the projection
+        else:
+            return None
+    return columns
+
+
+# --- Loop → vectorized rewrite -------------------------------------------------------------
+class LoopRewrite:
+    """A vectorized equivalent of a row loop: `code` is a one-expression `find_signals`;
+    the first `warmup` rows (before the loop's start) must be forced to False.
+
+    `positional` is False when the loop read rows by label (`data['col'][i]`), so the rewrite
+    is only equivalent on a default 0..n-1 RangeIndex."""
+
+    def __init__(self, code: str, warmup: int, positional: bool):
+        self.code = code
+        self.warmup = warmup
+        self.positional = positional
+
+
+class _NoMatch(Exception):
+    pass
+
+
+def _const_int(node):
+    if isinstance(node, ast.Constant) and type(node.value) is int:
+        return node.value
+    raise _NoMatch
+
+
+def _is_all_false_list(node, arg_name: str) -> bool:
+    """[False] * len(data), len(data) * [False], [0] * len(data) or [False for _ in range(len(data))]."""
+    def falsy_list(n):
+        return (isinstance(n, ast.List) and len(n.elts) == 1 and isinstance(n.elts[0], ast.Constant)
+                and n.elts[0].value in (False, 0) and type(n.elts[0].value) in (bool, int))
+    if isinstance(node, ast.BinOp) and isinstance(node.op, ast.Mult):
+        return ((falsy_list(node.left) and _is_len_of(node.right, arg_name))
+                or (falsy_list(node.right) and _is_len_of(node.left, arg_name)))
+    if isinstance(node, ast.ListComp) and len(node.generators) == 1:
+        gen = node.generators[0]
+        return (isinstance(node.elt, ast.Constant) and node.elt.value in (False, 0) and not gen.ifs
+                and isinstance(gen.iter, ast.Call) and isinstance(gen.iter.func, ast.Name)
+                and gen.iter.func.id == "range" and len(gen.iter.args) == 1
+                and _is_len_of(gen.iter.args[0], arg_name))
+    return False
+
+
+class _RowExprTranslator:
+    """Translate a per-row boolean condition into a whole-column expression."""
+
+    def __init__(self, arg_name: str, loop_var: str, aliases: dict, start: int):
+        self.arg_name = arg_name
+        self.loop_var = loop_var
+        self.aliases = aliases          # local name -> column string
+        self.start = start
+        self.row_refs = 0
+        self.positional = True
+
+    def column_node(self, col: str):
+        return ast.Subscript(value=ast.Name(id=self.arg_name, ctx=ast.Load()),
+                             slice=ast.Constant(value=col), ctx=ast.Load())
+
+    def _column_of(self, node):
+        """data['col'] or an alias of it → 'col'."""
+        if isinstance(node, ast.Name) and node.id in self.aliases:
+            return self.aliases[node.id]
+        if (isinstance(node, ast.Subscript) and isinstance(node.value, ast.Name)
+                and node.value.id == self.arg_name and isinstance(node.slice, ast.Constant)
+                and isinstance(node.slice.value, str)):
+            return node.slice.value
+        raise _NoMatch
+
+    def _offset(self, index) -> int:
+        """i → 0, i - k → k (0 <= k <= start)."""
+        if isinstance(index, ast.Name) and index.id == self.loop_var:
+            return 0
+        if (isinstance(index, ast.BinOp) and isinstance(index.op, ast.Sub)
+                and isinstance(index.left, ast.Name) and index.left.id == self.loop_var):
+            k = _const_int(index.right)
+            if 0 <= k <= self.start:
+                return k
+        raise _NoMatch
+
+    def row_ref(self, node):
+        """data['col'][i-k], data['col'].iloc[i-k] or data['col'].values[i-k] → shifted column."""
+        if not isinstance(node, ast.Subscript):
+            raise _NoMatch
+        base = node.value
+        if isinstance(base, ast.Attribute) and base.attr in ("iloc", "values"):
+            col = self._column_of(base.value)
+        else:
+            col = self._column_of(base)
+            self.positional = False  # label lookup: only equal to position on a RangeIndex
+        k = self._offset(node.slice)
+        self.row_refs += 1
+        column = self.column_node(col)
+        if k == 0:
+            return column
+        return ast.Call(func=ast.Attribute(value=column, attr="shift", ctx=ast.Load()),
+                        args=[ast.Constant(value=k)], keywords=[])
+
+    def value(self, node):
+        if isinstance(node, ast.Constant) and type(node.value) in (int, float):
+            return node
+        if isinstance(node, ast.BinOp) and type(node.op) in (ast.Add, ast.Sub, ast.Mult, ast.Div):
+            return ast.BinOp(left=self.value(node.left), op=node.op, right=self.value(node.right))
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub):
+            return ast.UnaryOp(op=node.op, operand=self.value(node.operand))
+        if (isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id == "abs"
+                and len(node.args) == 1 and not node.keywords):
+            return ast.Call(func=node.func, args=[self.value(node.args[0])], keywords=[])
+        return self.row_ref(node)
+
+    def condition(self, node):
+        if isinstance(node, ast.BoolOp):
+            op = ast.BitAnd() if isinstance(node.op, ast.And) else ast.BitOr()
+            parts = [self.condition(v) for v in node.values]
+            out = parts[0]
+            for p in parts[1:]:
+                out = ast.BinOp(left=out, op=op, right=p)
+            return out
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Not):
+            return ast.UnaryOp(op=ast.Invert(), operand=self.condition(node.operand))
+        if isinstance(node, ast.Compare) and all(
+                type(op) in (ast.Lt, ast.LtE, ast.Gt, ast.GtE, ast.Eq, ast.NotEq) for op in node.ops):
+            operands = [self.value(node.left)] + [self.value(c) for c in node.comparators]
+            out = None
+            for op, left, right in zip(node.ops, operands, operands[1:]):
+                cmp = ast.Compare(left=left, ops=[op], comparators=[right])
+                out = cmp if out is None else ast.BinOp(left=out, op=ast.BitAnd(), right=cmp)
+            return out
+        raise _NoMatch
+
+
+def _is_mark(stmt, signals: str, loop_var: str, truthy: bool) -> bool:
+    """signals[i] = True (or 1); with truthy=False, signals[i] = False (or 0)."""
+    if not (isinstance(stmt, ast.Assign) and len(stmt.targets) == 1):
+        return False
+    t = stmt.targets[0]
+    ok_target = (isinstance(t, ast.Subscript) and isinstance(t.value, ast.Name) and t.value.id == signals
+                 and isinstance(t.slice, ast.Name) and t.slice.id == loop_var)
+    v = stmt.value
+    wanted = (True, 1) if truthy else (False, 0)
+    return ok_target and isinstance(v, ast.Constant) and type(v.value) in (bool, int) and v.value in wanted
+
+
+def vectorize_loops(tree: ast.Module):
+    """Return a LoopRewrite for the known "mark rows where COND holds" loop, else None."""
+    fn = _find_signals(tree)
+    if fn is None or len(tree.body) != 1 or len(fn.args.args) != 1 or fn.args.defaults:
+        return None
+    arg_name = fn.args.args[0].arg
+    try:
+        return _match_mark_loop(fn, arg_name)
+    except _NoMatch:
+        return None
+
+
+def _match_mark_loop(fn: ast.FunctionDef, arg_name: str):
+    stmts = list(fn.body)
+    if stmts and isinstance(stmts[0], ast.Expr) and isinstance(stmts[0].value, ast.Constant):
+        stmts = stmts[1:]  # docstring
+    if len(stmts) < 3:
+        raise _NoMatch
+    *prelude, loop, ret = stmts
+
+    # Prelude: column aliases (close = data['Close']) and exactly one all-False signal list.
+    aliases, signals = {}, None
+    for stmt in prelude:
+        if not (isinstance(stmt, ast.Assign) and len(stmt.targets) == 1 and isinstance(stmt.targets[0], ast.Name)):
+            raise _NoMatch
+        name = stmt.targets[0].id
+        if name == arg_name or name in aliases or name == signals:
+            raise _NoMatch
+        v = stmt.value
+        if (isinstance(v, ast.Subscript) and isinstance(v.value, ast.Name) and v.value.id == arg_name
+                and isinstance(v.slice, ast.Constant) and isinstance(v.slice.value, str)):
+            aliases[name] = v.slice.value
+        elif signals is None and _is_all_false_list(v, arg_name):
+            signals = name
+        else:
+            raise _NoMatch
+    if signals is None:
+        raise _NoMatch
+    if not (isinstance(ret, ast.Return) and isinstance(ret.value, ast.Name) and ret.value.id == signals):
+        raise _NoMatch
+
+    # for i in range([START,] len(data)):
+    if not (isinstance(loop, ast.For) and isinstance(loop.target, ast.Name) and not loop.orelse):
+        raise _NoMatch
+    loop_var = loop.target.id
+    it = loop.iter
+    if not (isinstance(it, ast.Call) and isinstance(it.func, ast.Name) and it.func.id == "range"
+            and not it.keywords and len(it.args) in (1, 2) and _is_len_of(it.args[-1], arg_name, aliases)):
+        raise _NoMatch
+    start = _const_int(it.args[0]) if len(it.args) == 2 else 0
+    if start < 0 or loop_var in aliases or loop_var in (signals, arg_name):
+        raise _NoMatch
+
+    #     if COND: signals[i] = True   [else: signals[i] = False]
+    if len(loop.body) != 1 or not isinstance(loop.body[0], ast.If):
+        raise _NoMatch
+    branch = loop.body[0]
+    if len(branch.body) != 1 or not _is_mark(branch.body[0], signals, loop_var, truthy=True):
+        raise _NoMatch
+    if branch.orelse and not (len(branch.orelse) == 1 and _is_mark(branch.orelse[0], signals, loop_var, truthy=False)):
+        raise _NoMatch
+
+    translator = _RowExprTranslator(arg_name, loop_var, aliases, start)
+    condition = translator.condition(branch.test)
+    if translator.row_refs == 0:
+        raise _NoMatch
+
+    new_fn = copy.copy(fn)
+    new_fn.body = [ast.Return(value=condition)]
+    new_fn.decorator_list = []
+    new_fn.returns = None
+    module = ast.fix_missing_locations(ast.Module(body=[new_fn], type_ignores=[]))
+    return LoopRewrite(ast.unparse(module), warmup=start, positional=translator.positional)
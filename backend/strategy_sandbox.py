@@ -15,6 +15,16 @@ code). Defence is layered:
   4. Isolation + limits: the strategy runs in a separate process with a hard wall-clock
      timeout and best-effort CPU/memory rlimits, so an infinite loop or memory bomb can
      only take down that throwaway process, never the API worker.
+  5. Fast path: a `find_signals` that is a single vectorized expression over columns
+     (comparisons, boolean algebra, arithmetic, allow-listed shift/rolling calls) is
+     evaluated in-process by a restricted AST interpreter. It has no loops and no
+     arbitrary calls, so its cost is bounded and it skips the subprocess spawn entirely.
+     Per-row loops that `strategy_analysis` can prove equivalent are rewritten into
+     such an expression first.
+  6. Batching: `safe_execute_batch` validates/compiles each script once and streams many
+     jobs through one child with a total and a per-item time budget.
+  7. Admission control: spawns are gated by `sandbox_admission` (global concurrency cap,
+     bounded fair queue, priority lanes), so concurrent users cannot exhaust memory.
 
 In-process Python is not a perfect trust boundary (CPython's own rexec/Bastion were
 removed for this reason); the subprocess isolation in (4) is what makes the DoS surface
@@ -26,15 +36,23 @@ from __future__ import annotations
 import ast
 import logging
 import multiprocessing as mp
+import math
+import operator
+import time
 from queue import Empty
 
 import pandas as pd
 
+import metrics
+from sandbox_admission import LANE_BATCH, LANE_INTERACTIVE, sandbox_admission
+from strategy_analysis import vectorize_loops
+
 logger = logging.getLogger(__name__)
 
 CPU_SECONDS = 10                       # child RLIMIT_CPU (Linux best-effort)
 MEM_BYTES = 1536 * 1024 * 1024         # child RLIMIT_AS ~1.5 GB (Linux best-effort)
 DEFAULT_TIMEOUT = 12                   # hard wall-clock timeout (seconds)
+BATCH_TIMEOUT = 60                     # wall-clock budget for a whole batch (seconds)
 
 # AST node types the strategy code is allowed to use.
 ALLOWED_NODES = {
@@ -116,6 +134,177 @@ def validate_strategy(code: str):
     return tree
 
 
+# --- Vectorized-expression fast path -----------------------------------------------------
+# Operators the expression interpreter maps straight onto pandas. Pow and shifts are left
+# out on purpose: `10 ** 10 ** 10` or `1 << 10 ** 9` would make constant folding unbounded.
+EXPR_BINOPS = {
+    ast.Add: operator.add, ast.Sub: operator.sub, ast.Mult: operator.mul,
+    ast.Div: operator.truediv, ast.FloorDiv: operator.floordiv, ast.Mod: operator.mod,
+    ast.BitAnd: operator.and_, ast.BitOr: operator.or_, ast.BitXor: operator.xor,
+}
+EXPR_UNARYOPS = {ast.USub: operator.neg, ast.UAdd: operator.pos, ast.Invert: operator.invert}
+EXPR_CMPOPS = {
+    ast.Lt: operator.lt, ast.LtE: operator.le, ast.Gt: operator.gt,
+    ast.GtE: operator.ge, ast.Eq: operator.eq, ast.NotEq: operator.ne,
+}
+# Series methods taking at most one integer period (and the keyword that may name it).
+EXPR_PERIOD_METHODS = {"shift": "periods", "diff": "periods", "pct_change": "periods"}
+EXPR_NULLARY_METHODS = {"abs"}
+EXPR_ROLLING_AGGS = {"mean", "sum", "min", "max", "std", "median"}
+EXPR_MAX_PERIOD = 10_000   # bound on shift/rolling windows
+EXPR_MAX_NODES = 200       # bound on expression size
+
+
+class ExpressionStrategy:
+    """A validated `find_signals` whose body is one bounded, loop-free vectorized expression."""
+
+    def __init__(self, arg_name: str, expr: ast.expr):
+        self.arg_name = arg_name
+        self.expr = expr
+
+    def evaluate(self, data):
+        """Evaluate in-process; returns the raw result (a Series or a scalar)."""
+        return self._eval(self.expr, data)
+
+    def _eval(self, node, data):
+        if isinstance(node, ast.Constant):
+            return node.value
+        if isinstance(node, ast.Subscript):
+            return data[_subscript_key(node)]
+        if isinstance(node, ast.BinOp):
+            return EXPR_BINOPS[type(node.op)](self._eval(node.left, data), self._eval(node.right, data))
+        if isinstance(node, ast.UnaryOp):
+            return EXPR_UNARYOPS[type(node.op)](self._eval(node.operand, data))
+        if isinstance(node, ast.Compare):
+            return EXPR_CMPOPS[type(node.ops[0])](self._eval(node.left, data), self._eval(node.comparators[0], data))
+        # Calls: abs(x), x.abs(), x.shift(n)/diff(n)/pct_change(n), x.rolling(n).agg()
+        if isinstance(node.func, ast.Name):
+            return abs(self._eval(node.args[0], data))
+        method = node.func.attr
+        target = node.func.value
+        if method in EXPR_ROLLING_AGGS:
+            window, min_periods = _rolling_params(target)
+            rolled = self._eval(target.func.value, data).rolling(window, min_periods=min_periods)
+            return getattr(rolled, method)()
+        series = self._eval(target, data)
+        if method in EXPR_NULLARY_METHODS:
+            return getattr(series, method)()
+        return getattr(series, method)(_period_arg(node))
+
+
+def _subscript_key(node: ast.Subscript):
+    key = node.slice.value if hasattr(ast, "Index") and isinstance(node.slice, ast.Index) else node.slice
+    return key.value
+
+
+def _bounded_int(node) -> bool:
+    return (isinstance(node, ast.Constant) and type(node.value) is int
+            and abs(node.value) <= EXPR_MAX_PERIOD)
+
+
+def _period_arg(call: ast.Call) -> int:
+    if call.args:
+        return call.args[0].value
+    if call.keywords:
+        return call.keywords[0].value.value
+    return 1
+
+
+def _rolling_params(call: ast.Call):
+    window = call.args[0].value if call.args else None
+    min_periods = None
+    for kw in call.keywords:
+        if kw.arg == "window":
+            window = kw.value.value
+        elif kw.arg == "min_periods":
+            min_periods = kw.value.value
+    return window, min_periods
+
+
+def _is_period_call(call: ast.Call, keyword: str, required: bool) -> bool:
+    if len(call.args) + len(call.keywords) > 1:
+        return False
+    if not call.args and not call.keywords:
+        return not required
+    if call.args:
+        return _bounded_int(call.args[0])
+    kw = call.keywords[0]
+    return kw.arg == keyword and _bounded_int(kw.value)
+
+
+def _is_rolling_call(node) -> bool:
+    if not (isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute) and node.func.attr == "rolling"):
+        return False
+    if len(node.args) > 1 or any(kw.arg not in ("window", "min_periods") for kw in node.keywords):
+        return False
+    if not all(_bounded_int(a) for a in node.args) or not all(_bounded_int(kw.value) for kw in node.keywords):
+        return False
+    window, min_periods = _rolling_params(node)
+    return (window is not None and window > 0
+            and (min_periods is None or 0 <= min_periods <= window))
+
+
+def _is_vector_expr(node, arg_name: str) -> bool:
+    if isinstance(node, ast.Constant):
+        return type(node.value) in (int, float, bool)
+    if isinstance(node, ast.Subscript):
+        try:
+            key = _subscript_key(node)
+        except AttributeError:
+            return False
+        return (isinstance(node.value, ast.Name) and node.value.id == arg_name
+                and isinstance(node.ctx, ast.Load) and isinstance(key, str))
+    if isinstance(node, ast.BinOp):
+        return (type(node.op) in EXPR_BINOPS
+                and _is_vector_expr(node.left, arg_name) and _is_vector_expr(node.right, arg_name))
+    if isinstance(node, ast.UnaryOp):
+        return type(node.op) in EXPR_UNARYOPS and _is_vector_expr(node.operand, arg_name)
+    if isinstance(node, ast.Compare):
+        return (len(node.ops) == 1 and type(node.ops[0]) in EXPR_CMPOPS
+                and _is_vector_expr(node.left, arg_name) and _is_vector_expr(node.comparators[0], arg_name))
+    if not isinstance(node, ast.Call):
+        return False
+    if isinstance(node.func, ast.Name):
+        return (node.func.id == "abs" and len(node.args) == 1 and not node.keywords
+                and _is_vector_expr(node.args[0], arg_name))
+    if not isinstance(node.func, ast.Attribute):
+        return False
+    method, target = node.func.attr, node.func.value
+    if method in EXPR_ROLLING_AGGS:
+        return (not node.args and not node.keywords and _is_rolling_call(target)
+                and _is_vector_expr(target.func.value, arg_name))
+    if method in EXPR_NULLARY_METHODS:
+        return not node.args and not node.keywords and _is_vector_expr(target, arg_name)
+    if method in EXPR_PERIOD_METHODS:
+        return (_is_period_call(node, EXPR_PERIOD_METHODS[method], required=False)
+                and _is_vector_expr(target, arg_name))
+    return False
+
+
+def vectorized_expression(tree: ast.Module):
+    """Return an ExpressionStrategy if the validated module is a pure one-expression
+    `find_signals`, else None (the strategy then takes the isolated-subprocess path)."""
+    body = tree.body
+    if len(body) != 1 or not isinstance(body[0], ast.FunctionDef) or body[0].name != "find_signals":
+        return None
+    fn = body[0]
+    args = fn.args
+    if (fn.decorator_list or len(args.args) != 1 or args.defaults or args.vararg or args.kwarg
+            or args.kwonlyargs or getattr(args, "posonlyargs", [])):
+        return None
+    stmts = fn.body
+    if stmts and isinstance(stmts[0], ast.Expr) and isinstance(stmts[0].value, ast.Constant) \
+            and isinstance(stmts[0].value.value, str):
+        stmts = stmts[1:]  # docstring
+    if len(stmts) != 1 or not isinstance(stmts[0], ast.Return) or stmts[0].value is None:
+        return None
+    expr = stmts[0].value
+    if sum(1 for _ in ast.walk(expr)) > EXPR_MAX_NODES:
+        return None
+    arg_name = args.args[0].arg
+    return ExpressionStrategy(arg_name, expr) if _is_vector_expr(expr, arg_name) else None
+
+
 def _safe_builtins():
     import builtins as _b
     safe = {name: getattr(_b, name) for name in SAFE_BUILTIN_NAMES if hasattr(_b, name)}
@@ -137,12 +326,11 @@ def _execute_validated(code: str, data):
     return func(data)
 
 
-def _worker(code: str, data, out_q):
-    """Child-process entrypoint: enforce OS limits, validate, execute, ship the result back."""
+def _apply_limits(cpu_seconds: int = CPU_SECONDS):
     try:
         import resource  # Linux/Unix only
         try:
-            resource.setrlimit(resource.RLIMIT_CPU, (CPU_SECONDS, CPU_SECONDS))
+            resource.setrlimit(resource.RLIMIT_CPU, (cpu_seconds, cpu_seconds))
         except Exception:
             pass
         try:
@@ -151,6 +339,11 @@ def _worker(code: str, data, out_q):
             pass
     except Exception:
         pass
+
+
+def _worker(code: str, data, out_q):
+    """Child-process entrypoint: enforce OS limits, validate, execute, ship the result back."""
+    _apply_limits()
     try:
         validate_strategy(code)
         out_q.put(("ok", _execute_validated(code, data)))
@@ -158,6 +351,12 @@ def _worker(code: str, data, out_q):
         out_q.put(("err", f"{type(e).__name__}: {e}"))
 
 
+def _has_positional_index(data) -> bool:
+    """True when label lookups (`data['Close'][i]`) and positions coincide."""
+    idx = data.index
+    return isinstance(idx, pd.RangeIndex) and idx.start == 0 and idx.step == 1
+
+
 def _coerce(signals, data):
     return pd.Series(signals, index=data.index).fillna(False).astype(bool)
 
@@ -181,14 +380,52 @@ def _run_inprocess(code: str, data, seconds: int):
     return _execute_validated(code, data)
 
 
-def safe_execute_strategy(code: str, data, seconds: int = DEFAULT_TIMEOUT):
+def safe_execute_strategy(code: str, data, seconds: int = DEFAULT_TIMEOUT,
+                          user_id: str | None = None, lane: int = LANE_INTERACTIVE):
     """Validate then run untrusted find_signals(data) in an isolated, time-bounded process.
 
     Returns a clean boolean Series aligned to `data`. Raises ValueError for invalid/blocked
-    code and TimeoutError if the strategy exceeds the wall-clock budget.
+    code, TimeoutError if the strategy exceeds the wall-clock budget, and SandboxBusy if no
+    sandbox slot could be granted to `user_id` in `lane`.
     """
-    validate_strategy(code)  # fast fail in the parent (also blocks escapes before any spawn)
+    tree = validate_strategy(code)  # fast fail in the parent (also blocks escapes before any spawn)
+
+    fast = _fast_path(tree, data)
+    if fast is not None:
+        return _run_fast_path(fast, data)
+
+    with sandbox_admission.slot(user_id, lane):
+        return _spawn_and_wait(code, data, seconds)
+
+
+def _fast_path(tree: ast.Module, data):
+    """(ExpressionStrategy, warmup rows) when the strategy can run in-process, else None."""
+    expression = vectorized_expression(tree)
+    if expression is not None:
+        return expression, 0
+    # Known per-row loop patterns are rewritten to an equivalent vectorized expression.
+    rewrite = vectorize_loops(tree)
+    if rewrite is not None and (rewrite.positional or _has_positional_index(data)):
+        expression = vectorized_expression(validate_strategy(rewrite.code))
+        if expression is not None:
+            metrics.incr("sandbox.loop_rewrite")
+            return expression, rewrite.warmup
+    return None
+
+
+def _run_fast_path(fast, data):
+    expression, warmup = fast
+    metrics.incr("sandbox.fast_path")
+    try:
+        signals = _coerce(expression.evaluate(data), data)
+    except Exception as e:
+        raise ValueError(f"{type(e).__name__}: {e}")
+    if warmup:
+        signals.iloc[:warmup] = False
+    return signals
 
+
+def _spawn_and_wait(code: str, data, seconds: int):
     try:
         ctx = mp.get_context()  # fork on Linux (cheap, COW), spawn on Windows
         out_q = ctx.Queue()
@@ -213,3 +450,154 @@ def safe_execute_strategy(code: str, data, seconds: int = DEFAULT_TIMEOUT):
     if status == "err":
         raise ValueError(payload)
     return _coerce(payload, data)
+
+
+# --- Batch execution -----------------------------------------------------------------------
+# Universe runs, walk-forward windows, comparisons and paper trading apply strategies to many
+# frames. A batch validates and compiles each distinct script once, runs every job that
+# cannot take the fast path inside ONE isolated child (one spawn, one admission slot), and
+# streams results back one at a time so each job still gets its own wall-clock budget.
+
+def _batch_worker(codes: list, jobs: list, out_q, cpu_seconds: int):
+    """Child-process entrypoint for a batch: compile each script once, run jobs in order."""
+    _apply_limits(cpu_seconds)
+    compiled: dict = {}
+    for pos, (code_idx, data) in jobs:
+        try:
+            func = compiled.get(code_idx)
+            if func is None:
+                code = codes[code_idx]
+                validate_strategy(code)
+                scope: dict = {}
+                exec(compile(ast.parse(code, mode="exec"), "<find_signals>", "exec"),
+                     {"__builtins__": _safe_builtins()}, scope)
+                func = scope.get("find_signals")
+                if not callable(func):
+                    raise ValueError("Your script must define a function named 'find_signals(data)'.")
+                compiled[code_idx] = func
+            # Coerce in the child so only a compact bool array crosses the process boundary.
+            out_q.put(("ok", pos, _coerce(func(data), data).to_numpy()))
+        except Exception as e:
+            out_q.put(("err", pos, f"{type(e).__name__}: {e}"))
+
+
+def _next_result(out_q, proc, deadline: float):
+    """Wait for the child's next message until `deadline`; None if it timed out or died."""
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return None
+        try:
+            return out_q.get(timeout=min(remaining, 0.25))
+        except Empty:
+            if not proc.is_alive():
+                try:
+                    return out_q.get(timeout=0.1)  # flushed just before exiting
+                except Empty:
+                    return None
+
+
+def _stop(proc):
+    if proc.is_alive():
+        proc.terminate()
+        proc.join(2)
+        if proc.is_alive():
+            proc.kill()
+    proc.join(1)
+
+
+def safe_execute_batch(jobs, total_seconds: float = BATCH_TIMEOUT, item_seconds: float = DEFAULT_TIMEOUT,
+                       user_id: str | None = None, lane: int = LANE_BATCH, return_exceptions: bool = False):
+    """Run many (code, data) jobs; returns one boolean Series per job, in order.
+
+    Each distinct script is validated once. Fast-path jobs run in-process; the rest stream
+    through a single isolated child. A job that exceeds `item_seconds` (or the remaining
+    `total_seconds`) kills the child, which is restarted for the jobs after it while budget
+    remains. With `return_exceptions=True`, failed jobs hold their ValueError/TimeoutError
+    in place of a Series; otherwise the first failure is raised.
+    """
+    deadline = time.monotonic() + total_seconds
+    codes, code_index, trees, errors = [], {}, {}, {}
+    results: list = [None] * len(jobs)
+    pending = []
+    for pos, (code, data) in enumerate(jobs):
+        idx = code_index.get(code)
+        if idx is None:
+            idx = code_index[code] = len(codes)
+            codes.append(code)
+            try:
+                trees[idx] = validate_strategy(code)
+            except ValueError as e:
+                errors[idx] = e
+        if idx in errors:
+            results[pos] = errors[idx]
+            continue
+        fast = _fast_path(trees[idx], data)
+        if fast is not None:
+            try:
+                results[pos] = _run_fast_path(fast, data)
+            except ValueError as e:
+                results[pos] = e
+        else:
+            pending.append((pos, (idx, data)))
+
+    if pending:
+        with sandbox_admission.slot(user_id, lane):
+            _run_batch_children(codes, pending, results, deadline, item_seconds)
+
+    if not return_exceptions:
+        for r in results:
+            if isinstance(r, Exception):
+                raise r
+    return results
+
+
+def safe_execute_strategy_batch(code: str, datasets, total_seconds: float = BATCH_TIMEOUT,
+                                item_seconds: float = DEFAULT_TIMEOUT, user_id: str | None = None,
+                                lane: int = LANE_BATCH, return_exceptions: bool = False):
+    """One strategy over many frames (universe runs, walk-forward windows, studies)."""
+    return safe_execute_batch([(code, d) for d in datasets], total_seconds, item_seconds,
+                              user_id=user_id, lane=lane, return_exceptions=return_exceptions)
+
+
+def _run_batch_children(codes: list, pending: list, results: list, deadline: float, item_seconds: float):
+    frames = {pos: data for pos, (_, data) in pending}
+    while pending:
+        if time.monotonic() >= deadline:
+            for pos, _ in pending:
+                results[pos] = TimeoutError("Batch time budget exhausted before this item ran.")
+            return
+        cpu = max(1, int(math.ceil(deadline - time.monotonic())) + 1)
+        try:
+            ctx = mp.get_context()
+            out_q = ctx.Queue()
+            proc = ctx.Process(target=_batch_worker, args=(codes, pending, out_q, cpu), daemon=True)
+            proc.start()
+        except Exception as e:
+            logger.warning(f"Sandbox subprocess unavailable ({e}); running batch in-process with best-effort guard.")
+            for pos, (code_idx, data) in pending:
+                try:
+                    results[pos] = _coerce(_run_inprocess(codes[code_idx], data, int(item_seconds)), data)
+                except Exception as err:
+                    results[pos] = err if isinstance(err, (ValueError, TimeoutError)) \
+                        else ValueError(f"{type(err).__name__}: {err}")
+            return
+        metrics.incr("sandbox.batch_spawns")
+
+        done = 0
+        try:
+            for pos, _ in pending:
+                msg = _next_result(out_q, proc, min(deadline, time.monotonic() + item_seconds))
+                if msg is None:
+                    results[pos] = TimeoutError(f"Strategy execution exceeded {item_seconds}s and was terminated.")
+                    done += 1
+                    break
+                status, got_pos, payload = msg
+                if status == "err":
+                    results[got_pos] = ValueError(payload)
+                else:
+                    results[got_pos] = pd.Series(payload, index=frames[got_pos].index)
+                done += 1
+        finally:
+            _stop(proc)
+        pending = pending[done:]
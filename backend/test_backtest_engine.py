@@ -0,0 +1,119 @@
+"""
+Continuation tests for backtest_engine. Run from the backend/ directory:
+
+    python test_backtest_engine.py
+
+A backtest split at any bar and resumed from the saved engine state must produce exactly
+the trades, curve points and summary of one uninterrupted run. A saved result that only
+carries LTTB-downsampled curves and part of its trades must keep its point budget and every
+trade return for Monte Carlo. Walk-forward windows must tile the history without
+overlapping out-of-sample segments. Exits non-zero on mismatch.
+"""
+
+import json
+import sys
+
+import numpy as np
+import pandas as pd
+
+import backtest_engine
+from downsampling import downsample_points
+
+try:
+    sys.stdout.reconfigure(encoding="utf-8")
+except Exception:
+    pass
+
+PARAMS = dict(sl_percent=1.5, target_percent=3.0, risk_percent=2.0)
+CAPITAL = 100_000
+
+
+def make_data(seed: int, rows: int = 400) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(rng.normal(0, 0.01, rows).cumsum())
+    return pd.DataFrame({
+        "Datetime": pd.date_range("2024-01-01 09:15", periods=rows, freq="15min", tz="Asia/Kolkata"),
+        "Close": close,
+    })
+
+
+def full_run(data, signals):
+    state = backtest_engine.new_state(CAPITAL)
+    trades, equity, drawdown = backtest_engine.simulate(data, "Datetime", signals, state=state, **PARAMS)
+    backtest_engine.record_pnls(state, trades)
+    formatted, scatter, monthly = backtest_engine.format_trades(trades)
+    result = {
+        **backtest_engine.summarize(state, CAPITAL),
+        "trades": formatted, "equity_curve": equity, "drawdown_curve": drawdown, "scatter_data": scatter,
+        "bar_data": [{"month": k, "pnl": round(v, 2)} for k, v in monthly.items()],
+        "pie_data": backtest_engine.pie_data(state), "engine_state": state,
+    }
+    return result
+
+
+def continued_run(data, signals, split, max_points=0):
+    result = full_run(data.iloc[:split], signals.iloc[:split])
+    if max_points:
+        # What a user saves is the response view, whose curves and trades may be cut down.
+        result["equity_curve"] = downsample_points(result["equity_curve"], "equity", max_points)
+        result["drawdown_curve"] = downsample_points(result["drawdown_curve"], "drawdown", max_points)
+        result["trades"] = result["trades"][:1]
+    # The stored result goes through JSON (Firestore / HTTP) before it is continued.
+    result = json.loads(json.dumps(result))
+    state = result["engine_state"]
+    is_new = (data["Datetime"] > pd.Timestamp(state["last_timestamp"])).to_numpy()
+    trades, equity, drawdown = backtest_engine.simulate(
+        data, "Datetime", signals, state=state, start=int(is_new.argmax()), **PARAMS)
+    return backtest_engine.extend_result(result, state, CAPITAL, trades, equity, drawdown, max_points=max_points)
+
+
+def main():
+    failures = []
+    for seed in range(5):
+        data = make_data(seed)
+        signals = pd.Series(np.random.default_rng(seed + 100).random(len(data)) < 0.08)
+        expected = json.loads(json.dumps(full_run(data, signals)))
+        for split in (50, 137, 250, 399):
+            got = json.loads(json.dumps(continued_run(data, signals, split)))
+            for key in expected:
+                if key == "bar_data":
+                    same = all(abs(a["pnl"] - b["pnl"]) < 0.02 and a["month"] == b["month"]
+                               for a, b in zip(got[key], expected[key]))
+                elif key == "engine_state":
+                    same = all(np.isclose(got[key][k], v) if isinstance(v, float) else got[key][k] == v
+                               for k, v in expected[key].items())
+                else:
+                    same = got[key] == expected[key]
+                if not same:
+                    failures.append(f"seed {seed} split {split}: {key} differs")
+        print(f"  continue ✓  seed {seed}: {expected['num_trades']} trades, identical across 4 split points")
+
+        got = continued_run(data, signals, 300, max_points=3)
+        curves_kept = all(len(got[k]) <= 3 and got[k][-1] == expected[k][-1] for k in ("equity_curve", "drawdown_curve"))
+        if not curves_kept or got["engine_state"]["pnls"] != expected["engine_state"]["pnls"]:
+            failures.append(f"seed {seed}: downsampled saved result not continued within its point budget")
+
+    for bars, folds, fraction in ((400, 5, 0.7), (1000, 8, 0.5), (257, 3, 0.6)):
+        windows = backtest_engine.walk_forward_windows(bars, folds, fraction)
+        oos = [w[1] for w in windows]
+        tiled = all(a[1] == b[0] for a, b in zip(oos, oos[1:])) and oos[-1][1] == bars
+        anchored = all(w[0][1] == w[1][0] for w in windows) and windows[0][0][0] >= 0
+        if len(windows) != folds or not tiled or not anchored:
+            failures.append(f"walk-forward windows wrong for {bars} bars / {folds} folds: {windows}")
+        else:
+            print(f"  windows  ✓  {bars} bars, {folds} folds -> OOS {oos[0][1] - oos[0][0]} bars each, tiled to the end")
+    report = backtest_engine.walk_forward(make_data(0), "Datetime", signals, folds=4, capital=CAPITAL, **PARAMS)
+    if len(report["windows"]) != 4 or "walk_forward_efficiency" not in report["stability"]:
+        failures.append("walk_forward report incomplete")
+
+    print()
+    if failures:
+        print(f"FAILED ({len(failures)}):")
+        for f in failures:
+            print("  -", f)
+        raise SystemExit(1)
+    print("Resumed backtests match uninterrupted runs. ✅")
+
+
+if __name__ == "__main__":
+    main()
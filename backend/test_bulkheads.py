@@ -0,0 +1,152 @@
+"""
+Bulkhead tests. Run from the backend/ directory:
+
+    python test_bulkheads.py
+
+A "yfinance brownout" (calls that hang far past their deadline) must saturate only the
+yfinance bulkhead: further yfinance calls are rejected at once with 503 + Retry-After, while
+Firestore-style calls on their own bulkhead keep completing at normal latency. Timed-out
+calls must keep their slot until the upstream really returns, cancelled queued calls must
+give theirs back, and the gauges must track occupancy. The sandbox pool must still run an
+in-process fast-path strategy while every admission slot and queue place holds a thread.
+Exits non-zero on failure.
+"""
+
+import asyncio
+import sys
+import threading
+import time
+
+import bulkheads
+import metrics
+import sandbox_admission
+from bulkheads import Bulkhead, BulkheadFull, DependencyTimeout
+from caching import LoadingCache
+
+try:
+    sys.stdout.reconfigure(encoding="utf-8")
+except Exception:
+    pass
+
+
+def main():
+    failures = []
+
+    def check(name, cond):
+        print(f"  {'✓' if cond else '✗'} {name}")
+        if not cond:
+            failures.append(name)
+
+    market = Bulkhead("test_market", "Market data", threads=2, queue=2, timeout=0.05)
+    store = Bulkhead("test_store", "The database", threads=4, queue=8, timeout=1.0)
+    release = threading.Event()
+
+    def hung_download():
+        release.wait(5)
+        return "bars"
+
+    def quick_read():
+        time.sleep(0.01)
+        return "feed"
+
+    async def brownout():
+        print("Brownout isolation:")
+        # Two running + two queued: the market bulkhead is full.
+        hung = [asyncio.ensure_future(market.run(hung_download, timeout=10)) for _ in range(4)]
+        await asyncio.sleep(0.05)
+        gauges = metrics.snapshot()["gauges"]
+        check("gauges show 2 in flight, 2 queued",
+              gauges.get("bulkhead.test_market.in_flight") == 2 and gauges.get("bulkhead.test_market.queued") == 2)
+
+        start = time.perf_counter()
+        try:
+            await market.run(hung_download)
+            rejection = None
+        except BulkheadFull as e:
+            rejection = e
+        rejected_in = time.perf_counter() - start
+        check(f"5th market call rejected immediately ({rejected_in * 1000:.1f} ms)",
+              rejection is not None and rejected_in < 0.02)
+        check("rejection is a 503 with Retry-After",
+              rejection is not None and rejection.status_code == 503
+              and int(rejection.headers["Retry-After"]) >= 1)
+
+        start = time.perf_counter()
+        feeds = await asyncio.gather(*(store.run(quick_read) for _ in range(12)))
+        elapsed = time.perf_counter() - start
+        check(f"12 store calls unaffected by the brownout ({elapsed:.2f}s)", feeds == ["feed"] * 12 and elapsed < 0.5)
+
+        print("Deadlines:")
+        release.set()
+        await asyncio.gather(*hung)
+        release.clear()
+        try:
+            await market.run(hung_download)
+            status = None
+        except DependencyTimeout as e:
+            status = e.status_code
+        check("call past its deadline -> 504", status == 504)
+        check("timed-out call still holds its slot", market.stats()["in_flight"] == 1)
+        release.set()
+        await asyncio.sleep(0.05)
+        check("slot returned once the upstream returns", market.stats()["in_flight"] == 0)
+
+    asyncio.run(brownout())
+
+    print("Sync callers and cancellation:")
+    single = Bulkhead("test_single", "Zerodha", threads=1, queue=1, timeout=0.05)
+    gate = threading.Event()
+    blocker = single.submit(gate.wait, 5)
+    try:
+        single.call(quick_read)   # queued behind the blocker, times out, is cancelled
+        status = None
+    except DependencyTimeout as e:
+        status = e.status_code
+    check("sync call past its deadline -> 504", status == 504)
+    check("cancelled queued call gave its slot back", single.stats()["queued"] == 0)
+    gate.set()
+    blocker.result()
+    check("sync call returns the result", single.call(quick_read, timeout=1) == "feed")
+    check("rejections counted", metrics.snapshot()["counters"].get("bulkhead.test_market.rejected") == 1)
+
+    print("Loading cache on a bulkhead:")
+    cache = LoadingCache("test_bulkhead_cache", ttl=60)
+    tiny = Bulkhead("test_tiny", "The AI service", threads=1, queue=0)
+    gate.clear()
+    held = tiny.submit(gate.wait, 5)
+    try:
+        cache.get("quiz", lambda: "q", executor=tiny)
+        refused = None
+    except BulkheadFull as e:
+        refused = e
+    check("load refused by a full bulkhead raises 503", refused is not None and refused.status_code == 503)
+    gate.set()
+    held.result()
+    time.sleep(0.01)   # the slot is released by the future's done-callback
+    check("refusal not cached; next load runs on the bulkhead",
+          cache.get("quiz", lambda: threading.current_thread().name, executor=tiny).startswith("bulkhead-test_tiny"))
+
+    print("Sandbox pool:")
+    gate.clear()
+    capacity = sandbox_admission.MAX_CONCURRENT + sandbox_admission.MAX_QUEUE
+    waiting = [bulkheads.SANDBOX.submit(gate.wait, 5) for _ in range(capacity)]
+    try:
+        fast = bulkheads.SANDBOX.call(lambda: "signals", timeout=1)
+    except BulkheadFull:
+        fast = None
+    check("fast-path run gets a thread while admission's capacity is in use", fast == "signals")
+    gate.set()
+    for w in waiting:
+        w.result()
+
+    print()
+    if failures:
+        print(f"FAILED ({len(failures)}):")
+        for f in failures:
+            print("  -", f)
+        raise SystemExit(1)
+    print("A saturated dependency is rejected fast and never starves the others. ✅")
+
+
+if __name__ == "__main__":
+    main()
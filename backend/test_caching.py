@@ -0,0 +1,132 @@
+"""
+Content-addressed cache tests. Run from the backend/ directory:
+
+    python test_caching.py
+
+Values put into a `TieredCache` must come back equal from memory, from disk once memory is
+gone, and from a fresh instance over the same directory (a restarted worker). The disk
+tier must keep its running byte total in step with the files it holds, evict the least
+recently read entries once over budget, and refuse a cache directory another user could
+have planted. Packed signal vectors must unpack to the same booleans on the same index.
+Exits non-zero on failure.
+"""
+
+import os
+import stat
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from caching import DiskLRU, TieredCache, ensure_private_dir, pack_signals, unpack_signals
+
+try:
+    sys.stdout.reconfigure(encoding="utf-8")
+except Exception:
+    pass
+
+
+def disk_usage(directory: str) -> int:
+    return sum(e.stat().st_size for e in os.scandir(directory) if e.name.endswith(".pkl"))
+
+
+def wait_for(cond, seconds: float = 2.0) -> bool:
+    deadline = time.monotonic() + seconds
+    while not cond() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return cond()
+
+
+def main():
+    failures = []
+
+    def check(name, cond):
+        print(f"  {'✓' if cond else '✗'} {name}")
+        if not cond:
+            failures.append(name)
+
+    root = tempfile.mkdtemp(prefix="patterniq-test-")
+
+    print("Tiered round trip:")
+    directory = os.path.join(root, "tiered")
+    payload = {"trades": [{"pnl_percent": 1.5, "entry_date": "2024-01-02 09:15"}], "equity_curve": list(range(500)),
+               "frame": pd.DataFrame({"Close": np.linspace(100, 110, 50)})}
+    cache = TieredCache("test_tiered", memory_bytes=1024 * 1024, disk_bytes=4 * 1024 * 1024, directory=directory)
+    cache.put("k1", payload)
+
+    def same(value):
+        return (value is not None and value["trades"] == payload["trades"]
+                and value["equity_curve"] == payload["equity_curve"] and value["frame"].equals(payload["frame"]))
+
+    check("memory hit returns the value", same(cache.get("k1")))
+    cache.memory.clear()
+    check("disk hit returns an equal value", same(cache.get("k1")))
+    check("disk hit is promoted to memory", cache.memory.get("k1") is not None)
+    restarted = TieredCache("test_tiered", memory_bytes=1024 * 1024, disk_bytes=4 * 1024 * 1024, directory=directory)
+    check("a new instance over the same directory reads it back", same(restarted.get("k1")))
+    cache.pop("k1")
+    check("pop removes both tiers", cache.get("k1") is None and restarted.disk.get("k1") is None)
+    check("missing key returns the default", cache.get("nope", "default") == "default")
+
+    print("Disk budget:")
+    blob = os.urandom(10_000)
+    disk = DiskLRU(os.path.join(root, "budget"), max_bytes=60_000, name="test_budget")
+    for i in range(5):
+        disk.put(f"e{i}", blob)
+        os.utime(disk._path(f"e{i}"), (1_000 + i, 1_000 + i))   # e0 is the least recently read
+    check("running total matches the files on disk", disk._bytes == disk_usage(disk.directory))
+    disk.put("e4", blob)   # replacing an entry does not double count it
+    check("replacing an entry keeps the total", disk._bytes == disk_usage(disk.directory))
+    disk.put("e5", blob)
+    check("eviction pass brings the directory under budget",
+          wait_for(lambda: not disk._evicting and disk_usage(disk.directory) <= 60_000 * 0.9))
+    disk.put("e6", blob)
+    check("least recently read entries went first", disk.get("e0") is None and disk.get("e6") == blob)
+    check("total resynced after eviction", disk._bytes == disk_usage(disk.directory))
+    reopened = DiskLRU(disk.directory, max_bytes=60_000, name="test_budget")
+    check("a new instance starts from the directory's size", reopened._bytes == disk_usage(disk.directory))
+
+    print("Private directory:")
+    fresh = ensure_private_dir(os.path.join(root, "private"))
+    check("created with mode 0700", stat.S_IMODE(os.stat(fresh).st_mode) == 0o700)
+    loose = os.path.join(root, "loose")
+    os.mkdir(loose)
+    os.chmod(loose, 0o777)
+    ensure_private_dir(loose)
+    check("group/other write removed from an existing directory", not os.stat(loose).st_mode & 0o022)
+    target = tempfile.mkdtemp(prefix="patterniq-elsewhere-")
+    link = os.path.join(root, "link")
+    os.symlink(target, link)
+    try:
+        ensure_private_dir(link)
+        refused = False
+    except PermissionError:
+        refused = True
+    check("symlinked directory refused", refused)
+    check("disk cache over a refused directory is disabled", not DiskLRU(link, max_bytes=1024).enabled)
+
+    print("Packed signals:")
+    index = pd.date_range("2024-01-01 09:15", periods=1003, freq="5min")
+    rng = np.random.default_rng(7)
+    for n in (0, 1, 7, 8, 9, 1003):
+        signals = pd.Series(rng.random(n) < 0.3, index=index[:n])
+        packed = pack_signals(signals)
+        restored = unpack_signals(packed, signals.index)
+        check(f"{n} bars round-trip", restored.equals(signals) and restored.dtype == bool
+              and len(packed["bits"]) == (n + 7) // 8)
+    all_true = pd.Series(True, index=index[:16])
+    check("all-true vector survives", unpack_signals(pack_signals(all_true), all_true.index).all())
+
+    print()
+    if failures:
+        print(f"FAILED ({len(failures)}):")
+        for f in failures:
+            print("  -", f)
+        raise SystemExit(1)
+    print("Cached values come back unchanged and the disk tier stays in budget. ✅")
+
+
+if __name__ == "__main__":
+    main()
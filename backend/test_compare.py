@@ -0,0 +1,145 @@
+"""
+Strategy comparison tests. Run from the backend/ directory:
+
+    python test_compare.py
+
+Several strategies over one frame must come back on one shared date axis, each curve equal
+to its own standalone run at its exit dates and forward-filled in between. A second run
+must take the scripts it has seen from the signal cache and send only the new one to the
+sandbox. A script that fails validation or at run time keeps its row, with the error and
+an empty curve, while the others still run. Exits non-zero on failure.
+"""
+
+import os
+import sys
+import tempfile
+
+os.environ["PATTERNIQ_CACHE_DIR"] = tempfile.mkdtemp(prefix="patterniq-test-")
+os.environ["SHARED_CACHE_PATH"] = os.path.join(os.environ["PATTERNIQ_CACHE_DIR"], "shared.sqlite3")
+
+import numpy as np
+import pandas as pd
+
+import backtest_engine
+import comparison
+from caching import TieredCache, fingerprint_frame
+from strategy_sandbox import safe_execute_batch, validate_strategy
+
+try:
+    sys.stdout.reconfigure(encoding="utf-8")
+except Exception:
+    pass
+
+CAPITAL = 100_000
+PARAMS = dict(sl_percent=1.5, target_percent=3.0, risk_percent=2.0)
+VOLUME_SPIKE = "def find_signals(data):\n    return data['Volume'] > 1400"
+DIP = "def find_signals(data):\n    return data['Close'] < data['Close'].shift(1) * 0.99"
+BREAKOUT = "def find_signals(data):\n    return data['Close'] > data['Close'].shift(1) * 1.01"
+MISSING_COLUMN = "def find_signals(data):\n    return data['Nope'] > 1"
+IMPORTS_OS = "import os\ndef find_signals(data):\n    return data['Close'] > 0"
+
+
+def make_data(rows: int = 600) -> pd.DataFrame:
+    rng = np.random.default_rng(3)
+    close = 100 * np.exp(rng.normal(0, 0.01, rows).cumsum())
+    return pd.DataFrame({
+        "Datetime": pd.date_range("2024-01-01 09:15", periods=rows, freq="15min", tz="Asia/Kolkata"),
+        "Open": close, "High": close, "Low": close, "Close": close,
+        "Volume": rng.integers(500, 1500, rows).astype(float),
+    })
+
+
+def entry(label: str, code: str) -> dict:
+    e = {"label": label, "code": code, "error": None}
+    try:
+        e["tree"] = validate_strategy(code)
+    except ValueError as err:
+        e["error"] = f"Strategy Script Error: {err}"
+    return e
+
+
+def compare(cache, data, codes: dict, sandbox_calls: list) -> dict:
+    """The endpoint's flow after code resolution, with the batch run in-process."""
+    entries = [entry(label, code) for label, code in codes.items()]
+    pending, jobs = comparison.cached_signals(entries, cache, data, "Datetime", "15m", fingerprint_frame(data))
+    if jobs:
+        sandbox_calls.append([e["label"] for e in pending])
+        comparison.record_signals(pending, safe_execute_batch(jobs, return_exceptions=True), cache)
+    return comparison.compare_report(entries, data, "Datetime", CAPITAL, **PARAMS)
+
+
+def standalone(data, code) -> list:
+    signals = safe_execute_batch([(code, data)])[0]
+    state = backtest_engine.new_state(CAPITAL)
+    _, equity_points, _ = backtest_engine.simulate(data, "Datetime", signals, state=state, **PARAMS)
+    return equity_points
+
+
+def main():
+    failures = []
+
+    def check(name, cond):
+        print(f"  {'✓' if cond else '✗'} {name}")
+        if not cond:
+            failures.append(name)
+
+    data = make_data()
+    cache = TieredCache("test_compare", memory_bytes=1024 * 1024, disk_bytes=4 * 1024 * 1024,
+                        directory=os.path.join(os.environ["PATTERNIQ_CACHE_DIR"], "signals"))
+    calls = []
+
+    print("Shared axis:")
+    report = compare(cache, data, {"spike": VOLUME_SPIKE, "dip": DIP}, calls)
+    dates = report["dates"]
+    rows = {r["label"]: r for r in report["strategies"]}
+    check("dates are sorted and unique", dates == sorted(set(dates)))
+    check("every curve spans the whole axis", all(len(r["equity"]) == len(dates) for r in rows.values()))
+    check("every curve starts at the initial capital", all(r["equity"][0] == CAPITAL for r in rows.values()))
+    for label, code in (("spike", VOLUME_SPIKE), ("dip", DIP)):
+        points = standalone(data, code)
+        at_exits = all(rows[label]["equity"][dates.index(p["date"])] == round(p["equity"], 2) for p in points)
+        check(f"{label} matches its standalone run at its exits", bool(points) and at_exits
+              and rows[label]["num_trades"] == len(points))
+    spike_dates = {p["date"] for p in standalone(data, VOLUME_SPIKE)}
+    gaps = [i for i, d in enumerate(dates) if i and d not in spike_dates]
+    check("between its exits a curve is forward-filled",
+          bool(gaps) and all(rows["spike"]["equity"][i] == rows["spike"]["equity"][i - 1] for i in gaps))
+
+    print("Signal cache:")
+    check("first run sends both scripts in one batch", calls == [["spike", "dip"]])
+    calls.clear()
+    again = compare(cache, data, {"spike": VOLUME_SPIKE, "dip": DIP, "breakout": BREAKOUT}, calls)
+    check("second run only batches the new script", calls == [["breakout"]])
+    def metrics_of(row):
+        return {k: v for k, v in row.items() if k != "equity"}   # the axis grows with the new script
+
+    check("cached strategies report the same metrics",
+          [metrics_of(r) for r in again["strategies"][:2]] == [metrics_of(rows["spike"]), metrics_of(rows["dip"])])
+    calls.clear()
+    compare(cache, data, {"spike": VOLUME_SPIKE, "breakout": BREAKOUT}, calls)
+    check("a run of only cached scripts skips the sandbox", calls == [])
+
+    print("Errors:")
+    calls.clear()
+    mixed = compare(cache, data, {"spike": VOLUME_SPIKE, "missing": MISSING_COLUMN, "os": IMPORTS_OS}, calls)
+    rows = {r["label"]: r for r in mixed["strategies"]}
+    check("rows keep the request order", [r["label"] for r in mixed["strategies"]] == ["spike", "missing", "os"])
+    check("invalid script never reaches the sandbox", calls == [["missing"]])
+    check("invalid script reports its validation error", (rows["os"]["error"] or "").startswith("Strategy Script Error")
+          and rows["os"]["equity"] == [])
+    check("run-time failure reports its error", "Nope" in (rows["missing"]["error"] or "")
+          and rows["missing"]["equity"] == [])
+    check("the other strategy still runs", rows["spike"]["error"] is None
+          and len(rows["spike"]["equity"]) == len(mixed["dates"]))
+
+    print()
+    if failures:
+        print(f"FAILED ({len(failures)}):")
+        for f in failures:
+            print("  -", f)
+        raise SystemExit(1)
+    print("Compared strategies share one axis, reuse cached signals and keep failed rows. ✅")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Response compression tests. Run from the backend/ directory:
+
+    python test_compression.py
+
+Large JSON bodies must be compressed with the best encoding the client accepts and decode
+back byte for byte; small, binary-typed or already-encoded bodies and clients that refuse
+compression must get the body unchanged. Exits non-zero on failure.
+"""
+
+import gzip
+import sys
+
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse, Response
+from fastapi.testclient import TestClient
+
+import compression
+from compression import CompressionMiddleware, choose_encoding
+from response_formats import FastJSONResponse
+
+try:
+    sys.stdout.reconfigure(encoding="utf-8")
+except Exception:
+    pass
+
+BIG = [{"date": f"2024-01-01 09:{m % 60:02d}", "equity": 100000 + m} for m in range(2000)]
+
+
+def make_app() -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(CompressionMiddleware, minimum_size=1024)
+
+    @app.get("/big")
+    def big():
+        return FastJSONResponse(BIG)
+
+    @app.get("/small")
+    def small():
+        return {"ok": True}
+
+    @app.get("/png")
+    def png():
+        return Response(b"\x89PNG" + b"\x00" * 5000, media_type="image/png")
+
+    @app.get("/encoded")
+    def encoded():
+        return PlainTextResponse("x" * 5000, headers={"Content-Encoding": "identity"})
+
+    return app
+
+
+def main():
+    failures = []
+
+    def check(name, cond):
+        print(f"  {'✓' if cond else '✗'} {name}")
+        if not cond:
+            failures.append(name)
+
+    print("Negotiation:")
+    check("gzip accepted", choose_encoding("gzip, deflate") == "gzip")
+    check("q=0 refuses an encoding", choose_encoding("gzip;q=0") is None)
+    check("nothing accepted", choose_encoding("") is None)
+    expected_br = "br" if compression.brotli is not None else "gzip"
+    check(f"br preferred when available ({expected_br})", choose_encoding("gzip, br") == expected_br)
+
+    print("Middleware:")
+    client = TestClient(make_app())
+    raw = client.get("/big", headers={"Accept-Encoding": "identity"})
+    response = client.get("/big", headers={"Accept-Encoding": "gzip"})
+    wire = int(response.headers["content-length"])
+    check("large JSON is gzip-compressed", response.headers.get("content-encoding") == "gzip")
+    check("body decodes to the original", response.json() == BIG)
+    check(f"wire size {wire} B vs {len(raw.content)} B raw (< 25%)", wire < 0.25 * len(raw.content))
+    check("Vary: Accept-Encoding set", "accept-encoding" in response.headers.get("vary", "").lower())
+    check("identity client gets the raw body", "content-encoding" not in raw.headers and raw.json() == BIG)
+    small = client.get("/small", headers={"Accept-Encoding": "gzip"})
+    check("small body left uncompressed", "content-encoding" not in small.headers and small.json() == {"ok": True})
+    png = client.get("/png", headers={"Accept-Encoding": "gzip"})
+    check("binary media type left alone", "content-encoding" not in png.headers and len(png.content) == 5004)
+    encoded = client.get("/encoded", headers={"Accept-Encoding": "gzip"})
+    check("already-encoded body left alone", encoded.headers.get("content-encoding") == "identity")
+    check("gzip helper round-trips", gzip.decompress(compression.compress(b"abc" * 1000, "gzip")) == b"abc" * 1000)
+
+    print()
+    if failures:
+        print(f"FAILED ({len(failures)}):")
+        for f in failures:
+            print("  -", f)
+        raise SystemExit(1)
+    print("Large responses are compressed as negotiated. ✅")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+LTTB downsampling tests. Run from the backend/ directory:
+
+    python test_downsampling.py
+
+The kept points must fit the budget, include both endpoints, stay in order and keep the
+extremes a chart reader cares about (the deepest drawdown, the best trade). Exits non-zero
+on failure.
+"""
+
+import sys
+import time
+
+import numpy as np
+
+from downsampling import downsample_points, lttb
+
+try:
+    sys.stdout.reconfigure(encoding="utf-8")
+except Exception:
+    pass
+
+
+def main():
+    failures = []
+
+    def check(name, cond):
+        print(f"  {'✓' if cond else '✗'} {name}")
+        if not cond:
+            failures.append(name)
+
+    rng = np.random.default_rng(7)
+    n = 50_000
+    equity = 100_000 * np.exp(rng.normal(0, 0.002, n).cumsum())
+    keep = lttb(np.arange(n), equity, 1000)
+    check("budget respected exactly", keep.size == 1000)
+    check("first and last point kept", keep[0] == 0 and keep[-1] == n - 1)
+    check("indices strictly increasing", bool((np.diff(keep) > 0).all()))
+    kept_range = equity[keep].max() - equity[keep].min()
+    check("kept points span >= 99% of the value range", kept_range >= 0.99 * (equity.max() - equity.min()))
+
+    spike = np.zeros(n)
+    spike[31_337] = -25.0
+    check("single drawdown spike survives", 31_337 in lttb(np.arange(n), spike, 200))
+
+    small = [{"date": str(i), "equity": float(i)} for i in range(10)]
+    check("within budget returned unchanged", downsample_points(small, "equity", 50) is small)
+    check("zero budget means full resolution", downsample_points(small, "equity", 0) is small)
+    check("degenerate budget keeps everything", lttb(np.arange(10), np.arange(10), 2).size == 10)
+
+    points = [{"date": f"d{i}", "drawdown": float(v)} for i, v in enumerate(-spike)]
+    thinned = downsample_points(points, "drawdown", 500)
+    check("dict rows pass through untouched", len(thinned) == 500 and thinned[0] is points[0]
+          and any(p["drawdown"] == 25.0 for p in thinned))
+
+    lttb(np.arange(n), equity, 1000)  # warm-up
+    start = time.perf_counter()
+    lttb(np.arange(n), equity, 1000)
+    elapsed = (time.perf_counter() - start) * 1000
+    check(f"50k -> 1k points in {elapsed:.1f} ms (< 50 ms)", elapsed < 50)
+
+    print()
+    if failures:
+        print(f"FAILED ({len(failures)}):")
+        for f in failures:
+            print("  -", f)
+        raise SystemExit(1)
+    print("Downsampled series keep their shape within the point budget. ✅")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""
+Firestore bridge tests. Run from the backend/ directory:
+
+    python test_firestore_repo.py
+
+Fake document references and queries that block like the sync client stand in for
+Firestore. Twenty concurrent slow reads must overlap instead of serializing, the event
+loop must keep running while they are in flight, a call past its deadline must become a 504
+and every call must record a latency timer. Exits non-zero on failure.
+"""
+
+import asyncio
+import sys
+import time
+
+from fastapi import HTTPException
+
+import firestore_repo
+import metrics
+
+try:
+    sys.stdout.reconfigure(encoding="utf-8")
+except Exception:
+    pass
+
+DELAY = 0.1
+
+
+class FakeDoc:
+    def __init__(self, doc_id, data):
+        self.id, self._data = doc_id, data
+        self.exists = data is not None
+
+    def to_dict(self):
+        return dict(self._data)
+
+
+class FakeRef:
+    """A document reference / collection / query whose calls sleep like a round trip."""
+
+    def __init__(self, docs=None, delay=DELAY):
+        self.docs, self.delay, self.writes = docs or {}, delay, []
+
+    def get(self, timeout=None):
+        time.sleep(self.delay)
+        return FakeDoc("d1", self.docs.get("d1"))
+
+    def stream(self, timeout=None):
+        for doc_id, data in self.docs.items():
+            time.sleep(self.delay / len(self.docs))
+            yield FakeDoc(doc_id, data)
+
+    def add(self, data, timeout=None):
+        time.sleep(self.delay)
+        self.writes.append(("add", data))
+        return None, FakeDoc("new-id", data)
+
+    def set(self, data, merge=False, timeout=None):
+        self.writes.append(("set", data, merge))
+
+    def update(self, data, timeout=None):
+        self.writes.append(("update", data))
+
+    def delete(self, timeout=None):
+        self.writes.append(("delete",))
+
+
+def main():
+    failures = []
+
+    def check(name, cond):
+        print(f"  {'✓' if cond else '✗'} {name}")
+        if not cond:
+            failures.append(name)
+
+    async def scenario():
+        print("Concurrency:")
+        ref = FakeRef({"d1": {"score": 10}})
+        ticks = 0
+
+        async def heartbeat():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        beat = asyncio.create_task(heartbeat())
+        start = time.perf_counter()
+        results = await asyncio.gather(*(firestore_repo.get("test.get", ref) for _ in range(20)))
+        elapsed = time.perf_counter() - start
+        beat.cancel()
+        check(f"20 reads of {DELAY}s overlap ({elapsed:.2f}s)", elapsed < 20 * DELAY / 4)
+        check("all reads returned the document", results == [{"score": 10}] * 20)
+        check(f"event loop kept running during the reads ({ticks} ticks)", ticks >= elapsed / 0.01 / 2)
+
+        print("Helpers:")
+        check("missing document -> None", await firestore_repo.get("test.get", FakeRef({})) is None)
+        listing = await firestore_repo.documents("test.list", FakeRef({"a": {"x": 1}, "b": {"x": 2}}))
+        check("query drained to id + fields", listing == [{"id": "a", "x": 1}, {"id": "b", "x": 2}])
+        writes = FakeRef()
+        new_id = await firestore_repo.add("test.add", writes, {"x": 1})
+        await firestore_repo.set("test.set", writes, {"x": 2}, merge=True)
+        await firestore_repo.update("test.update", writes, {"x": 3})
+        await firestore_repo.delete("test.delete", writes)
+        check("add returns the generated id", new_id == "new-id")
+        check("writes reach the client in order",
+              [w[0] for w in writes.writes] == ["add", "set", "update", "delete"] and writes.writes[1][2] is True)
+
+        print("Deadlines and errors:")
+        try:
+            await firestore_repo.run("test.slow", time.sleep, 0.5, timeout=0.05)
+            status = None
+        except HTTPException as e:
+            status = e.status_code
+        check("call past its deadline -> 504", status == 504)
+
+        def boom():
+            raise RuntimeError("permission denied")
+        try:
+            await firestore_repo.run("test.boom", boom)
+            raised = False
+        except RuntimeError:
+            raised = True
+        check("client errors propagate unchanged", raised)
+
+    asyncio.run(scenario())
+    snap = metrics.snapshot()
+    check("per-operation latency timer recorded", snap["timers"].get("firestore.test.get", {}).get("count") == 21)
+    check("timeout counted", snap["counters"].get("firestore.timeouts", 0) == 1)
+    check("error counted", snap["counters"].get("firestore.errors", 0) == 1)
+
+    print()
+    if failures:
+        print(f"FAILED ({len(failures)}):")
+        for f in failures:
+            print("  -", f)
+        raise SystemExit(1)
+    print("Firestore calls run off the event loop, overlap, and time out as 504. ✅")
+
+
+if __name__ == "__main__":
+    main()
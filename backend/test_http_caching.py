@@ -0,0 +1,98 @@
+"""
+Conditional caching tests. Run from the backend/ directory:
+
+    python test_http_caching.py
+
+A revalidation holding the current ETag must get a 304 with no body and without the
+endpoint's loader running (no Firestore read); a changed resource, an invalidation or an
+expired validity window must fall through to a fresh 200, and a 304's max-age must not
+outlast the validity window. Exits non-zero on failure.
+"""
+
+import sys
+import time
+
+from fastapi import FastAPI, Header
+from fastapi.testclient import TestClient
+
+import http_caching
+from response_formats import FastJSONResponse
+
+try:
+    sys.stdout.reconfigure(encoding="utf-8")
+except Exception:
+    pass
+
+
+def make_app(state: dict) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/board")
+    def board(if_none_match: str | None = Header(None)):
+        not_modified = http_caching.precheck("test:board", if_none_match, 60)
+        if not_modified:
+            return not_modified
+        state["reads"] += 1
+        return http_caching.conditional(FastJSONResponse(state["board"]), "test:board", if_none_match, 60,
+                                        valid_for=state["valid_for"])
+
+    return app
+
+
+def main():
+    failures = []
+
+    def check(name, cond):
+        print(f"  {'✓' if cond else '✗'} {name}")
+        if not cond:
+            failures.append(name)
+
+    state = {"reads": 0, "board": [{"id": "a", "score": 10}], "valid_for": 60}
+    client = TestClient(make_app(state))
+
+    first = client.get("/board")
+    etag = first.headers.get("etag")
+    check("200 carries ETag and Cache-Control", first.status_code == 200 and etag
+          and first.headers.get("cache-control") == "public, max-age=60")
+    again = client.get("/board", headers={"If-None-Match": etag})
+    check("matching revalidation is 304 with no body", again.status_code == 304 and again.content == b"")
+    check("304 served without reading the source", state["reads"] == 1)
+    check("weak and listed tags match", client.get("/board", headers={"If-None-Match": f'"x", W/{etag}'}).status_code == 304)
+    check("stale tag gets the full body", client.get("/board", headers={"If-None-Match": '"old"'}).status_code == 200)
+
+    state["board"] = [{"id": "a", "score": 20}]
+    http_caching.invalidate("test:")
+    changed = client.get("/board", headers={"If-None-Match": etag})
+    check("after invalidate a changed body is 200 with a new ETag",
+          changed.status_code == 200 and changed.headers["etag"] != etag and changed.json()[0]["score"] == 20)
+
+    unchanged_etag = changed.headers["etag"]
+    http_caching.invalidate("test:")
+    reads = state["reads"]
+    reread = client.get("/board", headers={"If-None-Match": unchanged_etag})
+    check("unchanged body after a re-read is still 304", reread.status_code == 304 and state["reads"] == reads + 1)
+
+    state["valid_for"] = 0
+    client.get("/board")
+    time.sleep(0.01)
+    reads = state["reads"]
+    client.get("/board", headers={"If-None-Match": client.get("/board").headers["etag"]})
+    check("expired validity window re-reads the source", state["reads"] == reads + 2)
+    state["valid_for"] = 5
+    short_etag = client.get("/board").headers["etag"]
+    short = client.get("/board", headers={"If-None-Match": short_etag})
+    age = int(short.headers.get("cache-control", "max-age=-1").rsplit("=", 1)[1])
+    check(f"304 max-age capped by the remaining validity ({age}s)", short.status_code == 304 and 0 <= age <= 5)
+    check("midnight horizon within a day", 0 < http_caching.seconds_until_midnight() <= 86_400)
+
+    print()
+    if failures:
+        print(f"FAILED ({len(failures)}):")
+        for f in failures:
+            print("  -", f)
+        raise SystemExit(1)
+    print("Unchanged reads are answered with 304 and no source read. ✅")
+
+
+if __name__ == "__main__":
+    main()
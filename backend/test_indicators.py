@@ -0,0 +1,95 @@
+"""
+Higher-timeframe indicator tests. Run from the backend/ directory:
+
+    python test_indicators.py
+
+`Close@15m`, `Close@1h` and `Close@1d` on a hand-built 5m series must only ever show a
+higher-timeframe bar once it has closed: a 5m bar (complete at its label + 5 min) sees the
+15m / 1h bucket that ended by then, the partial 15:15-15:30 hour becomes visible on the
+15:25 bar, and the day's daily bar only on that same last bar (15:30). Exits non-zero on
+failure.
+"""
+
+import sys
+
+import numpy as np
+import pandas as pd
+
+from indicators import compute_indicators
+
+try:
+    sys.stdout.reconfigure(encoding="utf-8")
+except Exception:
+    pass
+
+SESSION_BARS_5M = 75  # 09:15 .. 15:25 inclusive
+
+
+def make_5m(days: int = 2) -> pd.DataFrame:
+    """Two sessions of 5m bars whose Close is 100 + the bar's position, so a value tells
+    exactly which bar it came from."""
+    sessions = pd.bdate_range("2024-01-01", periods=days)
+    times = pd.DatetimeIndex([d + pd.Timedelta(hours=9, minutes=15) + pd.Timedelta(minutes=5 * k)
+                              for d in sessions for k in range(SESSION_BARS_5M)]).tz_localize("Asia/Kolkata")
+    close = 100.0 + np.arange(len(times))
+    return pd.DataFrame({"Datetime": times, "Open": close, "High": close + 0.5, "Low": close - 0.5,
+                         "Close": close, "Volume": 1000.0})
+
+
+def main():
+    failures = []
+
+    def check(name, cond):
+        print(f"  {'✓' if cond else '✗'} {name}")
+        if not cond:
+            failures.append(name)
+
+    data = make_5m()
+    unknown = compute_indicators(data, {"Close@15m", "Close@1h", "Close@1d"}, "Datetime", "5m")
+    check("all three columns computed", not unknown and {"Close@15m", "Close@1h", "Close@1d"} <= set(data.columns))
+
+    def at(day: int, hhmm: str, column: str):
+        t = pd.Timestamp(f"2024-01-0{day + 1} {hhmm}", tz="Asia/Kolkata")
+        return data.loc[data["Datetime"] == t, column].iloc[0]
+
+    def close_of(day: int, k: int) -> float:
+        return 100.0 + day * SESSION_BARS_5M + k   # k = 5m bar number within the session
+
+    print("No lookahead:")
+    for column in ("Close@15m", "Close@1h", "Close@1d"):
+        known = data[column].notna()
+        check(f"{column} never shows a later bar's close", bool((data.loc[known, column] <= data.loc[known, "Close"]).all()))
+    check("first session starts with nothing known",
+          all(np.isnan(at(0, "09:15", c)) for c in ("Close@15m", "Close@1h", "Close@1d")))
+
+    print("Close@15m:")
+    check("09:20 bar still sees the previous session's last bucket", at(1, "09:20", "Close@15m") == close_of(0, 74))
+    check("09:25 bar completes the 09:15 bucket and sees it", at(1, "09:25", "Close@15m") == close_of(1, 2))
+    check("15:20 bar sees the 15:00 bucket", at(1, "15:20", "Close@15m") == close_of(1, 71))
+    check("15:25 bar sees the 15:15-15:30 bucket", at(1, "15:25", "Close@15m") == close_of(1, 74))
+
+    print("Close@1h:")
+    check("10:05 bar sees the previous session's partial hour", at(1, "10:05", "Close@1h") == close_of(0, 74))
+    check("10:10 bar completes the 09:15 hour and sees it", at(1, "10:10", "Close@1h") == close_of(1, 11))
+    check("15:10 bar completes the 14:15 hour and sees it", at(1, "15:10", "Close@1h") == close_of(1, 71))
+    check("15:15 / 15:20 bars do not see the partial hour",
+          at(1, "15:15", "Close@1h") == close_of(1, 71) and at(1, "15:20", "Close@1h") == close_of(1, 71))
+    check("15:25 bar sees the partial 15:15-15:30 hour", at(1, "15:25", "Close@1h") == close_of(1, 74))
+
+    print("Close@1d:")
+    check("first session has no daily bar before 15:30", data["Close@1d"].iloc[:SESSION_BARS_5M - 1].isna().all())
+    check("09:15 bar sees the previous day's close", at(1, "09:15", "Close@1d") == close_of(0, 74))
+    check("15:20 bar still sees the previous day's close", at(1, "15:20", "Close@1d") == close_of(0, 74))
+    check("today's daily bar becomes available at 15:30 (15:25 bar)", at(1, "15:25", "Close@1d") == close_of(1, 74))
+
+    print()
+    if failures:
+        print(f"FAILED ({len(failures)}):")
+        for f in failures:
+            print("  -", f)
+        raise SystemExit(1)
+    print("Higher-timeframe columns only use bars that had closed. ✅")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""
+LoadingCache tests. Run from the backend/ directory:
+
+    python test_loading_cache.py
+
+Ten simultaneous misses must trigger one load (the "ten first requests for a new day's quiz
+make ten LLM calls" stampede), expired entries must reload, stale entries must be served
+while one background reload runs, failures must not be cached and invalidation must drop
+entries, detach their in-flight loads (a caller arriving after an invalidation starts a new
+load rather than joining the old one) and run its hooks. Exits non-zero on failure.
+"""
+
+import asyncio
+import sys
+import threading
+import time
+
+import metrics
+from caching import LoadingCache
+
+try:
+    sys.stdout.reconfigure(encoding="utf-8")
+except Exception:
+    pass
+
+
+class SlowLoader:
+    def __init__(self, delay: float = 0.1):
+        self.delay = delay
+        self.calls = 0
+        self.value = "v1"
+        self.fail = False
+
+    def __call__(self):
+        self.calls += 1
+        time.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError("upstream down")
+        return self.value
+
+
+def main():
+    failures = []
+
+    def check(name, cond):
+        print(f"  {'✓' if cond else '✗'} {name}")
+        if not cond:
+            failures.append(name)
+
+    print("Single-flight:")
+    cache = LoadingCache("test_cache", ttl=60)
+    loader = SlowLoader()
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get("quiz:1", loader))) for _ in range(10)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    check("10 concurrent misses -> 1 load", loader.calls == 1 and results == ["v1"] * 10)
+    check("coalesced waiters counted", metrics.snapshot()["counters"].get("test_cache.coalesced", 0) >= 1)
+
+    async def burst():
+        return await asyncio.gather(*(cache.aget("quiz:2", loader) for _ in range(10)))
+    check("async burst -> 1 load", asyncio.run(burst()) == ["v1"] * 10 and loader.calls == 2)
+    check("fresh hit does not load", cache.get("quiz:2", loader) == "v1" and loader.calls == 2)
+    check("fresh_for counts down the entry's TTL", 59 < cache.fresh_for("quiz:2") <= 60
+          and cache.fresh_for("missing") == 0)
+
+    print("Expiry and stale-while-revalidate:")
+    loader = SlowLoader(delay=0.05)
+    cache.get("board", loader, ttl=0.05)
+    time.sleep(0.06)
+    loader.value = "v2"
+    check("expired entry reloads", cache.get("board", loader, ttl=0.05) == "v2" and loader.calls == 2)
+
+    loader = SlowLoader(delay=0.1)
+    cache.get("swr", loader, ttl=0.05, stale_ttl=5)
+    time.sleep(0.06)
+    loader.value = "v2"
+    start = time.perf_counter()
+    served = cache.get("swr", loader, ttl=0.05, stale_ttl=5)
+    elapsed = time.perf_counter() - start
+    check(f"stale value served at once ({elapsed * 1000:.1f} ms)", served == "v1" and elapsed < 0.05)
+    time.sleep(0.15)
+    check("background reload replaced it", cache.get("swr", loader, ttl=60) == "v2" and loader.calls == 2)
+
+    print("Failures and invalidation:")
+    loader = SlowLoader(delay=0.01)
+    loader.fail = True
+    try:
+        cache.get("broken", loader)
+        check("loader error propagates", False)
+    except RuntimeError:
+        check("loader error propagates", True)
+    loader.fail = False
+    check("errors are not cached", cache.get("broken", loader) == "v1" and loader.calls == 2)
+
+    hooked = []
+    cache.add_invalidation_hook(hooked.append)
+    cache.invalidate("quiz:")
+    loader = SlowLoader(delay=0.01)
+    loader.value = "v3"
+    check("invalidate drops matching keys only", cache.get("quiz:1", loader) == "v3"
+          and cache.get("broken", loader) == "v1" and loader.calls == 1)
+    check("invalidation hook called with the prefix", hooked == ["quiz:"])
+
+    loader = SlowLoader(delay=0.1)
+    worker = threading.Thread(target=lambda: cache.get("race", loader))
+    worker.start()
+    time.sleep(0.02)
+    cache.invalidate("race")
+    worker.join()
+    check("load in flight during invalidate is not stored", cache.get("race", loader) == "v1" and loader.calls == 2)
+
+    print("Invalidate during an in-flight load:")
+    gate = threading.Event()
+    other = SlowLoader(delay=0.2)
+    stale = []
+    first = threading.Thread(target=lambda: stale.append(cache.get("feed:1", lambda: gate.wait(5) and "before")))
+    first.start()
+    unrelated = threading.Thread(target=lambda: cache.get("other:1", other))
+    unrelated.start()
+    time.sleep(0.02)
+    cache.invalidate("feed:")
+    try:
+        fresh = cache.get("feed:1", lambda: "after", timeout=1)
+    except TimeoutError:   # joined the detached load, which is still waiting on the gate
+        fresh = None
+    check("caller after invalidate starts a new load instead of joining the old one", fresh == "after")
+    gate.set()
+    first.join()
+    unrelated.join()
+    check("waiter that joined before invalidate still gets its result", stale == ["before"])
+    check("detached load does not overwrite the new value", cache.get("feed:1", lambda: "reload") == "after")
+    check("loads of other prefixes still store", cache.get("other:1", other) == "v1" and other.calls == 1)
+
+    print()
+    if failures:
+        print(f"FAILED ({len(failures)}):")
+        for f in failures:
+            print("  -", f)
+        raise SystemExit(1)
+    print("Loads are single-flight, expire, revalidate and invalidate as specified. ✅")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""
+History store tests. Run from the backend/ directory:
+
+    python test_market_data.py
+
+The provider is replaced by a scripted `_fetch_chunk`, so no network is used. An empty
+provider response must not pin a (ticker, interval) pair: the empty series is re-fetched
+once its entry is stale, and only ranges that returned bars move `requested_from` back.
+Fresh entries are served without a fetch; stale ones re-read the tail. The suite runs with
+TZ=UTC, so naive server-local bounds must still select intraday bars up to the current IST
+time. Exits non-zero on failure.
+"""
+
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+os.environ["TZ"] = "UTC"   # a container clock, 5.5h behind the exchange
+if hasattr(time, "tzset"):
+    time.tzset()
+os.environ["PATTERNIQ_CACHE_DIR"] = tempfile.mkdtemp(prefix="patterniq-test-")
+os.environ["SHARED_CACHE_PATH"] = os.path.join(os.environ["PATTERNIQ_CACHE_DIR"], "shared.sqlite3")
+
+import pandas as pd
+
+import market_data
+
+try:
+    sys.stdout.reconfigure(encoding="utf-8")
+except Exception:
+    pass
+
+
+class ScriptedProvider:
+    """Serves daily bars for [listed, now] -- or nothing while `down` is set."""
+
+    def __init__(self, listed: datetime):
+        self.listed = listed
+        self.down = False
+        self.calls = []
+
+    def __call__(self, ticker, interval, start, end):
+        self.calls.append((start, end))
+        if self.down:
+            return pd.DataFrame(columns=market_data.OHLCV)
+        days = pd.date_range(max(start, self.listed).date(), end.date(), freq="B")
+        days = days[(days >= pd.Timestamp(start.date())) & (days <= pd.Timestamp(end))]
+        return pd.DataFrame({c: 100.0 for c in market_data.OHLCV}, index=days)
+
+
+class IntradayProvider:
+    """Serves 5m bars, labelled in IST like yfinance, up to the current exchange time. Like
+    `_fetch_chunk` it takes bounds in naive exchange time."""
+
+    def __call__(self, ticker, interval, start, end):
+        start, end = market_data._aware(start), market_data._aware(end)
+        now = pd.Timestamp.now(tz="Asia/Kolkata")
+        times = pd.date_range(start.ceil("5min"), min(end, now), freq="5min")
+        return pd.DataFrame({c: 100.0 for c in market_data.OHLCV}, index=times)
+
+
+def age_entry(ticker: str, interval: str, days: float) -> None:
+    entry = market_data._load(ticker, interval)
+    entry["fetched_at"] = market_data._exchange_now() - timedelta(days=days)
+    market_data._store(ticker, interval, entry)
+
+
+def main():
+    failures = []
+
+    def check(name, cond):
+        print(f"  {'✓' if cond else '✗'} {name}")
+        if not cond:
+            failures.append(name)
+
+    now = datetime.now()
+    provider = ScriptedProvider(listed=now - timedelta(days=400))
+    market_data._fetch_chunk = provider
+
+    print("Empty provider response:")
+    provider.down = True
+    first = market_data.history("EMPTY.NS", "1d", now - timedelta(days=180))
+    entry = market_data._load("EMPTY.NS", "1d")
+    check("empty response returns no bars", first.empty)
+    check("empty range does not set requested_from", entry["requested_from"] is None)
+    provider.down = False
+    calls = len(provider.calls)
+    market_data.history("EMPTY.NS", "1d", now - timedelta(days=180))
+    check("fresh empty entry is not re-fetched within TAIL_REFRESH", len(provider.calls) == calls)
+    age_entry("EMPTY.NS", "1d", days=3)
+    recovered = market_data.history("EMPTY.NS", "1d", now - timedelta(days=180))
+    check("stale empty entry is re-fetched and recovers", len(provider.calls) > calls and len(recovered) > 100)
+    check("bars move requested_from back", market_data._load("EMPTY.NS", "1d")["requested_from"] is not None)
+
+    print("Head ranges:")
+    market_data.history("HEAD.NS", "1d", now - timedelta(days=100))
+    requested = market_data._load("HEAD.NS", "1d")["requested_from"]
+    provider.down = True
+    market_data.history("HEAD.NS", "1d", now - timedelta(days=300))
+    entry = market_data._load("HEAD.NS", "1d")
+    check("empty older range leaves requested_from alone", entry["requested_from"] == requested)
+    check("but records the attempt", entry["attempted_from"] < requested)
+    provider.down = False
+    calls = len(provider.calls)
+    market_data.history("HEAD.NS", "1d", now - timedelta(days=300))
+    check("failed older range not retried while fresh", len(provider.calls) == calls)
+    age_entry("HEAD.NS", "1d", days=3)
+    deeper = market_data.history("HEAD.NS", "1d", now - timedelta(days=300))
+    check("failed older range retried once stale", deeper.index[0] < pd.Timestamp(now - timedelta(days=250)))
+    check("requested_from moved back after bars arrived",
+          market_data._load("HEAD.NS", "1d")["requested_from"] < requested)
+
+    print("Listing date:")
+    market_data.history("NEW.NS", "1d", now - timedelta(days=500))   # listed 400 days ago
+    calls = len(provider.calls)
+    age_entry("NEW.NS", "1d", days=3)
+    market_data.history("NEW.NS", "1d", now - timedelta(days=500))
+    check("history before listing is not re-requested (tail only)",
+          len(provider.calls) == calls + 1 and provider.calls[-1][0] > now - timedelta(days=10))
+
+    print("Server clock in UTC:")
+    market_data._fetch_chunk = IntradayProvider()
+    ist_now = pd.Timestamp.now(tz="Asia/Kolkata")
+    live = market_data.history("LIVE.NS", "5m", datetime.now() - timedelta(days=2))
+    check("bars end at the current IST time", not live.empty and ist_now - live.index[-1] < pd.Timedelta(minutes=10))
+    check("range starts two days before now, not 5.5h earlier",
+          abs(live.index[0] - (ist_now - pd.Timedelta(days=2))) < pd.Timedelta(minutes=10))
+    fetched_at = pd.Timestamp(market_data._load("LIVE.NS", "5m")["fetched_at"], tz="Asia/Kolkata")
+    check("fetched_at is recorded in exchange time", abs(fetched_at - ist_now) < pd.Timedelta(minutes=1))
+
+    print()
+    if failures:
+        print(f"FAILED ({len(failures)}):")
+        for f in failures:
+            print("  -", f)
+        raise SystemExit(1)
+    print("Empty responses are retried and the stored history keeps growing. ✅")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Sanity and speed checks for monte_carlo. Run from the backend/ directory:
+
+    python test_monte_carlo.py
+
+Permuting trades must leave final equity unchanged, percentile bands must be ordered,
+ruin must be detected, and 10k simulations of 1k trades must stay under one second.
+Exits non-zero on failure.
+"""
+
+import sys
+import time
+
+import numpy as np
+
+from monte_carlo import simulate_trades
+
+try:
+    sys.stdout.reconfigure(encoding="utf-8")
+except Exception:
+    pass
+
+CAPITAL = 100_000
+
+
+def ordered(bands: dict) -> bool:
+    values = list(bands.values())
+    return all(a <= b for a, b in zip(values, values[1:]))
+
+
+def main():
+    failures = []
+    trades = np.random.default_rng(3).normal(0.3, 2.0, 1000)
+
+    compounded = CAPITAL * np.prod(1 + (2.0 / 1.5) * trades / 100)
+    permuted = simulate_trades(trades, CAPITAL, 2.0, 1.5, 2000, "permute", seed=1)
+    if not np.isclose(permuted["final_equity"]["p5"], compounded) or not np.isclose(permuted["final_equity"]["p95"], compounded):
+        failures.append(f"permute changed final equity: {permuted['final_equity']} vs {compounded:.2f}")
+    else:
+        print(f"  permute  ✓  final equity fixed at {compounded:,.0f}, drawdown p50 {permuted['max_drawdown']['p50']}%")
+
+    boot = simulate_trades(trades, CAPITAL, 2.0, 1.5, 5000, "bootstrap", seed=1)
+    if not all(ordered(boot[k]) for k in ("final_equity", "max_drawdown", "return_percent")):
+        failures.append("bootstrap percentile bands are not ordered")
+    elif not all(ordered({k: v for k, v in row.items() if k != "trade"}) for row in boot["equity_bands"]):
+        failures.append("equity fan bands are not ordered")
+    else:
+        print(f"  boot     ✓  final equity p5..p95 {boot['final_equity']['p5']:,.0f} .. {boot['final_equity']['p95']:,.0f}")
+
+    losing = simulate_trades([-3.0] * 50, CAPITAL, 2.0, 1.0, 1000, seed=1)
+    if losing["probability_of_ruin"] != 100.0 or losing["probability_of_profit"] != 0.0:
+        failures.append(f"all-losing trades not ruinous: {losing['probability_of_ruin']}%")
+    else:
+        print("  ruin     ✓  all-losing sequence -> 100% ruin")
+
+    if simulate_trades([], CAPITAL, 2.0, 1.5) is not None:
+        failures.append("no trades should yield None")
+
+    start = time.perf_counter()
+    simulate_trades(trades, CAPITAL, 2.0, 1.5, 10_000, "bootstrap", seed=2)
+    elapsed = time.perf_counter() - start
+    if elapsed >= 1.0:
+        failures.append(f"10k x 1k bootstrap took {elapsed:.2f}s")
+    else:
+        print(f"  speed    ✓  10k simulations x 1k trades in {elapsed * 1000:.0f} ms")
+
+    print()
+    if failures:
+        print(f"FAILED ({len(failures)}):")
+        for f in failures:
+            print("  -", f)
+        raise SystemExit(1)
+    print("Monte Carlo resampling checks passed. ✅")
+
+
+if __name__ == "__main__":
+    main()
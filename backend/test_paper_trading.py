@@ -0,0 +1,228 @@
+"""
+Paper trading tests. Run from the backend/ directory:
+
+    python test_paper_trading.py
+
+An in-memory stand-in replaces Firestore. A still-forming last bar must never be traded
+on, a new subscription must only trade from the latest closed bar, and entries / exits must
+become BUY / SELL fills exactly once: a tick replayed on a stale state (as a second worker
+would) rewrites the same fill documents instead of adding new ones, a group that finds the
+sandbox busy is deferred untouched to the next tick, and a tick is skipped while another
+worker holds the shared `paper:tick` lease. Exits non-zero on failure.
+"""
+
+import copy
+import os
+import sys
+import tempfile
+import uuid
+
+os.environ["PATTERNIQ_CACHE_DIR"] = tempfile.mkdtemp(prefix="patterniq-test-")
+os.environ["SHARED_CACHE_PATH"] = os.path.join(os.environ["PATTERNIQ_CACHE_DIR"], "shared.sqlite3")
+
+import pandas as pd
+
+import backtest_engine
+import paper_trading
+from paper_trading import PaperTradingEngine, closed_bars
+from sandbox_admission import PAPER_USER, SandboxBusy
+from shared_store import get_shared_store
+
+try:
+    sys.stdout.reconfigure(encoding="utf-8")
+except Exception:
+    pass
+
+VOLUME_SPIKE = "def find_signals(data):\n    return data['Volume'] > 1500"
+
+
+class FakeSnapshot:
+    def __init__(self, ref, data):
+        self.id, self.reference, self._data = ref.id, ref, data
+        self.exists = data is not None
+
+    def to_dict(self):
+        return copy.deepcopy(self._data)
+
+
+class FakeRef:
+    def __init__(self, db, parent, doc_id):
+        self.db, self.parent, self.id = db, parent, doc_id
+        self.path = f"{parent.path}/{doc_id}"
+
+    def get(self):
+        return FakeSnapshot(self, self.db.docs.get(self.path))
+
+    def update(self, fields):
+        self.db.docs[self.path].update(copy.deepcopy(fields))
+
+    def collection(self, name):
+        return FakeCollection(self.db, f"{self.path}/{name}")
+
+
+class FakeCollection:
+    def __init__(self, db, path):
+        self.db, self.path = db, path
+        self.id = path.rsplit("/", 1)[-1]
+        self.filters = []
+
+    def document(self, doc_id=None):
+        return FakeRef(self.db, self, doc_id or uuid.uuid4().hex)
+
+    def add(self, data):
+        ref = self.document()
+        self.db.docs[ref.path] = copy.deepcopy(data)
+        return None, ref
+
+    def where(self, field, op, value):
+        query = FakeCollection(self.db, self.path)
+        query.filters = self.filters + [(field, value)]
+        return query
+
+    def stream(self):
+        for path, data in list(self.db.docs.items()):
+            parent, _, doc_id = path.rpartition("/")
+            if parent == self.path and all(data.get(f) == v for f, v in self.filters):
+                yield FakeSnapshot(self.document(doc_id), data)
+
+
+class FakeBatch:
+    def __init__(self, db):
+        self.db, self.ops = db, []
+
+    def set(self, ref, fields):
+        self.ops.append(lambda: self.db.docs.__setitem__(ref.path, copy.deepcopy(fields)))
+
+    def update(self, ref, fields):
+        self.ops.append(lambda: ref.update(fields))
+
+    def commit(self):
+        for op in self.ops:
+            op()
+
+
+class FakeDB:
+    def __init__(self):
+        self.docs = {}
+
+    def collection(self, name):
+        return FakeCollection(self, name)
+
+    def batch(self):
+        return FakeBatch(self)
+
+    def fills(self, user_id):
+        prefix = f"users/{user_id}/paper_fills/"
+        return sorted((d for p, d in self.docs.items() if p.startswith(prefix)), key=lambda f: (f["time"], f["side"]))
+
+
+class Bars:
+    """Daily bars that all closed well in the past; `extend` appends newer ones."""
+
+    def __init__(self, closes, volumes):
+        self.frame = pd.DataFrame({
+            "Date": pd.bdate_range(end=pd.Timestamp.now().normalize() - pd.Timedelta(days=30), periods=len(closes)),
+            "Open": closes, "High": closes, "Low": closes, "Close": closes, "Volume": volumes,
+        })
+
+    def extend(self, closes):
+        dates = pd.bdate_range(self.frame["Date"].iloc[-1] + pd.Timedelta(days=1), periods=len(closes))
+        more = pd.DataFrame({"Date": dates, "Open": closes, "High": closes, "Low": closes,
+                             "Close": closes, "Volume": [1000.0] * len(closes)})
+        self.frame = pd.concat([self.frame, more], ignore_index=True)
+
+    def __call__(self, symbol, interval):
+        return self.frame.copy(), "Date"
+
+
+def main():
+    failures = []
+
+    def check(name, cond):
+        print(f"  {'✓' if cond else '✗'} {name}")
+        if not cond:
+            failures.append(name)
+
+    print("Closed bars:")
+    now = pd.Timestamp.now()
+    forming = pd.DataFrame({"Date": [now - pd.Timedelta(minutes=12), now - pd.Timedelta(minutes=2)], "Close": [1.0, 2.0]})
+    check("forming 5m bar dropped", len(closed_bars(forming, "Date", "5m")) == 1)
+    check("closed 1m bar kept", len(closed_bars(forming, "Date", "1m")) == 2)
+    ist = pd.Timestamp.now(tz="Asia/Kolkata")
+    aware = pd.DataFrame({"Date": [ist - pd.Timedelta(hours=2), ist - pd.Timedelta(minutes=30)], "Close": [1.0, 2.0]})
+    check("tz-aware forming 1h bar dropped", len(closed_bars(aware, "Date", "1h")) == 1)
+    check("tz-aware closed 15m bar kept", len(closed_bars(aware, "Date", "15m")) == 2)
+    check("unknown interval left alone", len(closed_bars(forming, "Date", "3mo")) == 2)
+    check("empty frame left alone", closed_bars(forming.iloc[:0], "Date", "5m").empty)
+
+    print("Fills:")
+    db = FakeDB()
+    bars = Bars([100.0] * 30, [1000.0] * 29 + [2000.0])   # signal on the latest bar only
+    engine = PaperTradingEngine(db, bars)
+    saved = {"name": "spike", "symbol": "test.ns", "interval": "1d", "capital": 100000,
+             "riskPercent": 1, "slPercent": 2, "targetPercent": 5, "resultData": {"python_code": VOLUME_SPIKE}}
+    sub_id = engine.subscribe("u1", "s1", saved)
+    sub_path = f"{paper_trading.COLLECTION}/{sub_id}"
+
+    summary = engine.tick()
+    fills = db.fills("u1")
+    check("first tick evaluates the subscription", summary.get("evaluated") == 1)
+    check("new subscription enters on the latest closed bar only",
+          [f["side"] for f in fills] == ["BUY"] and fills[0]["time"] == bars.frame["Date"].iloc[-1].isoformat())
+    check("no fills without new bars", engine.tick().get("evaluated") == 0 and len(db.fills("u1")) == 1)
+
+    before = copy.deepcopy(db.docs[sub_path]["engine_state"])
+    bars.extend([102.0, 106.0, 100.0])
+    engine.tick()
+    fills = db.fills("u1")
+    check("target exit becomes one SELL fill", [f["side"] for f in fills] == ["BUY", "SELL"]
+          and fills[1]["reason"] == "Target" and fills[1]["price"] == 106.0)
+    state = db.docs[sub_path]["engine_state"]
+    check("state advanced to the last bar", state["last_timestamp"] == bars.frame["Date"].iloc[-1].isoformat()
+          and state["num_trades"] == 1 and not state["in_trade"])
+
+    db.docs[sub_path]["engine_state"] = before   # a second worker that read the old state
+    engine.tick()
+    check("replayed tick rewrites the same fills", len(db.fills("u1")) == 2)
+
+    print("Busy sandbox:")
+    admitted_as = []
+
+    def busy(jobs, **kwargs):
+        admitted_as.append(kwargs.get("user_id"))
+        raise SandboxBusy("busy", retry_after=1)
+
+    run_batch, paper_trading.safe_execute_batch = paper_trading.safe_execute_batch, busy
+    before = copy.deepcopy(db.docs[sub_path])
+    bars.extend([100.0])
+    summary = engine.tick()
+    paper_trading.safe_execute_batch = run_batch
+    check("groups are admitted as the paper system identity", admitted_as == [PAPER_USER])
+    check("busy group is deferred, not failed", summary.get("deferred") == 1 and summary.get("errors") == 0)
+    check("deferred group wrote nothing", db.docs[sub_path] == before and len(db.fills("u1")) == 2)
+    check("next tick picks the group up", engine.tick().get("evaluated") == 1)
+
+    print("Cross-worker lease:")
+    store = get_shared_store()
+    check("shared store available", store is not None)
+    if store is not None:
+        token = store.try_acquire("paper:tick", 60)
+        bars.extend([100.0])
+        db.docs[sub_path]["engine_state"] = backtest_engine.new_state(saved["capital"])
+        skipped = engine.tick()
+        check("tick skipped while another worker holds the lease", "skipped" in skipped)
+        check("skipped tick wrote nothing", db.docs[sub_path]["engine_state"]["last_timestamp"] is None)
+        store.release("paper:tick", token)
+        check("tick runs once the lease is free", engine.tick().get("evaluated") == 1)
+
+    print()
+    if failures:
+        print(f"FAILED ({len(failures)}):")
+        for f in failures:
+            print("  -", f)
+        raise SystemExit(1)
+    print("Paper fills are written once, on closed bars, by one worker at a time. ✅")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Portfolio simulator tests. Run from the backend/ directory:
+
+    python test_portfolio.py
+
+A one-symbol basket with unlimited buying power must reproduce the single-symbol engine;
+position and exposure limits must hold on a wide basket; 50 symbols over five years of
+daily bars must simulate interactively. Exits non-zero on failure.
+"""
+
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+import backtest_engine
+from portfolio import portfolio_report, simulate_portfolio
+
+try:
+    sys.stdout.reconfigure(encoding="utf-8")
+except Exception:
+    pass
+
+CAPITAL = 1_000_000
+PARAMS = dict(risk_percent=2.0, sl_percent=3.0, target_percent=6.0)
+
+
+def make_basket(bars: int, symbols: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(rng.normal(0, 0.015, (bars, symbols)).cumsum(axis=0))
+    signals = rng.random((bars, symbols)) < 0.05
+    return close, signals
+
+
+def main():
+    failures = []
+
+    for seed in range(3):
+        close, signals = make_basket(600, 1, seed)
+        state = backtest_engine.new_state(CAPITAL)
+        frame = pd.DataFrame({"Date": pd.date_range("2020-01-01", periods=600), "Close": close[:, 0]})
+        trades, _, _ = backtest_engine.simulate(frame, "Date", pd.Series(signals[:, 0]), state=state, **PARAMS)
+        result = simulate_portfolio(close, signals.copy(), CAPITAL, max_positions=1, max_leverage=1e9, **PARAMS)
+        flat_end = result["open_positions"][-1] == 0
+        expected = state["capital"] if flat_end else None
+        if len(result["trades"]["pnl_percent"]) != len(trades) or (flat_end and not np.isclose(result["equity"][-1], expected)):
+            failures.append(f"seed {seed}: one-symbol basket differs from the engine")
+        else:
+            print(f"  engine   ✓  seed {seed}: {len(trades)} trades, same as backtest_engine")
+
+    # 1% risk with a 10% stop sizes each position at 10% of equity: up to 8 fit.
+    wide = dict(risk_percent=1.0, sl_percent=10.0, target_percent=10.0)
+    close, signals = make_basket(1250, 50, seed=7)
+    result = simulate_portfolio(close, signals.copy(), CAPITAL, max_positions=8, **wide)
+    if result["open_positions"].max() > 8:
+        failures.append(f"position limit exceeded: {result['open_positions'].max()}")
+    elif (result["equity"] <= 0).any():
+        failures.append("unlevered portfolio equity went non-positive")
+    else:
+        print(f"  limits   ✓  max {result['open_positions'].max()} open of 8, {len(result['trades']['pnl_percent'])} trades")
+
+    close[100:200, 3] = np.nan  # a symbol with missing bars must not trade in the gap
+    result = simulate_portfolio(close, signals.copy(), CAPITAL, max_positions=8, **PARAMS)
+    trades = result["trades"]
+    if ((trades["symbol"] == 3) & (trades["entry_bar"] >= 100) & (trades["entry_bar"] < 200)).any():
+        failures.append("entered a symbol on a missing bar")
+    else:
+        print("  gaps     ✓  no entries on missing bars")
+
+    start = time.perf_counter()
+    result = simulate_portfolio(close, signals.copy(), CAPITAL, max_positions=10, **PARAMS)
+    report = portfolio_report(result, pd.bdate_range("2019-01-01", periods=1250), [f"S{i}" for i in range(50)], CAPITAL)
+    elapsed = time.perf_counter() - start
+    if elapsed > 1.0:
+        failures.append(f"50 symbols x 1250 bars took {elapsed:.2f}s")
+    else:
+        print(f"  speed    ✓  50 symbols x 1250 bars + report in {elapsed * 1000:.0f} ms ({report['num_trades']} trades)")
+
+    print()
+    if failures:
+        print(f"FAILED ({len(failures)}):")
+        for f in failures:
+            print("  -", f)
+        raise SystemExit(1)
+    print("Portfolio simulator checks passed. ✅")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Resampling tests. Run from the backend/ directory:
+
+    python test_resampling.py
+
+Derived bars must match a direct aggregation of the base bars, sit on the 09:15 NSE session
+grid and never mix two sessions. Exits non-zero on failure.
+"""
+
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from resampling import can_derive, resample_ohlcv
+
+try:
+    sys.stdout.reconfigure(encoding="utf-8")
+except Exception:
+    pass
+
+SESSION_BARS_5M = 75  # 09:15 .. 15:25 inclusive
+
+
+def make_5m(days: int = 20, seed: int = 0) -> pd.DataFrame:
+    sessions = pd.bdate_range("2024-01-01", periods=days)
+    index = pd.DatetimeIndex([
+        d + pd.Timedelta(hours=9, minutes=15) + pd.Timedelta(minutes=5 * k)
+        for d in sessions for k in range(SESSION_BARS_5M)
+    ]).tz_localize("Asia/Kolkata")
+    index.name = "Datetime"
+    rng = np.random.default_rng(seed)
+    close = 100 + rng.normal(0, 0.3, len(index)).cumsum()
+    return pd.DataFrame({
+        "Open": close + rng.normal(0, 0.1, len(index)), "High": close + 0.5, "Low": close - 0.5,
+        "Close": close, "Volume": rng.integers(100, 1000, len(index)).astype(float),
+    }, index=index)
+
+
+def main():
+    failures = []
+    base = make_5m()
+
+    for interval, minutes in (("15m", 15), ("30m", 30), ("1h", 60)):
+        out = resample_ohlcv(base, interval)
+        offsets = (out.index - out.index.normalize()) - pd.Timedelta(hours=9, minutes=15)
+        on_grid = bool((offsets % pd.Timedelta(minutes=minutes) == pd.Timedelta(0)).all())
+        # Reference: bucket each 5m bar by its minutes since the session open.
+        since_open = (base.index - base.index.normalize()) - pd.Timedelta(hours=9, minutes=15)
+        bucket = base.index.normalize() + pd.Timedelta(hours=9, minutes=15) + (since_open // pd.Timedelta(minutes=minutes)) * pd.Timedelta(minutes=minutes)
+        expected = base.groupby(bucket).agg({"Open": "first", "High": "max", "Low": "min", "Close": "last", "Volume": "sum"})
+        if not on_grid:
+            failures.append(f"{interval}: bars off the 09:15 session grid")
+        elif not np.allclose(out.to_numpy(), expected.to_numpy()) or not out.index.equals(expected.index):
+            failures.append(f"{interval}: aggregation differs from direct groupby")
+        else:
+            print(f"  {interval:<4} ✓  {len(out)} bars, first {out.index[0].strftime('%H:%M')}, last {out.index[-1].strftime('%H:%M')}")
+
+    daily = resample_ohlcv(base, "1d")
+    if len(daily) != 20 or daily.index.tz is not None or daily["Volume"].sum() != base["Volume"].sum():
+        failures.append("1d: sessions not aggregated one bar per date")
+    else:
+        print(f"  1d   ✓  {len(daily)} session bars, volume conserved")
+
+    if not (can_derive("15m", "5m") and can_derive("1h", "15m") and not can_derive("5m", "15m") and not can_derive("15m", "2m")):
+        failures.append("can_derive rules wrong")
+
+    frame = make_5m(days=59)
+    resample_ohlcv(frame, "15m")  # warm-up (first call pays pandas' lazy imports)
+    start = time.perf_counter()
+    resample_ohlcv(frame, "15m")
+    elapsed = (time.perf_counter() - start) * 1000
+    print(f"  speed ✓  59 sessions of 5m -> 15m in {elapsed:.1f} ms")
+
+    print()
+    if failures:
+        print(f"FAILED ({len(failures)}):")
+        for f in failures:
+            print("  -", f)
+        raise SystemExit(1)
+    print("Resampled bars match direct aggregation on the session grid. ✅")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""
+Response encoding tests. Run from the backend/ directory:
+
+    python test_response_formats.py
+
+The columnar body must carry exactly the rows of the default JSON body (time columns as
+epoch seconds), negotiation must honour ?format= before Accept, and the compact form must
+be clearly smaller and faster to encode for a large backtest payload. Exits non-zero on
+failure.
+"""
+
+import json
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
+
+import backtest_engine
+import response_formats
+from response_formats import COLUMNAR_MEDIA_TYPE, negotiate, render, to_columnar
+
+try:
+    sys.stdout.reconfigure(encoding="utf-8")
+except Exception:
+    pass
+
+
+def make_payload(n_bars: int = 60_000, seed: int = 3) -> dict:
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range("2024-01-01 09:15", periods=n_bars, freq="5min", tz="Asia/Kolkata")
+    data = pd.DataFrame({"Datetime": dates, "Close": 100 + rng.normal(0, 0.4, n_bars).cumsum() + 200})
+    signals = pd.Series(rng.random(n_bars) < 0.05)
+    state = backtest_engine.new_state(100_000)
+    trades, equity, drawdown = backtest_engine.simulate(data, "Datetime", signals, 0.5, 1.0, 1.0, state)
+    formatted, scatter, _ = backtest_engine.format_trades(trades)
+    return {**backtest_engine.summarize(state, 100_000), "equity_curve": equity, "drawdown_curve": drawdown,
+            "scatter_data": scatter, "trades": formatted, "engine_state": state,
+            "monte_carlo": {"equity_bands": [{"trade": 1, "p5": 1.0}, {"trade": 2, "p5": 2.0}]}}
+
+
+def main():
+    failures = []
+
+    def check(name, cond):
+        print(f"  {'✓' if cond else '✗'} {name}")
+        if not cond:
+            failures.append(name)
+
+    print("Negotiation:")
+    check("default is plain JSON", negotiate(None) == "json" and negotiate("application/json") == "json")
+    check("Accept selects columnar", negotiate(f"{COLUMNAR_MEDIA_TYPE}, */*") == "columnar")
+    check("?format= wins over Accept", negotiate(COLUMNAR_MEDIA_TYPE, "json") == "json")
+    try:
+        negotiate(None, "xml")
+        check("unknown format rejected with 400", False)
+    except HTTPException as e:
+        check("unknown format rejected with 400", e.status_code == 400)
+    if response_formats.msgpack is None:
+        try:
+            negotiate("application/msgpack")
+            check("msgpack without the package is 406", False)
+        except HTTPException as e:
+            check("msgpack without the package is 406", e.status_code == 406)
+    else:
+        check("Accept selects msgpack", negotiate("application/msgpack") == "msgpack")
+
+    print("Columnar body:")
+    payload = make_payload()
+    columnar = to_columnar(payload)
+    curve = columnar["equity_curve"]
+    check("curve becomes parallel arrays", set(curve) == {"date", "equity"}
+          and len(curve["date"]) == len(payload["equity_curve"]))
+    first = payload["equity_curve"][0]
+    check("time column is exchange-local epoch seconds",
+          pd.Timestamp(curve["date"][0], unit="s").strftime(backtest_engine.DATE_FORMAT) == first["date"])
+    rows = [dict(zip(curve, values)) for values in zip(*curve.values())]
+    check("values round-trip row for row", [r["equity"] for r in rows] == [p["equity"] for p in payload["equity_curve"]])
+    check("trade tables keep every column", set(columnar["trades"]) == set(payload["trades"][0]))
+    check("nested tables converted", columnar["monte_carlo"]["equity_bands"] == {"trade": [1, 2], "p5": [1.0, 2.0]})
+    check("scalars and state untouched", columnar["pnl"] == payload["pnl"] and columnar["engine_state"] == payload["engine_state"])
+    mixed = [{"a": 1}, {"b": 2}]
+    check("non-uniform rows stay rows", to_columnar({"x": mixed})["x"] == mixed)
+
+    print("Fast JSON:")
+    odd = {"nan": float("nan"), "inf": np.float64("inf"), "arr": np.array([1.5, np.nan]), "n": np.int64(7),
+           "when": pd.Timestamp("2024-05-01 09:15").to_pydatetime()}
+    decoded = json.loads(response_formats.dumps(odd))
+    check("non-finite numbers encode as null", decoded["nan"] is None and decoded["inf"] is None
+          and decoded["arr"] == [1.5, None])
+    check("numpy scalars and datetimes encode natively", decoded["n"] == 7 and decoded["when"].startswith("2024-05-01T09:15"))
+    check("plain JSON body matches the default encoder", json.loads(render(payload, "json").body) == json.loads(json.dumps(payload)))
+
+    print("Encoding cost:")
+    render(payload, "json"), render(payload, "columnar")  # warm-up
+    timings = {}
+    for fmt in ("json", "columnar"):
+        start = time.perf_counter()
+        response = render(payload, fmt)
+        timings[fmt] = ((time.perf_counter() - start) * 1000, len(response.body))
+    (json_ms, json_bytes), (col_ms, col_bytes) = timings["json"], timings["columnar"]
+    print(f"    {len(payload['trades'])} trades: json {json_bytes / 1e6:.2f} MB in {json_ms:.0f} ms, "
+          f"columnar {col_bytes / 1e6:.2f} MB in {col_ms:.0f} ms")
+    check("columnar body at least 30% smaller", col_bytes < 0.7 * json_bytes)
+    start = time.perf_counter()
+    json.dumps(jsonable_encoder(payload))
+    default_ms = (time.perf_counter() - start) * 1000
+    check(f"columnar encodes faster than FastAPI's default encoder ({default_ms:.0f} ms)", col_ms < default_ms)
+    check("columnar parses back to the same table", json.loads(render(payload, "columnar").body)["equity_curve"]["equity"]
+          == curve["equity"])
+    check("responses vary on Accept", render(payload, "columnar").headers["vary"] == "Accept")
+
+    print()
+    if failures:
+        print(f"FAILED ({len(failures)}):")
+        for f in failures:
+            print("  -", f)
+        raise SystemExit(1)
+    print("Columnar responses carry the same data in less space. ✅")
+
+
+if __name__ == "__main__":
+    main()
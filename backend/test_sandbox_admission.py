@@ -0,0 +1,145 @@
+"""
+Scheduling tests for sandbox admission control. Run from the backend/ directory:
+
+    python test_sandbox_admission.py
+
+Exits non-zero if the concurrency cap, fast-fail, lane priority, per-user fairness or a
+system identity's own running cap breaks.
+"""
+
+import sys
+import threading
+import time
+
+from sandbox_admission import LANE_BATCH, LANE_INTERACTIVE, AdmissionController, SandboxBusy
+
+try:
+    sys.stdout.reconfigure(encoding="utf-8")
+except Exception:
+    pass
+
+
+def _queue_and_record(ctl, user, lane, order, hold=0.05):
+    def run():
+        with ctl.slot(user, lane):
+            order.append(user)
+            time.sleep(hold)
+    t = threading.Thread(target=run)
+    t.start()
+    return t
+
+
+def _wait_for_queue(ctl, depth, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while ctl.stats()["queued"] < depth and time.monotonic() < deadline:
+        time.sleep(0.005)
+
+
+def check_fast_fail():
+    ctl = AdmissionController(max_concurrent=1, max_per_user=1, max_queue=0, max_wait=1)
+    with ctl.slot("alice"):
+        try:
+            with ctl.slot("bob"):
+                return "second caller was admitted past a full sandbox"
+        except SandboxBusy as e:
+            if e.retry_after < 1:
+                return f"Retry-After must be >= 1s, got {e.retry_after}"
+    return None
+
+
+def check_wait_timeout():
+    ctl = AdmissionController(max_concurrent=1, max_per_user=1, max_queue=4, max_wait=0.1)
+    with ctl.slot("alice"):
+        try:
+            with ctl.slot("bob"):
+                return "queued caller was admitted while the slot was still held"
+        except SandboxBusy:
+            pass
+    if ctl.stats()["queued"] != 0:
+        return "timed-out waiter was left in the queue"
+    return None
+
+
+def check_lane_priority():
+    ctl = AdmissionController(max_concurrent=1, max_per_user=4, max_queue=8, max_wait=5)
+    order = []
+    ctl.acquire("holder")
+    threads = [_queue_and_record(ctl, "sweep", LANE_BATCH, order)]
+    _wait_for_queue(ctl, 1)
+    threads.append(_queue_and_record(ctl, "interactive", LANE_INTERACTIVE, order))
+    _wait_for_queue(ctl, 2)
+    ctl.release("holder")
+    for t in threads:
+        t.join()
+    if order != ["interactive", "sweep"]:
+        return f"batch work ran ahead of interactive work: {order}"
+    return None
+
+
+def check_round_robin():
+    ctl = AdmissionController(max_concurrent=1, max_per_user=1, max_queue=8, max_queued_per_user=4, max_wait=5)
+    order = []
+    ctl.acquire("holder")
+    threads = []
+    for user in ["greedy", "greedy", "greedy", "polite"]:
+        threads.append(_queue_and_record(ctl, user, LANE_INTERACTIVE, order, hold=0.01))
+        _wait_for_queue(ctl, len(threads))
+    ctl.release("holder")
+    for t in threads:
+        t.join()
+    if order.index("polite") > 1:
+        return f"a user with many queued jobs starved another user: {order}"
+    return None
+
+
+def check_user_limits():
+    ctl = AdmissionController(max_concurrent=4, max_per_user=1, max_queue=0, max_wait=1,
+                              user_limits={"system:paper": 2})
+    ctl.acquire("system:paper")
+    ctl.acquire("system:paper")
+    try:
+        ctl.acquire("system:paper")
+        return "system identity ran past its own cap"
+    except SandboxBusy:
+        pass
+    try:
+        ctl.acquire("anonymous")
+    except SandboxBusy:
+        return "system identity's slots counted against anonymous callers"
+    try:
+        ctl.acquire("anonymous")
+        return "anonymous callers got the system identity's cap"
+    except SandboxBusy:
+        pass
+    return None
+
+
+CHECKS = [
+    ("fast-fail with Retry-After", check_fast_fail),
+    ("bounded queue wait", check_wait_timeout),
+    ("interactive before batch", check_lane_priority),
+    ("round-robin across users", check_round_robin),
+    ("per-identity running cap", check_user_limits),
+]
+
+
+def main():
+    failures = []
+    for label, check in CHECKS:
+        problem = check()
+        if problem:
+            failures.append(f"{label}: {problem}")
+        else:
+            print(f"  ok       ✓  {label}")
+
+    print()
+    if failures:
+        print(f"FAILED ({len(failures)}):")
+        for f in failures:
+            print("  -", f)
+        raise SystemExit(1)
+    print(f"All {len(CHECKS)} admission checks passed. ✅")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Shared store tests. Run from the backend/ directory:
+
+    python test_shared_store.py
+
+Worker processes that miss the same key together must produce one upstream load between
+them; a value published by one worker must be read by another without loading; an
+invalidation in one worker must retire the other's in-memory copy; expired entries and
+leases must lapse. Exits non-zero on failure.
+"""
+
+import multiprocessing as mp
+import os
+import sys
+import tempfile
+import time
+
+from caching import LoadingCache
+from shared_store import SharedStore
+
+try:
+    sys.stdout.reconfigure(encoding="utf-8")
+except Exception:
+    pass
+
+WORKERS = 4
+
+
+def worker(db_path: str, log_path: str, barrier, results) -> None:
+    """One 'uvicorn worker': its own LoadingCache over the shared SQLite file."""
+    cache = LoadingCache("scan", ttl=60, shared=SharedStore(db_path))
+
+    def load():
+        with open(log_path, "a") as fh:
+            fh.write(f"{os.getpid()}\n")
+        time.sleep(0.3)   # a slow upstream (market scan / LLM)
+        return {"scan": "snapshot"}
+
+    barrier.wait()
+    results.put(cache.get("NIFTY_50", load))
+
+
+def main():
+    failures = []
+
+    def check(name, cond):
+        print(f"  {'✓' if cond else '✗'} {name}")
+        if not cond:
+            failures.append(name)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "shared.sqlite3")
+        log_path = os.path.join(tmp, "loads.log")
+        store = SharedStore(db_path)
+
+        print("Store:")
+        store.put("k", {"bars": [1, 2, 3]}, ttl=60)
+        check("published value readable", store.get("k") == {"bars": [1, 2, 3]})
+        check("WAL journal mode", store._conn().execute("PRAGMA journal_mode").fetchone()[0] == "wal")
+        store.put("short", 1, ttl=0.01)
+        time.sleep(0.02)
+        check("expired entry is a miss", store.get("short") is None)
+        store.put("app:a:1", 1, 60), store.put("app:a:2", 2, 60), store.put("app:b", 3, 60)
+        store.delete_prefix("app:a:")
+        check("delete_prefix removes only the prefix", store.get("app:a:1") is None and store.get("app:b") == 3)
+        token = store.try_acquire("lease", ttl=0.05)
+        check("lease is exclusive", token is not None and store.try_acquire("lease", ttl=0.05) is None)
+        time.sleep(0.06)
+        check("expired lease can be taken over", store.try_acquire("lease", ttl=1) is not None)
+
+        print("Across processes:")
+        ctx = mp.get_context("spawn")
+        barrier, results = ctx.Barrier(WORKERS), ctx.Queue()
+        procs = [ctx.Process(target=worker, args=(db_path, log_path, barrier, results)) for _ in range(WORKERS)]
+        for p in procs:
+            p.start()
+        values = [results.get(timeout=30) for _ in procs]
+        for p in procs:
+            p.join(timeout=30)
+        with open(log_path) as fh:
+            loads = fh.read().split()
+        check(f"{WORKERS} workers missing together -> {len(loads)} upstream load(s)", len(loads) == 1)
+        check("every worker got the value", values == [{"scan": "snapshot"}] * WORKERS)
+
+        print("Two workers, one host:")
+        calls = []
+        a = LoadingCache("board", ttl=60, shared=SharedStore(db_path))
+        b = LoadingCache("board", ttl=60, shared=SharedStore(db_path))
+        a.get("top10", lambda: calls.append("a") or ["alice"])
+        check("value published by one worker is read by the other", b.get("top10", lambda: calls.append("b") or ["bob"])
+              == ["alice"] and calls == ["a"])
+        b.invalidate("top10")
+        check("invalidation in one worker retires the other's copy",
+              a.get("top10", lambda: calls.append("a2") or ["carol"]) == ["carol"] and calls == ["a", "a2"])
+
+    print()
+    if failures:
+        print(f"FAILED ({len(failures)}):")
+        for f in failures:
+            print("  -", f)
+        raise SystemExit(1)
+    print("Workers share published values and load each key once. ✅")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+"""
+Equivalence, cost-analysis and column-projection tests for strategy_analysis. Run from the backend/ directory:
+
+    python test_strategy_analysis.py
+
+Every loop the rewriter accepts must produce exactly the signals the original loop does
+(on random data with NaNs, over several seeds); loops it cannot prove equivalent must be
+left alone. Exits non-zero on any mismatch.
+"""
+
+import sys
+
+import numpy as np
+import pandas as pd
+
+from strategy_analysis import analyze_cost, referenced_columns, vectorize_loops
+from strategy_sandbox import _execute_validated, safe_execute_strategy, validate_strategy
+
+try:
+    sys.stdout.reconfigure(encoding="utf-8")
+except Exception:
+    pass
+
+
+def make_data(seed: int, rows: int = 300, index: str = "range") -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    close = 100 + rng.normal(0, 1, rows).cumsum()
+    df = pd.DataFrame({
+        "Open": close + rng.normal(0, 0.5, rows),
+        "High": close + np.abs(rng.normal(0, 1, rows)),
+        "Low": close - np.abs(rng.normal(0, 1, rows)),
+        "Close": close,
+        "Volume": rng.integers(1_000, 50_000, rows).astype(float),
+        "RSI_14": rng.uniform(0, 100, rows),
+    })
+    df.loc[rng.choice(rows, 10, replace=False), "RSI_14"] = np.nan  # indicator warm-up gaps
+    if index == "datetime":
+        df.index = pd.date_range("2024-01-01", periods=rows, freq="D")
+    return df
+
+
+# (label, code) — loops that MUST be rewritten and stay equivalent.
+REWRITABLE = [
+    ("label index up-close", (
+        "def find_signals(data):\n"
+        "    signals = [False] * len(data)\n"
+        "    for i in range(1, len(data)):\n"
+        "        if data['Close'][i] > data['Close'][i - 1]:\n"
+        "            signals[i] = True\n"
+        "    return signals\n"
+    )),
+    ("iloc three-bar pattern", (
+        "def find_signals(data):\n"
+        "    signals = [0] * len(data)\n"
+        "    for i in range(2, len(data)):\n"
+        "        if data['Close'].iloc[i] > data['Close'].iloc[i-1] > data['Close'].iloc[i-2] and data['RSI_14'].iloc[i] < 70:\n"
+        "            signals[i] = 1\n"
+        "    return signals\n"
+    )),
+    ("aliases + or/not", (
+        "def find_signals(data):\n"
+        "    close = data['Close']\n"
+        "    rsi = data['RSI_14']\n"
+        "    signals = len(data) * [False]\n"
+        "    for i in range(1, len(close)):\n"
+        "        if not (rsi[i] > 30) or (close[i] - close[i - 1]) / close[i - 1] * 100 > 1.5:\n"
+        "            signals[i] = True\n"
+        "        else:\n"
+        "            signals[i] = False\n"
+        "    return signals\n"
+    )),
+    ("values + abs from 0", (
+        "def find_signals(data):\n"
+        "    signals = [False for _ in range(len(data))]\n"
+        "    for i in range(len(data)):\n"
+        "        if abs(data['High'].values[i] - data['Low'].values[i]) > 2 * abs(data['Close'].values[i] - data['Open'].values[i]):\n"
+        "            signals[i] = True\n"
+        "    return signals\n"
+    )),
+    ("gap up on volume", (
+        "def find_signals(data):\n"
+        "    signals = [False] * len(data)\n"
+        "    for i in range(3, len(data)):\n"
+        "        if data['Open'].iloc[i] > data['High'].iloc[i - 1] and data['Volume'].iloc[i] > data['Volume'].iloc[i - 3] * 1.5:\n"
+        "            signals[i] = True\n"
+        "    return signals\n"
+    )),
+]
+
+# (label, code) — valid loops the rewriter must NOT touch.
+NOT_REWRITABLE = [
+    ("lookahead i+1", (
+        "def find_signals(data):\n"
+        "    signals = [False] * len(data)\n"
+        "    for i in range(0, len(data) - 1):\n"
+        "        if data['Close'].iloc[i + 1] > data['Close'].iloc[i]:\n"
+        "            signals[i] = True\n"
+        "    return signals\n"
+    )),
+    ("offset wraps negative", (
+        "def find_signals(data):\n"
+        "    signals = [False] * len(data)\n"
+        "    for i in range(1, len(data)):\n"
+        "        if data['Close'].iloc[i] > data['Close'].iloc[i - 2]:\n"
+        "            signals[i] = True\n"
+        "    return signals\n"
+    )),
+    ("stateful loop", (
+        "def find_signals(data):\n"
+        "    signals = [False] * len(data)\n"
+        "    count = 0\n"
+        "    for i in range(1, len(data)):\n"
+        "        if data['Close'].iloc[i] > data['Close'].iloc[i - 1]:\n"
+        "            signals[i] = True\n"
+        "    return signals\n"
+    )),
+    ("truthiness test", (
+        "def find_signals(data):\n"
+        "    signals = [False] * len(data)\n"
+        "    for i in range(len(data)):\n"
+        "        if data['Volume'].iloc[i]:\n"
+        "            signals[i] = True\n"
+        "    return signals\n"
+    )),
+]
+
+# (label, code, expected complexity, expect rolling-in-loop flag)
+COST_CASES = [
+    ("vectorized", "def find_signals(data):\n    return data['RSI_14'] < 30", "O(n)", False),
+    ("scalar loop", REWRITABLE[0][1], "O(n)", False),
+    ("rolling in loop", (
+        "def find_signals(data):\n"
+        "    out = [False] * len(data)\n"
+        "    for i in range(20, len(data)):\n"
+        "        ma = data['Close'].rolling(20).mean()\n"
+        "        out[i] = data['Close'].iloc[i] > ma.iloc[i]\n"
+        "    return out\n"
+    ), "O(n^2)", True),
+    ("nested loops", (
+        "def find_signals(data):\n"
+        "    out = [False] * len(data)\n"
+        "    for i in range(len(data)):\n"
+        "        for j in range(len(data)):\n"
+        "            pass\n"
+        "    return out\n"
+    ), "O(n^2)", False),
+]
+
+# (label, code, expected columns or None when the frame cannot be projected)
+PROJECTION_CASES = [
+    ("single column", "def find_signals(data):\n    return data['RSI_14'] < 30", {"RSI_14"}),
+    ("alias + len", REWRITABLE[2][1], {"Close", "RSI_14"}),
+    ("list + attribute", "def find_signals(data):\n    sub = data[['High', 'Low']]\n    return data.Close > sub['High'].shift(1)", {"High", "Low", "Close"}),
+    ("index is free", "def find_signals(data):\n    return (data['Close'] > 0) & (data.index == data.index)", {"Close"}),
+    ("dynamic key", "def find_signals(data):\n    c = 'Close'\n    return data[c] > 0", None),
+    ("whole-frame method", "def find_signals(data):\n    return data.mean(axis=1) > 0", None),
+    ("columns walk", "def find_signals(data):\n    return data[data.columns[0]] > 0", None),
+]
+
+
+def _reference(code: str, data: pd.DataFrame) -> pd.Series:
+    """Run the original (unrewritten) loop directly."""
+    return pd.Series(_execute_validated(code, data.copy()), index=data.index).fillna(False).astype(bool)
+
+
+def main():
+    failures = []
+
+    for label, code in REWRITABLE:
+        if vectorize_loops(validate_strategy(code)) is None:
+            failures.append(f"NOT REWRITTEN: {label}")
+            continue
+        for seed in range(5):
+            data = make_data(seed)
+            expected = _reference(code, data)
+            got = safe_execute_strategy(code, data.copy())
+            if not got.equals(expected):
+                diff = int((got != expected).sum())
+                failures.append(f"NOT EQUIVALENT: {label} (seed {seed}, {diff} rows differ)")
+                break
+        else:
+            print(f"  rewrite  ✓  {label:<26} -> equivalent on 5 seeds")
+
+    for label, code in NOT_REWRITABLE:
+        if vectorize_loops(validate_strategy(code)) is not None:
+            failures.append(f"REWRITTEN UNSAFELY: {label}")
+        else:
+            print(f"  kept     ✓  {label:<26} -> left as a loop")
+
+    # Label lookups are only positional on a RangeIndex: on a DatetimeIndex the original
+    # semantics must be kept (the loop runs as written in the subprocess).
+    rw = vectorize_loops(validate_strategy(REWRITABLE[0][1]))
+    if rw.positional:
+        failures.append("label-indexed loop was marked positional")
+    else:
+        print(f"  guard    ✓  {'label index needs RangeIndex':<26} -> positional=False")
+
+    for label, code, expected in PROJECTION_CASES:
+        got = referenced_columns(validate_strategy(code))
+        if got != expected:
+            failures.append(f"PROJECTION: {label} -> {got}, expected {expected}")
+            continue
+        if got is not None:
+            data = make_data(0)
+            full = safe_execute_strategy(code, data.copy())
+            projected = safe_execute_strategy(code, data[[c for c in data.columns if c in got]].copy())
+            if not full.equals(projected):
+                failures.append(f"PROJECTION CHANGED SIGNALS: {label}")
+                continue
+        print(f"  project  ✓  {label:<26} -> {sorted(got) if got is not None else 'full frame'}")
+
+    for label, code, complexity, rolling in COST_CASES:
+        report = analyze_cost(validate_strategy(code))
+        if report["complexity"] != complexity:
+            failures.append(f"COMPLEXITY: {label} -> {report['complexity']}, expected {complexity}")
+        elif bool(report["rolling_in_loop"]) != rolling:
+            failures.append(f"ROLLING FLAG: {label} -> {report['rolling_in_loop']}")
+        else:
+            print(f"  cost     ✓  {label:<26} -> {report['complexity']}, {len(report['hints'])} hint(s)")
+
+    print()
+    if failures:
+        print(f"FAILED ({len(failures)}):")
+        for f in failures:
+            print("  -", f)
+        raise SystemExit(1)
+    print(f"All {len(REWRITABLE)} rewrites equivalent, {len(NOT_REWRITABLE)} unsafe loops kept, "
+          f"{len(COST_CASES)} cost estimates and {len(PROJECTION_CASES)} projections correct. ✅")
+
+
+if __name__ == "__main__":
+    main()
@@ -11,7 +11,10 @@ import sys
 import numpy as np
 import pandas as pd
 
-from strategy_sandbox import safe_execute_strategy
+from strategy_sandbox import (
+    _execute_validated, safe_execute_batch, safe_execute_strategy, safe_execute_strategy_batch,
+    validate_strategy, vectorized_expression,
+)
 
 # Windows consoles default to cp1252; force UTF-8 so check marks render.
 try:
@@ -77,6 +80,78 @@ LEGIT = [
     )),
 ]
 
+# (label, code) — pure one-expression strategies that MUST take the in-process fast path
+# and agree exactly with plain execution.
+FAST_PATH = [
+    ("rsi threshold", "def find_signals(data):\n    return data['RSI_14'] < 30"),
+    ("crossover", "def find_signals(data):\n    return (data['Close'] > data['SMA_50']) & (data['RSI_14'] < 70)"),
+    ("shift compare", "def find_signals(data):\n    return data['Close'] > data['Close'].shift(1)"),
+    ("rolling mean", "def find_signals(data):\n    return data['Close'] > data['Close'].rolling(5).mean()"),
+    ("rolling kwargs", "def find_signals(data):\n    return data['Close'] > data['High'].rolling(window=3, min_periods=1).max().shift(1)"),
+    ("arith + abs", "def find_signals(data):\n    return abs(data['Close'] - data['SMA_50']) / data['Close'] * 100 > 1.5"),
+    ("negation + diff", "def find_signals(data):\n    \"\"\"Falling closes.\"\"\"\n    return ~(data['Close'].diff() > 0) | (data['Volume'].pct_change(periods=2) > 0.1)"),
+]
+# (label, code) — valid strategies that must NOT be treated as bounded expressions.
+NOT_FAST_PATH = [
+    ("loop", "def find_signals(data):\n    out = data['Close'] > 0\n    for c in ['RSI_14']:\n        out = out & (data[c] < 75)\n    return out"),
+    ("two statements", "def find_signals(data):\n    ma = data['Close'].rolling(5).mean()\n    return data['Close'] > ma"),
+    ("power", "def find_signals(data):\n    return data['Close'] > 10 ** 10 ** 10"),
+    ("huge window", "def find_signals(data):\n    return data['Close'] > data['Close'].rolling(10 ** 9).mean()"),
+    ("other method", "def find_signals(data):\n    return data['Close'].apply(abs) > 0"),
+    ("dynamic column", "def find_signals(data):\n    return data[data.columns[0]] > 0"),
+]
+
+
+def check_fast_path(failures):
+    for label, code in FAST_PATH:
+        tree = validate_strategy(code)
+        if vectorized_expression(tree) is None:
+            failures.append(f"FAST PATH MISSED: {label}")
+            continue
+        fast = safe_execute_strategy(code, DATA.copy())
+        slow = pd.Series(_execute_validated(code, DATA.copy()), index=DATA.index).fillna(False).astype(bool)
+        if not fast.equals(slow):
+            failures.append(f"FAST PATH MISMATCH: {label}")
+        else:
+            print(f"  fast     ✓  {label:<24} -> {int(fast.sum())}/{len(fast)} signals")
+    for label, code in NOT_FAST_PATH:
+        if vectorized_expression(validate_strategy(code)) is not None:
+            failures.append(f"FAST PATH TOO BROAD: {label}")
+        else:
+            print(f"  slow     ✓  {label:<24} -> subprocess")
+
+
+def check_batch(failures):
+    # Same script over many frames: one result per frame, identical to one-at-a-time runs.
+    loop_code = LEGIT[-1][1]
+    frames = [DATA.iloc[:n].copy() for n in (10, 25, 40)]
+    got = safe_execute_strategy_batch(loop_code, frames)
+    want = [safe_execute_strategy(loop_code, f) for f in frames]
+    if len(got) != len(frames) or not all(g.equals(w) for g, w in zip(got, want)):
+        failures.append("BATCH MISMATCH: one strategy over many frames")
+    else:
+        print(f"  batch    ✓  {'one script, 3 frames':<24} -> {[int(g.sum()) for g in got]}")
+
+    # Mixed scripts: a blocked script and a runaway loop fail alone, the rest still run.
+    spin = "def find_signals(data):\n    while True:\n        pass\n    return data['Close'] > 0"
+    jobs = [
+        (LEGIT[0][1], DATA),          # fast path
+        (MALICIOUS[0][1], DATA),      # rejected by the validator
+        (spin, DATA),                 # killed by the per-item budget
+        (loop_code, DATA),            # runs in a restarted child
+    ]
+    res = safe_execute_batch(jobs, total_seconds=20, item_seconds=2, return_exceptions=True)
+    kinds = [type(r).__name__ for r in res]
+    if kinds != ["Series", "ValueError", "TimeoutError", "Series"]:
+        failures.append(f"BATCH ISOLATION: got {kinds}")
+    else:
+        print(f"  batch    ✓  {'mixed jobs isolated':<24} -> {kinds}")
+    try:
+        safe_execute_batch(jobs[:2])
+        failures.append("BATCH: failure not raised without return_exceptions")
+    except ValueError:
+        pass
+
 
 def main():
     failures = []
@@ -98,6 +173,9 @@ def main():
         except Exception as e:
             failures.append(f"LEGIT FAILED: {label} -> {type(e).__name__}: {e}")
 
+    check_fast_path(failures)
+    check_batch(failures)
+
     # Runtime DoS: an infinite loop must be killed by the wall-clock timeout (review finding #5).
     try:
         safe_execute_strategy("def find_signals(data):\n    while True:\n        pass\n    return data['Close'] > 0", DATA.copy(), seconds=3)
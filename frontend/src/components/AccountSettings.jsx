@@ -24,6 +24,7 @@ const AccountSettings = ({ user, userData, onLogout }) => {
 
     // Modal state for viewing a saved strategy
     const [selectedStrategy, setSelectedStrategy] = useState(null);
+    const [refreshing, setRefreshing] = useState(false);
 
     useEffect(() => {
         const fetchUserData = async () => {
@@ -44,6 +45,21 @@ const AccountSettings = ({ user, userData, onLogout }) => {
         fetchUserData();
     }, [user.sub]);
 
+    // Continue the saved run over bars that arrived since it was saved (backend resumes from engine_state).
+    const handleRefreshStrategy = async () => {
+        setRefreshing(true);
+        try {
+            const res = await axios.post(`${API_URL}/api/user/strategies/${user.sub}/${selectedStrategy.id}/refresh`);
+            const updated = { ...selectedStrategy, resultData: res.data };
+            setSelectedStrategy(updated);
+            setMyStrategies(prev => prev.map(s => (s.id === updated.id ? updated : s)));
+        } catch (err) {
+            alert(err.response?.data?.detail || 'Failed to refresh strategy.');
+        } finally {
+            setRefreshing(false);
+        }
+    };
+
     // --- FIREBASE AUTH ACTIONS ---
     const handleUpdatePassword = async (e) => {
         e.preventDefault();
@@ -192,9 +208,14 @@ const AccountSettings = ({ user, userData, onLogout }) => {
                                 <Typography variant="h5" fontWeight="bold">{selectedStrategy.name}</Typography>
                                 <Typography variant="subtitle2">Saved on {selectedStrategy.createdAt}</Typography>
                             </Box>
-                            <IconButton color="inherit" onClick={() => setSelectedStrategy(null)}>
-                                <Close />
-                            </IconButton>
+                            <Box>
+                                <Button color="inherit" onClick={handleRefreshStrategy} disabled={refreshing} sx={{ mr: 1 }}>
+                                    {refreshing ? 'Updating…' : 'Update to Latest Bar'}
+                                </Button>
+                                <IconButton color="inherit" onClick={() => setSelectedStrategy(null)}>
+                                    <Close />
+                                </IconButton>
+                            </Box>
                         </Box>
                     </AppBar>
                     <Box p={4} bgcolor="background.default" minHeight="100vh">
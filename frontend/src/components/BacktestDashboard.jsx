@@ -20,6 +20,8 @@ import CodeIcon from '@mui/icons-material/Code';
 import UploadFileIcon from '@mui/icons-material/UploadFile';
 
 const API_URL = import.meta.env.VITE_API_URL || "http://127.0.0.1:8000";
+// Chart points requested per curve; the server LTTB-downsamples longer series to this budget.
+const CHART_MAX_POINTS = 1500;
 
 // ─── Deep Blue Theme ───────────────────────────────────────────────────────────
 const terminalTheme = createTheme({
@@ -312,12 +314,22 @@ const BacktestDashboard = ({ user, userData }) => {
                 target_percent: parseFloat(targetPercent),
                 mode: inputMode,
                 strategy_text: inputMode === 'ai' ? strategyText : '',
-                custom_script: inputMode === 'python' ? customScript : ''
+                custom_script: inputMode === 'python' ? customScript : '',
+                userId: user?.sub || '',
+                max_points: CHART_MAX_POINTS
             };
 
             const response = await axios.post(`${API_URL}/api/backtest`, payload);
             setResult(response.data);
             setTradeFilter('all');
+            if (response.data.ai_explanation == null && response.data.run_id) {
+                // Re-runs on cached signals answer without the AI review; it follows separately.
+                axios.get(`${API_URL}/api/backtest/runs/${response.data.run_id}/explanation`)
+                    .then(({ data }) => setResult(prev => prev?.run_id === data.run_id
+                        ? { ...prev, ai_explanation: data.ai_explanation } : prev))
+                    .catch(() => setResult(prev => prev?.run_id === response.data.run_id
+                        ? { ...prev, ai_explanation: '_The AI review could not be generated. Re-run the backtest to try again._' } : prev));
+            }
         } catch (err) {
             setError(err.response?.data?.detail || 'An error occurred.');
         } finally {
@@ -770,7 +782,7 @@ const BacktestDashboard = ({ user, userData }) => {
                                             '& li': { mb: 0.5 },
                                             '& strong': { color: '#4A9EFF' },
                                         }}>
-                                            <ReactMarkdown>{result.ai_explanation}</ReactMarkdown>
+                                            <ReactMarkdown>{result.ai_explanation ?? '_Generating the AI review…_'}</ReactMarkdown>
                                         </Box>
                                     </CardContent>
                                 </Card>